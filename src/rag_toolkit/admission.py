@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from .config import AdmissionCfg
+from .logging import get_logger
+from .metrics import rag_admission_in_flight, rag_admission_queue_depth, rag_admission_rejected_total, rag_admission_wait_seconds
+
+logger = get_logger(__name__)
+
+# Path prefix -> lane; anything unmatched (health, metrics, docs) is never limited
+LANE_PREFIXES: Tuple[Tuple[str, str], ...] = (("/chain", "chain"), ("/query", "query"))
+
+
+class Lane:
+    """Bounded concurrency with a bounded FIFO wait queue and a max queue time."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait_s: float) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.in_flight = 0
+        self.waiting = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.max_wait_s))
+
+    async def acquire(self) -> Optional[str]:
+        """Take a slot, or return the rejection reason (``queue_full`` / ``timeout``)."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        t0 = time.monotonic()
+        if self._sem.locked():
+            if self.waiting >= self.max_queue:
+                return "queue_full"
+            self.waiting += 1
+            rag_admission_queue_depth.labels(lane=self.name).set(self.waiting)
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.max_wait_s)
+            except asyncio.TimeoutError:
+                return "timeout"
+            finally:
+                self.waiting -= 1
+                rag_admission_queue_depth.labels(lane=self.name).set(self.waiting)
+        else:
+            await self._sem.acquire()
+        rag_admission_wait_seconds.labels(lane=self.name).observe(time.monotonic() - t0)
+        self.in_flight += 1
+        rag_admission_in_flight.labels(lane=self.name).set(self.in_flight)
+        return None
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        rag_admission_in_flight.labels(lane=self.name).set(self.in_flight)
+        self._sem.release()
+
+
+def build_lanes(cfg: AdmissionCfg) -> Dict[str, Lane]:
+    return {
+        "query": Lane("query", cfg.query_concurrency, cfg.query_queue, cfg.query_max_wait_s),
+        "chain": Lane("chain", cfg.chain_concurrency, cfg.chain_queue, cfg.chain_max_wait_s),
+    }
+
+
+class AdmissionMiddleware:
+    """Pure ASGI admission control: per-lane concurrency limits and fast load shedding.
+
+    Cheap ``/query`` traffic and expensive ``/chain_*`` generation get separate lanes so a
+    burst of LLM calls cannot starve retrieval. A full queue is rejected with 429, a request
+    that waited ``max_wait_s`` without a slot with 503; both carry ``Retry-After``. The slot
+    is held until the response (including a stream) has been fully sent.
+    """
+
+    def __init__(self, app, cfg: AdmissionCfg) -> None:
+        self.app = app
+        self.lanes = build_lanes(cfg)
+
+    def lane_for(self, path: str) -> Optional[Lane]:
+        for prefix, name in LANE_PREFIXES:
+            if path.startswith(prefix):
+                return self.lanes[name]
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        lane = self.lane_for(scope.get("path", "")) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        reason = await lane.acquire()
+        if reason is not None:
+            rag_admission_rejected_total.labels(lane=lane.name, reason=reason).inc()
+            status = 429 if reason == "queue_full" else 503
+            logger.warning(f"Shedding {scope['path']} ({lane.name} lane {reason}, {lane.in_flight} in flight, {lane.waiting} queued)")
+            response = JSONResponse(
+                status_code=status,
+                content={"error": "server overloaded", "lane": lane.name, "reason": reason},
+                headers={"Retry-After": str(lane.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generator, Iterable, List, Optional
+
+import faiss
+import numpy as np
+
+from .config import CacheCfg
+from .logging import get_logger
+from .metrics import rag_answer_cache_entries, rag_answer_cache_hit_ratio, rag_answer_cache_latency_saved_seconds, rag_answer_cache_requests_total
+
+logger = get_logger(__name__)
+
+
+def context_fingerprint(chunks: Iterable[Dict], *extra: str) -> str:
+    """Hash of the retrieved chunk set, order-independent.
+
+    Chunk ids are positional and get reused by a rebuilt index, so each chunk's text goes
+    into the hash too; ``extra`` scopes entries (engine, model, prompt template).
+    """
+    h = hashlib.sha1()
+    for part in extra:
+        h.update(str(part).encode("utf-8") + b"\0")
+    keys = sorted(
+        f"{c.get('chunk_id')}:{c.get('doc_id')}:{c.get('start')}:{c.get('end')}:"
+        + hashlib.sha1((c.get("text") or "").encode("utf-8")).hexdigest()
+        for c in chunks
+    )
+    for key in keys:
+        h.update(key.encode("utf-8") + b"\0")
+    return h.hexdigest()
+
+
+def answer_fingerprint(chunks: Iterable[Dict], settings, engine: str) -> str:
+    llm = settings.llm
+    return context_fingerprint(chunks, engine, llm.provider, llm.model, llm.max_context_tokens, settings.prompt.get("template_path", ""))
+
+
+class SemanticAnswerCache:
+    """Answers keyed by query embedding (cosine >= ``threshold``) plus a context fingerprint.
+
+    Query vectors live in a flat inner-product FAISS index; entries expire after ``ttl_s``
+    and the least recently used are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, dim: int, threshold: float = 0.95, ttl_s: float = 3600.0, max_entries: int = 1024, candidates: int = 8) -> None:
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.candidates = candidates
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _prep(qv: np.ndarray) -> np.ndarray:
+        q = np.ascontiguousarray(np.asarray(qv, dtype=np.float32).reshape(1, -1))
+        faiss.normalize_L2(q)
+        return q
+
+    def _remove(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        for i in ids:
+            self.entries.pop(i, None)
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def _expire(self, now: float) -> None:
+        self._remove([i for i, e in self.entries.items() if e["expires"] <= now])
+
+    def get(self, qv: np.ndarray, fingerprint: str, engine: str = "default") -> Optional[Dict]:
+        q = self._prep(qv)
+        now = time.monotonic()
+        with self._lock:
+            hit = None
+            if self.index.ntotal:
+                sims, ids = self.index.search(q, min(self.candidates, self.index.ntotal))
+                stale = []
+                for sim, i in zip(sims[0], ids[0]):
+                    if i < 0 or sim < self.threshold:
+                        break
+                    entry = self.entries.get(int(i))
+                    if entry is None:
+                        continue
+                    if entry["expires"] <= now:
+                        stale.append(int(i))
+                        continue
+                    if entry["fingerprint"] == fingerprint:
+                        hit = entry
+                        self.entries.move_to_end(int(i))
+                        break
+                self._remove(stale)
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            rag_answer_cache_requests_total.labels(engine=engine, result="hit" if hit else "miss").inc()
+            rag_answer_cache_hit_ratio.set(self.hits / (self.hits + self.misses))
+            rag_answer_cache_entries.set(len(self.entries))
+        if hit is None:
+            return None
+        rag_answer_cache_latency_saved_seconds.labels(engine=engine).inc(hit["cost_s"])
+        return dict(hit["value"])
+
+    def put(self, qv: np.ndarray, fingerprint: str, value: Dict, cost_s: float = 0.0) -> None:
+        q = self._prep(qv)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            i = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(q, np.asarray([i], dtype=np.int64))
+            self.entries[i] = {"fingerprint": fingerprint, "value": dict(value), "expires": now + self.ttl_s, "cost_s": cost_s}
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self.entries)[:overflow])
+            rag_answer_cache_entries.set(len(self.entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.index.reset()
+            self.entries.clear()
+            rag_answer_cache_entries.set(0)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(cfg: CacheCfg, dim: int) -> Optional[SemanticAnswerCache]:
+    """Process-wide cache shared by every chain/graph instance; None when disabled."""
+    global _cache
+    if not cfg.enabled:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.dim != dim:
+            _cache = SemanticAnswerCache(dim, threshold=cfg.threshold, ttl_s=cfg.ttl_s, max_entries=cfg.max_entries)
+            logger.info(f"Answer cache enabled: threshold={cfg.threshold}, ttl={cfg.ttl_s}s, max_entries={cfg.max_entries}")
+        return _cache
+
+
+def current_answer_cache() -> Optional[SemanticAnswerCache]:
+    """The process-wide cache if one has been created, without creating it."""
+    return _cache
+
+
+def record_stream(gen: Generator[str, None, Dict], parts: List[str]) -> Generator[str, None, Dict]:
+    """Pass tokens through while collecting them, so a streamed answer can be cached."""
+    while True:
+        try:
+            tok = next(gen)
+        except StopIteration as e:
+            return e.value
+        parts.append(tok)
+        yield tok
@@ -1,18 +1,26 @@
 from __future__ import annotations
 
+import os
 import time
-from typing import Dict, List
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import FastAPI
+from fastapi import Body, FastAPI, Header, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse, Response
 
+from .admission import AdmissionMiddleware
+from .answer_cache import answer_fingerprint, current_answer_cache, get_answer_cache
 from .config import load_settings
-from .embedder import Embedder
-from .index_store import IndexStore
-from .retrieval import Retriever
+from .executor import ExecutorBusy
 from .llm import get_llm_client
-from .metrics import observe_request, rag_query_score, metrics_response
-from .logging import get_logger
+from .metrics import mark_worker_dead, observe_request, rag_query_score, metrics_response
+from .logging import RequestContextMiddleware, get_logger, stage
+from .collection_registry import UnknownCollection, get_collections
+from .resources import resource_report, top_allocations
+from .responses import FastJSONResponse, parse_fields, project
+from .serving import IndexManager, get_index_manager
+from .traffic import TrafficRecordingMiddleware
 from .api_chain import router as chain_router
 
 logger = get_logger(__name__)
@@ -21,19 +29,61 @@ app = FastAPI(title="Open-Source RAG Toolkit", version="0.1.0")
 app.include_router(chain_router)
 
 _settings = load_settings()
-_embedder = Embedder(_settings.embedding, seed=_settings.seed)
-_store = IndexStore(_settings.paths.index_path, _settings.paths.index_meta_path)
-try:
-    _store.load()
-    _retriever = Retriever(_store, _embedder)
-except Exception:
-    _retriever = None
+if _settings.admission.enabled:
+    app.add_middleware(AdmissionMiddleware, cfg=_settings.admission)
+if _settings.server.gzip_min_bytes > 0:
+    # Starlette leaves text/event-stream uncompressed, so SSE still flushes per event
+    app.add_middleware(GZipMiddleware, minimum_size=_settings.server.gzip_min_bytes)
+# Wraps admission control so shed requests also log with their request id
+app.add_middleware(RequestContextMiddleware, sample_rate=_settings.server.access_log_sample)
+if _settings.traffic.record:
+    # Outermost, so requests shed by admission control are part of the recorded load
+    app.add_middleware(TrafficRecordingMiddleware, cfg=_settings.traffic)
+_manager = get_index_manager(_settings)
+_collections = get_collections(_settings)
+if _settings.server.tracemalloc_frames > 0 and not tracemalloc.is_tracing():
+    tracemalloc.start(_settings.server.tracemalloc_frames)
+    logger.warning(f"tracemalloc tracing {_settings.server.tracemalloc_frames} frames per allocation; expect slower requests")
+
+
+@app.exception_handler(ExecutorBusy)
+def _executor_busy(request: Request, exc: ExecutorBusy) -> JSONResponse:
+    # Also covers the chain router: the search pool stayed full for execution.queue_timeout_s
+    logger.warning(f"Shedding {request.url.path}: {exc}")
+    observe_request(request.url.path, request.method, "503", 0.0)
+    return JSONResponse(status_code=503, content={"error": "search executor busy"}, headers={"Retry-After": "1"})
+
+
+@app.on_event("shutdown")
+def _drop_worker_gauges() -> None:
+    # uvicorn workers leave via os._exit, which skips atexit handlers
+    mark_worker_dead(os.getpid())
+
+
+def _resolve(name: Optional[str]) -> Tuple[Optional[IndexManager], Optional[JSONResponse]]:
+    try:
+        return _collections.get(name), None
+    except UnknownCollection:
+        return None, JSONResponse(status_code=404, content={"error": f"unknown collection {name!r}", "collections": _collections.names()})
+    except Exception as e:
+        logger.error(f"Collection {name} unavailable: {e}")
+        return None, JSONResponse(status_code=503, content={"error": f"collection {name!r} unavailable"})
+
+
+def _admin_denied(token: Optional[str]) -> Optional[JSONResponse]:
+    expected = _settings.serving.admin_token
+    if not expected:
+        # Without a configured token the admin and debug endpoints are off rather than open
+        return JSONResponse(status_code=403, content={"error": "admin endpoints disabled; set serving.admin_token"})
+    if token != expected:
+        return JSONResponse(status_code=403, content={"error": "invalid admin token"})
+    return None
 
 
 @app.get("/health")
 def health() -> Dict:
     status = {
-        "index_loaded": _retriever is not None,
+        **_manager.status(),
         "config": {
             "embedding_model": _settings.embedding.model_name,
             "chunk_size": _settings.chunking.chunk_size,
@@ -45,32 +95,150 @@ def health() -> Dict:
     return status
 
 
+def _projection(payload: Dict) -> Tuple[Optional[List[str]], int]:
+    return parse_fields(payload.get("fields")), int(payload.get("snippet_chars") or 0)
+
+
 @app.post("/query")
 def post_query(payload: Dict) -> JSONResponse:
     t0 = time.time()
     query = payload.get("query", "")
     k = int(payload.get("k", _settings.retrieval.get("k_default", 5)))
     use_llm = bool(payload.get("llm", False))
-    if _retriever is None:
+    try:
+        fields, snippet_chars = _projection(payload)
+    except ValueError as e:
+        observe_request("/query", "POST", "400", time.time() - t0)
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
+    manager, error = _resolve(payload.get("collection"))
+    if error is not None:
+        observe_request("/query", "POST", str(error.status_code), time.time() - t0)
+        return error
+    # One read per request: a concurrent reload swaps the manager's reference, not ours
+    retriever = manager.retriever
+    if retriever is None:
         observe_request("/query", "POST", "503", time.time() - t0)
         return JSONResponse(status_code=503, content={"error": "index not loaded"})
-    results = _retriever.search(query, k)
+    with stage("embed"):
+        qv = retriever.embed_query(query)
+    # The LLM and the answer cache need full chunks; otherwise fetch only what is returned
+    with stage("search"):
+        if use_llm:
+            results = retriever.search_vector(qv, k)
+        else:
+            results = retriever.search_vector(qv, k, fields, snippet_chars)
     for r in results:
         try:
             rag_query_score.observe(max(0.0, min(1.0, r.get("score", 0.0))))
         except Exception:
             pass
     answer = None
+    cached = False
     if use_llm:
-        client = get_llm_client(_settings.llm.enabled, _settings.llm.api_base, _settings.llm.model)
-        contexts = [r["text"] for r in results]
-        answer = client.answer(query, contexts)
+        cache = get_answer_cache(_settings.answer_cache, int(qv.shape[1]))
+        fp = answer_fingerprint(results, _settings, "query") if cache is not None else ""
+        hit = cache.get(qv, fp, "query") if cache is not None else None
+        if hit is not None:
+            answer, cached = hit["answer"], True
+        else:
+            t_gen = time.time()
+            client = get_llm_client(_settings.llm.enabled, _settings.llm.api_base, _settings.llm.model)
+            contexts = [r["text"] for r in results]
+            with stage("generate"):
+                answer = client.answer(query, contexts)
+            if cache is not None:
+                cache.put(qv, fp, {"answer": answer}, time.time() - t_gen)
+        project(results, fields, snippet_chars)
     latency = time.time() - t0
     observe_request("/query", "POST", "200", latency)
-    return JSONResponse(content={"latency": latency, "results": results, "answer": answer})
+    content = {"latency": latency, "results": results, "answer": answer}
+    if cached:
+        content["cached"] = True
+    return FastJSONResponse(content=content)
+
+
+@app.post("/query_batch")
+def post_query_batch(payload: Dict) -> JSONResponse:
+    t0 = time.time()
+    queries = payload.get("queries") or []
+    k = int(payload.get("k", _settings.retrieval.get("k_default", 5)))
+    try:
+        fields, snippet_chars = _projection(payload)
+    except ValueError as e:
+        observe_request("/query_batch", "POST", "400", time.time() - t0)
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
+    if not isinstance(queries, list) or len(queries) > _settings.server.max_batch_queries:
+        observe_request("/query_batch", "POST", "400", time.time() - t0)
+        return FastJSONResponse(status_code=400, content={"error": f"queries must be a list of at most {_settings.server.max_batch_queries} strings"})
+    manager, error = _resolve(payload.get("collection"))
+    if error is not None:
+        observe_request("/query_batch", "POST", str(error.status_code), time.time() - t0)
+        return error
+    retriever = manager.retriever
+    if retriever is None:
+        observe_request("/query_batch", "POST", "503", time.time() - t0)
+        return JSONResponse(status_code=503, content={"error": "index not loaded"})
+    with stage("search"):
+        results = retriever.search_batch([str(q) for q in queries], k, fields, snippet_chars)
+    latency = time.time() - t0
+    observe_request("/query_batch", "POST", "200", latency)
+    return FastJSONResponse(content={"latency": latency, "results": results})
+
+
+@app.get("/collections")
+def list_collections() -> Dict:
+    return _collections.status()
+
+
+@app.post("/admin/reload")
+def admin_reload(payload: Optional[Dict] = Body(default=None), x_admin_token: Optional[str] = Header(default=None)) -> JSONResponse:
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    payload = payload or {}
+    manager, error = _resolve(payload.get("collection"))
+    if error is not None:
+        return error
+    result = manager.reload(payload.get("version"), background=not payload.get("wait", False))
+    status = {"loading": 202, "ok": 200, "busy": 409, "failed": 500, "invalid": 400}[result["status"]]
+    return JSONResponse(status_code=status, content=result)
+
+
+@app.post("/admin/rollback")
+def admin_rollback(payload: Optional[Dict] = Body(default=None), x_admin_token: Optional[str] = Header(default=None)) -> JSONResponse:
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    manager, error = _resolve((payload or {}).get("collection"))
+    if error is not None:
+        return error
+    result = manager.rollback()
+    return JSONResponse(status_code=200 if result["status"] == "ok" else 409, content=result)
+
+
+def _resources() -> Dict:
+    # The primary index is not kept in ``resident`` unless "default" is configured as a collection
+    return resource_report({"default": _manager, **_collections.resident_managers()}, current_answer_cache())
+
+
+@app.get("/debug/resources")
+def debug_resources(top: int = 0, x_admin_token: Optional[str] = Header(default=None)) -> JSONResponse:
+    denied = _admin_denied(x_admin_token)
+    if denied is not None:
+        return denied
+    report = _resources()
+    if top > 0:
+        allocations = top_allocations(top)
+        report["allocations"] = allocations if allocations is not None else "tracemalloc is off; set server.tracemalloc_frames"
+    return FastJSONResponse(content=report)
 
 
 @app.get("/metrics")
 def get_metrics() -> Response:
+    try:
+        # Refreshes the rag_resource_* gauges; a failure here must not cost the scrape its other metrics
+        _resources()
+    except Exception as e:
+        logger.warning(f"Resource gauges not refreshed: {type(e).__name__}: {e}")
     content, status, headers = metrics_response()
     return Response(content=content, status_code=status, media_type=headers["Content-Type"])
@@ -1,26 +1,46 @@
 from __future__ import annotations
 
 import json
+import queue
+import threading
 import time
-from typing import Dict
+from typing import Dict, Generator, List, Optional, Tuple
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from .config import load_settings
 from .chains import build_chain
 from .graphs import build_graph
-from .metrics import observe_chain
-from .logging import get_logger
+from .metrics import observe_chain, rag_chain_stream_cancelled_total, rag_chain_stream_tokens_per_second, rag_chain_ttft_seconds
+from .logging import get_logger, stage
+from .responses import FastJSONResponse
+from .collection_registry import UnknownCollection, get_collections
 
 router = APIRouter()
 logger = get_logger(__name__)
 
 
-def _select_engine(engine: str):
+def _select_engine(engine: str, collection: Optional[str] = None):
+    """Chain bound to the collection's current index, or None while no index is loaded."""
+    try:
+        manager = get_collections(load_settings()).get(collection)
+    except UnknownCollection:
+        raise
+    except Exception as e:
+        logger.error(f"Collection {collection} unavailable: {e}")
+        return None
+    current = manager.current
+    if current is None:
+        return None
     if engine == "langgraph":
-        return build_graph()
-    return build_chain()
+        return build_graph(current.store, manager.embedder)
+    return build_chain(current.store, manager.embedder)
+
+
+def _no_index() -> JSONResponse:
+    return JSONResponse(status_code=503, content={"error": "index not loaded"})
 
 
 @router.post("/chain_query")
@@ -31,34 +51,138 @@ def chain_query(payload: Dict) -> JSONResponse:
     q = payload.get("query", "")
     k = int(payload.get("k", s.retrieval.get("k", 5)))
     t0 = time.time()
-    chain = _select_engine(engine)
-    result = chain.invoke({"query": q, "k": k, "stream": False})
+    try:
+        chain = _select_engine(engine, payload.get("collection"))
+    except UnknownCollection:
+        return JSONResponse(status_code=404, content={"error": f"unknown collection {payload.get('collection')!r}"})
+    if chain is None:
+        observe_chain(engine, "503", time.time() - t0, None)
+        return _no_index()
+    with stage("chain"):
+        result = chain.invoke({"query": q, "k": k, "stream": False, "deadline_ms": payload.get("deadline_ms")})
     latency = time.time() - t0
     observe_chain(engine, "200", latency, None)
-    return JSONResponse(content=result)
+    return FastJSONResponse(content=result)
+
+
+class _TokenPump:
+    """Drives a chain's token generator on one thread and hands tokens over through a bounded queue.
+
+    ``next`` and ``close`` must run on the same thread: closing a generator that another
+    thread is inside raises "generator already executing" and leaves the upstream stream
+    open. ``stop`` asks the pump to close the generator once its current ``next`` returns.
+    """
+
+    def __init__(self, gen: Generator[str, None, Dict], maxsize: int = 256) -> None:
+        self.queue: "queue.Queue[Tuple[str, object]]" = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(gen,), name="chain-stream", daemon=True)
+        self.thread.start()
+
+    def _run(self, gen: Generator[str, None, Dict]) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    tok = next(gen)
+                except StopIteration as e:
+                    self._put(("done", e.value or {}))
+                    return
+                self._put(("token", tok))
+        except Exception as e:
+            self._put(("error", e))
+        finally:
+            # GeneratorExit inside the provider stream tears down the upstream HTTP response instead of draining it
+            gen.close()
+
+    def _put(self, item: Tuple[str, object]) -> None:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _pull(tokens: "queue.Queue[Tuple[str, object]]", max_chars: int, window_s: float, first: bool) -> Tuple[str, int, bool, Dict]:
+    """Take tokens until ``max_chars`` are buffered, ``window_s`` elapses or the stream ends.
+
+    Runs in a worker thread so the event loop only wakes once per coalesced write.
+    The first token is returned on its own to keep time-to-first-token low. With nothing
+    buffered after ``window_s`` it returns empty, so the caller can check for a disconnect.
+    """
+    buf: List[str] = []
+    size = 0
+    deadline = time.monotonic() + window_s
+    while True:
+        try:
+            kind, value = tokens.get(timeout=max(deadline - time.monotonic(), 0.0 if buf else 0.05))
+        except queue.Empty:
+            return "".join(buf), len(buf), False, {}
+        if kind == "error":
+            raise value
+        if kind == "done":
+            return "".join(buf), len(buf), True, value
+        buf.append(value)
+        size += len(value)
+        if first or size >= max_chars or time.monotonic() >= deadline:
+            return "".join(buf), len(buf), False, {}
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @router.post("/chain_stream")
-def chain_stream(payload: Dict):
+async def chain_stream(request: Request):
+    payload = await request.json()
     s = load_settings()
     engine = payload.get("engine", s.orchestration.get("engine", "langchain"))
     q = payload.get("query", "")
     k = int(payload.get("k", s.retrieval.get("k", 5)))
-    chain = _select_engine(engine)
+    sse = payload.get("format") == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    max_chars = int(payload.get("coalesce_chars", s.streaming.coalesce_chars))
+    window_s = float(payload.get("coalesce_ms", s.streaming.coalesce_ms)) / 1000.0
+    t0 = time.time()
+    try:
+        chain = await run_in_threadpool(_select_engine, engine, payload.get("collection"))
+    except UnknownCollection:
+        return JSONResponse(status_code=404, content={"error": f"unknown collection {payload.get('collection')!r}"})
+    if chain is None:
+        observe_chain(engine, "503", time.time() - t0, None)
+        return _no_index()
 
-    def _gen():
-        t0 = time.time()
-        summary = {}
-        gen = chain.stream({"query": q, "k": k, "stream": True})
-        while True:
-            try:
-                tok = next(gen)
-                yield tok
-            except StopIteration as e:
-                summary = e.value or {}
-                break
-        latency = time.time() - t0
-        observe_chain(engine, "200", latency, None)
-        yield "\n" + json.dumps(summary)
-
-    return StreamingResponse(_gen(), media_type="text/plain")
+    async def _gen():
+        pump = _TokenPump(chain.stream({"query": q, "k": k, "stream": True, "deadline_ms": payload.get("deadline_ms")}))
+        t_first = None
+        n_tokens = 0
+        completed = False
+        try:
+            while True:
+                text, count, done, summary = await run_in_threadpool(_pull, pump.queue, max_chars, window_s, t_first is None)
+                if count:
+                    n_tokens += count
+                    if t_first is None:
+                        t_first = time.time()
+                        rag_chain_ttft_seconds.labels(engine=engine).observe(t_first - t0)
+                    yield _sse("token", {"text": text}) if sse else text
+                if done:
+                    yield _sse("citations", summary) if sse else "\n" + json.dumps(summary)
+                    completed = True
+                    break
+                if await request.is_disconnected():
+                    break
+        finally:
+            # The pump closes the generator on its own thread; a worker still blocked in _pull times out
+            pump.stop()
+            if not completed:
+                rag_chain_stream_cancelled_total.labels(engine=engine).inc()
+                logger.info(f"Client disconnected; cancelled {engine} stream after {n_tokens} tokens")
+            elif n_tokens > 1:
+                rag_chain_stream_tokens_per_second.labels(engine=engine).observe((n_tokens - 1) / max(time.time() - t_first, 1e-6))
+            observe_chain(engine, "200" if completed else "499", time.time() - t0, None)
+
+    media_type = "text/event-stream" if sse else "text/plain"
+    return StreamingResponse(_gen(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
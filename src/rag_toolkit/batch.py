@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from .chains import LCChain, _rewrite, _should_rewrite
+from .config import BatchCfg
+from .lc_adapters import chunk_to_document, citations_from_documents
+from .logging import get_logger
+from .metrics import rag_query_rewritten_total
+from .providers import build_llm, make_messages
+
+logger = get_logger(__name__)
+
+
+def read_queries(path: str) -> List[Dict]:
+    """``{"id", "query"}`` items from JSONL (``id``/``qid`` + ``query``/``text``), ``qid<TAB>text`` TSV, or one query per line."""
+    items: List[Dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                rec = json.loads(line)
+                items.append({"id": str(rec.get("id", rec.get("qid", n))), "query": rec.get("query", rec.get("text", ""))})
+            elif "\t" in line:
+                qid, text = line.split("\t", 1)
+                items.append({"id": qid, "query": text})
+            else:
+                items.append({"id": str(n), "query": line})
+    return items
+
+
+def completed_ids(out_path: str) -> Set[str]:
+    """Ids already answered in ``out_path``; errored records are retried, a torn last line is dropped."""
+    if not os.path.exists(out_path):
+        return set()
+    done: Set[str] = set()
+    with open(out_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Interrupted mid-write: cut the partial record so appends start on a fresh line
+            f.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "error" not in rec:
+                done.add(str(rec["id"]))
+    return done
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate_per_s`` apart across threads; 0 disables."""
+
+    def __init__(self, rate_per_s: float) -> None:
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def with_retries(fn: Callable[[], str], cfg: BatchCfg, limiter: RateLimiter) -> Tuple[str, int]:
+    """``fn()`` under the rate limit, retried with exponential backoff and jitter; returns (value, attempts)."""
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.acquire()
+        try:
+            return fn(), attempt
+        except Exception as e:
+            if attempt > cfg.max_retries:
+                raise
+            delay = cfg.backoff_s * (2 ** (attempt - 1)) * (0.5 + random.random())
+            logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retry {attempt}/{cfg.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _chunks(items: List[Dict], n: int) -> Iterator[List[Dict]]:
+    for i in range(0, len(items), n):
+        yield items[i : i + n]
+
+
+def answer_batch(chain: LCChain, items: List[Dict], out_path: str, k: int, cfg: BatchCfg, resume: bool = True) -> Dict:
+    """Answer ``items`` into ``out_path`` (JSONL, one record per query, written as each completes).
+
+    Retrieval runs as one embedding + FAISS pass per ``cfg.search_batch`` queries; generation
+    runs on ``cfg.concurrency`` threads under the rate limit. Re-running with ``resume`` skips
+    ids already in ``out_path``, so an interrupted run continues where it stopped.
+    """
+    done = completed_ids(out_path) if resume else set()
+    todo = [it for it in items if it["id"] not in done]
+    s = chain.settings
+    system = s.prompt.get("system", "")
+    llm = build_llm(s.llm.provider or "null", s.llm.model, float(s.llm.temperature), int(s.llm.max_tokens), False, router=s.llm_router, api_base=s.llm.api_base)
+    limiter = RateLimiter(cfg.rate_per_s)
+    retriever = chain.retriever.retriever
+    stats = {"total": len(items), "skipped": len(items) - len(todo), "answered": 0, "failed": 0}
+    t0 = time.time()
+
+    def _query(item: Dict) -> str:
+        # Same rewrite as LCChain.invoke, so a batch answer matches the one-off answer
+        return _rewrite(item["query"]) if _should_rewrite(item["query"]) else item["query"]
+
+    def _answer(item: Dict, results: List[Dict]) -> Dict:
+        t = time.time()
+        rec = {"id": item["id"], "query": item["query"]}
+        rendered = None
+        try:
+            docs = [chunk_to_document(r) for r in results]
+            packed, rendered = chain._render(_query(item), docs)
+            answer, attempts = with_retries(lambda: llm.invoke(make_messages(system, rendered)), cfg, limiter)
+            rec.update(answer=answer, citations=citations_from_documents(packed), used_k=len(docs), attempts=attempts)
+        except Exception as e:
+            # One bad item becomes an error record (retried on resume) instead of aborting the run
+            rec.update(error=f"{type(e).__name__}: {e}", attempts=0 if rendered is None else cfg.max_retries + 1)
+        rec["latency_s"] = time.time() - t
+        return rec
+
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, cfg.concurrency), thread_name_prefix="batch-llm") as pool:
+        pending: Set = set()
+
+        def _drain(block: bool) -> None:
+            finished = wait(pending, return_when=FIRST_COMPLETED)[0] if block else {f for f in pending if f.done()}
+            for fut in finished:
+                pending.discard(fut)
+                rec = fut.result()
+                stats["failed" if "error" in rec else "answered"] += 1
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+
+        for part in _chunks(todo, max(1, cfg.search_batch)):
+            queries = [_query(it) for it in part]
+            rag_query_rewritten_total.inc(sum(_should_rewrite(it["query"]) for it in part))
+            for item, results in zip(part, retriever.search_batch(queries, k)):
+                # Bound queued generations so retrieval never runs far ahead of the LLM
+                while len(pending) >= 2 * max(1, cfg.concurrency):
+                    _drain(block=True)
+                pending.add(pool.submit(_answer, item, results))
+            _drain(block=False)
+        while pending:
+            _drain(block=True)
+    stats["seconds"] = time.time() - t0
+    logger.info(f"Batch answered {stats['answered']} queries ({stats['failed']} failed, {stats['skipped']} already done) in {stats['seconds']:.1f}s")
+    return stats
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
 import time
-from typing import Dict, Generator, List
+from typing import Dict, Generator, List, Optional, Tuple
+
+import numpy as np
 
 from jinja2 import Environment, FileSystemLoader
+from langchain_core.documents import Document
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 
+from .answer_cache import SemanticAnswerCache, answer_fingerprint, get_answer_cache, record_stream
 from .config import load_settings
+from .context import pack_for_prompt
+from .deadline import Deadline, build_llm_within
 from .embedder import Embedder
+from .executor import get_search_executor
 from .index_store import IndexStore
 from .lc_adapters import FAISSRetrieverAdapter, citations_from_documents
-from .providers import build_llm, make_messages
+from .providers import make_messages
 from .metrics import observe_chain, rag_query_rewritten_total
 from .logging import get_logger
 
@@ -26,57 +33,101 @@ def _rewrite(q: str) -> str:
 
 
 class LCChain:
-    def __init__(self) -> None:
+    def __init__(self, store: Optional[IndexStore] = None, embedder: Optional[Embedder] = None) -> None:
         s = load_settings()
         self.settings = s
-        self.embedder = Embedder(s.embedding, seed=s.seed)
-        store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
-        store.load()
-        self.retriever = FAISSRetrieverAdapter(store, self.embedder, k=int(s.retrieval.get("k", 5)))
+        self.embedder = embedder or Embedder(s.embedding, seed=s.seed)
+        if store is None:
+            store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
+            store.load(mmap=s.index.mmap, prefault_pages=s.index.prefault, disk_cache_mb=s.index.disk_cache_mb)
+        self.executor = get_search_executor(s.execution)
+        self.retriever = FAISSRetrieverAdapter(store, self.embedder, k=int(s.retrieval.get("k", 5)), executor=self.executor)
         env = Environment(loader=FileSystemLoader("src/rag_toolkit"))
         self.template = env.get_template(s.prompt.get("template_path", "prompts/qa.j2"))
 
+    def _render(self, question: str, docs: List[Document]) -> Tuple[List[Document], str]:
+        system = self.settings.prompt.get("system", "")
+        packed = pack_for_prompt(docs, question, system, int(self.settings.llm.max_context_tokens), self.settings.llm.model, self.template)
+        rendered = self.template.render(system=system, question=question, contexts=[d.page_content for d in packed])
+        return packed, rendered
+
+    def _retrieve(self, rewritten: str, k: int, deadline: Deadline) -> Tuple[np.ndarray, List[Document]]:
+        retr = FAISSRetrieverAdapter(self.retriever.store, self.embedder, k=deadline.shrink_k(k), executor=self.executor)
+        qv = retr.retriever.embed_query(rewritten)
+        docs = retr.invoke_vector(qv)
+        if self.settings.orchestration.get("rerank", False) and not deadline.skip_rerank():
+            docs = retr.rerank(docs)
+        return qv, docs
+
+    def _cache_key(self, qv: np.ndarray, docs: List[Document], engine: str) -> Tuple[Optional[SemanticAnswerCache], str]:
+        cache = get_answer_cache(self.settings.answer_cache, int(qv.shape[1]))
+        if cache is None:
+            return None, ""
+        return cache, answer_fingerprint([dict(d.metadata, text=d.page_content) for d in docs], self.settings, engine)
+
     def invoke(self, payload: Dict) -> Dict:
         t0 = time.time()
         q = payload.get("query", "")
         k = int(payload.get("k", self.settings.retrieval.get("k", 5)))
         engine = "langchain"
         stream = bool(payload.get("stream", False))
+        deadline = Deadline.from_payload(payload, self.settings.deadline, engine)
         rewritten = q
         if _should_rewrite(q):
             rewritten = _rewrite(q)
             rag_query_rewritten_total.inc()
-        docs = FAISSRetrieverAdapter(self.retriever.store, self.embedder, k=k).invoke(rewritten)
-        contexts = [d.page_content for d in docs]
-        rendered = self.template.render(system=self.settings.prompt.get("system", ""), question=rewritten, contexts=contexts)
-        provider = self.settings.llm.provider or "null"
-        llm = build_llm(provider, self.settings.llm.model, float(self.settings.llm.temperature), int(self.settings.llm.max_tokens), stream)
+        qv, docs = self._retrieve(rewritten, k, deadline)
+        cache, fp = self._cache_key(qv, docs, engine)
+        if cache is not None:
+            cached = cache.get(qv, fp, engine)
+            if cached is not None:
+                observe_chain(engine, "200", time.time() - t0, None)
+                return dict(cached, cached=True, degradations=deadline.degradations)
+        t_gen = time.time()
+        packed, rendered = self._render(rewritten, docs)
+        llm = build_llm_within(deadline, self.settings.llm, stream, self.settings.llm_router)
         ans = llm.invoke(make_messages(self.settings.prompt.get("system", ""), rendered))
-        cits = citations_from_documents(docs)
+        cits = citations_from_documents(packed)
+        result = {"answer": ans, "citations": cits, "used_k": len(docs), "engine": engine, "degradations": deadline.degradations}
+        # A degraded answer is not what a later request with time to spare should get
+        if cache is not None and not deadline.degradations:
+            cache.put(qv, fp, result, time.time() - t_gen)
+        deadline.finish()
         latency = time.time() - t0
-        observe_chain(engine, "200", latency, None)
-        return {"answer": ans, "citations": cits, "used_k": len(docs), "engine": engine}
+        observe_chain(engine, "200", latency, {"context": sum(d.metadata["tokens"] for d in packed)})
+        return result
 
     def stream(self, payload: Dict) -> Generator[str, None, Dict]:
         t0 = time.time()
         q = payload.get("query", "")
         k = int(payload.get("k", self.settings.retrieval.get("k", 5)))
         engine = "langchain"
+        deadline = Deadline.from_payload(payload, self.settings.deadline, engine)
         rewritten = q
         if _should_rewrite(q):
             rewritten = _rewrite(q)
             rag_query_rewritten_total.inc()
-        docs = FAISSRetrieverAdapter(self.retriever.store, self.embedder, k=k).invoke(rewritten)
-        contexts = [d.page_content for d in docs]
-        rendered = self.template.render(system=self.settings.prompt.get("system", ""), question=rewritten, contexts=contexts)
-        provider = self.settings.llm.provider or "null"
-        llm = build_llm(provider, self.settings.llm.model, float(self.settings.llm.temperature), int(self.settings.llm.max_tokens), True)
-        usage = yield from llm.stream(make_messages(self.settings.prompt.get("system", ""), rendered))
-        cits = citations_from_documents(docs)
+        qv, docs = self._retrieve(rewritten, k, deadline)
+        cache, fp = self._cache_key(qv, docs, engine)
+        if cache is not None:
+            cached = cache.get(qv, fp, engine)
+            if cached is not None:
+                yield cached["answer"]
+                observe_chain(engine, "200", time.time() - t0, None)
+                return {"answer": "", "citations": cached["citations"], "used_k": cached["used_k"], "engine": engine, "cached": True, "degradations": deadline.degradations}
+        t_gen = time.time()
+        packed, rendered = self._render(rewritten, docs)
+        llm = build_llm_within(deadline, self.settings.llm, True, self.settings.llm_router)
+        parts: List[str] = []
+        usage = yield from record_stream(llm.stream(make_messages(self.settings.prompt.get("system", ""), rendered)), parts)
+        cits = citations_from_documents(packed)
+        if cache is not None and not deadline.degradations:
+            cache.put(qv, fp, {"answer": "".join(parts), "citations": cits, "used_k": len(docs), "engine": engine, "degradations": []}, time.time() - t_gen)
+        deadline.finish()
         latency = time.time() - t0
         observe_chain(engine, "200", latency, usage)
-        return {"answer": "", "citations": cits, "used_k": len(docs), "engine": engine}
+        return {"answer": "", "citations": cits, "used_k": len(docs), "engine": engine, "degradations": deadline.degradations}
 
 
-def build_chain() -> LCChain:
-    return LCChain()
+def build_chain(store: Optional[IndexStore] = None, embedder: Optional[Embedder] = None) -> LCChain:
+    return LCChain(store, embedder)
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Tuple
 
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 from .logging import get_logger
 from .loaders import Document
 
 logger = get_logger(__name__)
 
+CHUNK_COLUMNS = ["chunk_id", "doc_id", "start", "end", "text", "source"]
+
 
 @dataclass
 class Chunk:
@@ -18,6 +23,7 @@ class Chunk:
     start: int
     end: int
     text: str
+    source: str = ""
 
 
 def chunk_text(doc: Document, chunk_size: int, chunk_overlap: int) -> List[Chunk]:
@@ -25,12 +31,13 @@ def chunk_text(doc: Document, chunk_size: int, chunk_overlap: int) -> List[Chunk
     chunks: List[Chunk] = []
     i = 0
     idx = 0
+    source = doc.meta.get("relpath", doc.doc_id)
     while i < len(text):
         start = i
         end = min(i + chunk_size, len(text))
         chunk_text = text[start:end]
         chunk_id = f"{doc.doc_id}:{idx}"
-        chunks.append(Chunk(chunk_id=chunk_id, doc_id=doc.doc_id, start=start, end=end, text=chunk_text))
+        chunks.append(Chunk(chunk_id=chunk_id, doc_id=doc.doc_id, start=start, end=end, text=chunk_text, source=source))
         idx += 1
         if end == len(text):
             break
@@ -39,15 +46,73 @@ def chunk_text(doc: Document, chunk_size: int, chunk_overlap: int) -> List[Chunk
     return chunks
 
 
-def chunk_documents(docs: List[Document], chunk_size: int, chunk_overlap: int) -> pd.DataFrame:
-    all_chunks: List[Chunk] = []
-    for doc in docs:
-        all_chunks.extend(chunk_text(doc, chunk_size, chunk_overlap))
-    logger.info(f"Created {len(all_chunks)} chunks from {len(docs)} documents")
-    df = pd.DataFrame([c.__dict__ for c in all_chunks])
-    return df
+def chunk_bounds(n: int, chunk_size: int, chunk_overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Character [start, end) ranges of the chunks ``chunk_text`` produces for a text of length ``n``."""
+    step = max(1, chunk_size - chunk_overlap + 1)
+    last = max(0, -(-(n - chunk_size) // step))
+    starts = np.arange(last + 1, dtype=np.int64) * step
+    starts = starts[starts < n]
+    return starts, np.minimum(starts + chunk_size, n)
+
+
+def _utf8_positions(text: str, data: bytes, positions: np.ndarray) -> np.ndarray:
+    if len(data) == len(text):
+        return positions
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    width = 1 + (cp >= 0x80).astype(np.int64) + (cp >= 0x800) + (cp >= 0x10000)
+    return np.concatenate([[0], np.cumsum(width)])[positions]
+
+
+def chunk_documents(docs: List[Document], chunk_size: int, chunk_overlap: int) -> pa.Table:
+    """Chunk documents into an Arrow table whose text column is sliced straight out of UTF-8 buffers."""
+    starts_l, ends_l, doc_idx_l, local_l, values_l, lengths_l = [], [], [], [], [], []
+    for d, doc in enumerate(docs):
+        text = doc.text or ""
+        starts, ends = chunk_bounds(len(text), chunk_size, chunk_overlap)
+        if starts.size == 0:
+            continue
+        data = text.encode("utf-8")
+        bpos = _utf8_positions(text, data, np.concatenate([starts, ends]))
+        bstart, bend = bpos[: starts.size], bpos[starts.size :]
+        lengths = bend - bstart
+        out_start = np.cumsum(lengths) - lengths
+        gather = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(bstart - out_start, lengths)
+        values_l.append(np.frombuffer(data, dtype=np.uint8)[gather])
+        lengths_l.append(lengths)
+        starts_l.append(starts)
+        ends_l.append(ends)
+        doc_idx_l.append(np.full(starts.size, d, dtype=np.int64))
+        local_l.append(np.arange(starts.size, dtype=np.int64))
+
+    n = int(sum(s.size for s in starts_l))
+    if n == 0:
+        table = pa.table({c: pa.array([], pa.int64() if c in ("start", "end") else pa.string()) for c in CHUNK_COLUMNS})
+        logger.info(f"Created 0 chunks from {len(docs)} documents")
+        return table
+
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(lengths_l))])
+    large = offsets[-1] >= 2**31
+    texts = pa.Array.from_buffers(
+        pa.large_string() if large else pa.string(),
+        n,
+        [None, pa.py_buffer(offsets.astype(np.int64 if large else np.int32)), pa.py_buffer(np.concatenate(values_l))],
+    )
+    doc_idx = pa.array(np.concatenate(doc_idx_l))
+    doc_ids = pa.array([doc.doc_id for doc in docs], pa.string()).take(doc_idx)
+    sources = pa.array([doc.meta.get("relpath", doc.doc_id) for doc in docs], pa.string()).take(doc_idx)
+    chunk_ids = pc.binary_join_element_wise(doc_ids, pc.cast(pa.array(np.concatenate(local_l)), pa.string()), ":")
+    table = pa.Table.from_arrays(
+        [chunk_ids, doc_ids, pa.array(np.concatenate(starts_l)), pa.array(np.concatenate(ends_l)), texts, sources],
+        names=CHUNK_COLUMNS,
+    )
+    logger.info(f"Created {n} chunks from {len(docs)} documents")
+    return table
+
+
+def persist_chunks(table: pa.Table, path: str) -> None:
+    pq.write_table(table, path)
+    logger.info(f"Saved chunks to {path}")
 
 
-def persist_chunks(df: pd.DataFrame, path: str) -> None:
-    df.to_parquet(path, index=False)
-    logger.info(f"Saved chunks to {path}")
\ No newline at end of file
+def read_chunks(path: str) -> pa.Table:
+    return pq.read_table(path, memory_map=True)
@@ -3,47 +3,71 @@ from __future__ import annotations
 import json
 import os
 import time
+from dataclasses import replace
 from typing import Optional
 
 import numpy as np
-import pandas as pd
 import typer
 import uvicorn
 
 from .config import load_settings
 from .embedder import Embedder
+from .embed_pool import embed_parquet_parallel
+from .embed_shards import embed_to_shards, open_embeddings
+from .onnx_embedder import export_onnx as export_onnx_model, parity_report
 from .index_store import IndexStore
 from .loaders import load_documents
-from .chunker import chunk_documents, persist_chunks
+from .chunker import chunk_documents, persist_chunks, read_chunks
+from .dedup import dedup_chunks, duplicate_documents, load_dedup_map, persist_dedup_map
 from .retrieval import Retriever
+from .executor import SearchExecutor, benchmark_search
+from .serving import publish_version, read_current_version
+from .collection_registry import collection_settings
+from .tuning import load_tuning_queries, tune_index
 from .eval import evaluate, save_eval, log_mlflow
 from .llm import get_llm_client
 from .chains import build_chain
+from .batch import answer_batch, read_queries
 from .graphs import build_graph
+from .mock_llm import create_mock_app
+from .loadtest import parse_mix, qps_sweep, run_load, synthetic_traffic
+from .traffic import read_traffic
 from .logging import get_logger
+from .metrics import prepare_multiprocess_dir
 
 app = typer.Typer(help="RAG Toolkit CLI")
 logger = get_logger(__name__)
 
 
+def _chunk_corpus(s, data: str):
+    docs = load_documents(data, doc_ids=s.dedup.doc_ids)
+    table = chunk_documents(docs, s.chunking.chunk_size, s.chunking.chunk_overlap)
+    duplicates, doc_aliases = {}, {}
+    if s.dedup.enabled:
+        # Copies of whole files fall out of the chunk-level exact hash; the document map is informational
+        doc_aliases = duplicate_documents(docs)
+        table, duplicates = dedup_chunks(table, s.dedup)
+    persist_chunks(table, s.paths.chunks_path)
+    persist_dedup_map(s.paths.dedup_map_path, duplicates, doc_aliases)
+    return table, duplicates
+
+
 @app.command()
 def index(data: str = typer.Option("data/raw", help="Path to raw documents")) -> None:
     """Load files, chunk, embed, build FAISS, persist index and metadata."""
     s = load_settings()
     os.makedirs(s.paths.artifacts_dir, exist_ok=True)
 
-    docs = load_documents(data)
-    df = chunk_documents(docs, s.chunking.chunk_size, s.chunking.chunk_overlap)
-    persist_chunks(df, s.paths.chunks_path)
+    table, duplicates = _chunk_corpus(s, data)
 
     emb = Embedder(s.embedding, seed=s.seed)
-    vectors = emb.embed_texts(df["text"].tolist(), batch_size=s.embedding.batch_size)
+    vectors = emb.embed_column(table.column("text"), batch_size=s.embedding.batch_size)
     np.save(s.paths.embeddings_path, vectors)
 
     store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
-    store.build(vectors, df)
+    store.build(vectors, table, duplicates=duplicates, index_type=s.index.type, metric=s.index.metric, train_size=s.index.train_size, on_disk=s.index.on_disk)
     store.save()
-    typer.echo(json.dumps({"chunks": len(df), "vectors": int(vectors.shape[0])}))
+    typer.echo(json.dumps({"chunks": len(table), "vectors": int(vectors.shape[0])}))
 
 
 @app.command()
@@ -98,30 +122,160 @@ def eval(qrels: str = typer.Option("data/qrels.tsv", help="Path to qrels.tsv"),
 def chunk(data: str = typer.Option("data/raw")) -> None:
     s = load_settings()
     os.makedirs(s.paths.artifacts_dir, exist_ok=True)
-    docs = load_documents(data)
-    df = chunk_documents(docs, s.chunking.chunk_size, s.chunking.chunk_overlap)
-    persist_chunks(df, s.paths.chunks_path)
+    _chunk_corpus(s, data)
 
 
 @app.command(hidden=True)
-def embed() -> None:
+def embed(
+    workers: int = typer.Option(0, "--workers", help="Embedding processes (0 = embedding.num_workers)"),
+    threads_per_worker: int = typer.Option(0, "--threads-per-worker", help="Intra-op threads per worker (0 = auto)"),
+    single_file: bool = typer.Option(False, "--single-file", help="Write paths.embeddings_path instead of resumable shards"),
+) -> None:
     s = load_settings()
-    df = pd.read_parquet(s.paths.chunks_path)
+    workers = workers or s.embedding.num_workers
+    if not single_file:
+        embed_to_shards(
+            s.paths.chunks_path,
+            s.paths.embeddings_dir,
+            s.embedding,
+            seed=s.seed,
+            num_workers=workers,
+            threads_per_worker=threads_per_worker or None,
+        )
+        return
+    if workers > 1:
+        embed_parquet_parallel(
+            s.paths.chunks_path,
+            s.paths.embeddings_path,
+            s.embedding,
+            seed=s.seed,
+            num_workers=workers,
+            threads_per_worker=threads_per_worker or None,
+        )
+        return
+    table = read_chunks(s.paths.chunks_path)
     emb = Embedder(s.embedding, seed=s.seed)
-    vectors = emb.embed_texts(df["text"].tolist(), batch_size=s.embedding.batch_size)
+    vectors = emb.embed_column(table.column("text"), batch_size=s.embedding.batch_size)
     np.save(s.paths.embeddings_path, vectors)
 
 
 @app.command(hidden=True)
 def index_build() -> None:
     s = load_settings()
-    df = pd.read_parquet(s.paths.chunks_path)
-    vectors = np.load(s.paths.embeddings_path)
+    table = read_chunks(s.paths.chunks_path)
+    vectors = open_embeddings(s.paths.embeddings_dir, s.paths.embeddings_path, s.paths.chunks_path, s.embedding)
+    if vectors is None:
+        raise typer.BadParameter(f"No embeddings for {s.paths.chunks_path}; run `rag embed` first")
+    duplicates = load_dedup_map(s.paths.dedup_map_path)["chunks"]
     store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
-    store.build(vectors, df)
+    store.build(vectors, table, duplicates=duplicates, index_type=s.index.type, metric=s.index.metric, train_size=s.index.train_size, on_disk=s.index.on_disk)
     store.save()
 
 
+@app.command()
+def export_onnx(
+    quantize: bool = typer.Option(False, "--quantize/--no-quantize", help="Also write a dynamic int8 model"),
+    force: bool = typer.Option(False, "--force", help="Re-export even if a cached export exists"),
+) -> None:
+    """Export the configured embedding model to ONNX under embedding.onnx_dir."""
+    s = load_settings()
+    manifest = export_onnx_model(s.embedding.model_name, s.embedding.onnx_dir, quantize=quantize, force=force)
+    typer.echo(json.dumps(manifest, indent=2))
+
+
+@app.command()
+def onnx_parity(n: int = typer.Option(256, "--n", help="Number of sampled chunk texts")) -> None:
+    """Report cosine drift of the ONNX backend against the sentence-transformers model."""
+    s = load_settings()
+    if os.path.exists(s.paths.chunks_path):
+        texts = read_chunks(s.paths.chunks_path).column("text").to_pylist()
+    else:
+        texts = [d.text for d in load_documents(s.paths.raw_data_dir)]
+    rng = np.random.RandomState(s.seed)
+    if len(texts) > n:
+        texts = [texts[i] for i in rng.choice(len(texts), n, replace=False)]
+    reference = Embedder(replace(s.embedding, backend="torch"), seed=s.seed).embed_texts(texts)
+    report = {}
+    for quantized in (False, True):
+        try:
+            onnx = Embedder(replace(s.embedding, backend="onnx", onnx_quantized=quantized), seed=s.seed)
+        except RuntimeError as e:
+            logger.warning(str(e))
+            continue
+        report["int8" if quantized else "fp32"] = parity_report(reference, onnx.embed_texts(texts))
+    typer.echo(json.dumps(report, indent=2))
+
+
+@app.command()
+def bench_search(
+    modes: str = typer.Option("latency,throughput", "--modes", help="Comma-separated execution modes"),
+    concurrency: str = typer.Option("1,2,4,8,16,32", "--concurrency", help="Comma-separated client counts"),
+    duration: float = typer.Option(5.0, "--duration", help="Seconds per concurrency level"),
+    k: int = typer.Option(5, "--k"),
+    out: str = typer.Option("artifacts/bench_search.json", "--out"),
+) -> None:
+    """Measure QPS and p50/p99 search latency per execution mode and client concurrency."""
+    s = load_settings()
+    emb = Embedder(s.embedding, seed=s.seed)
+    store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
+    store.load()
+    texts = store.meta.column("text").slice(0, 256).to_pylist()
+    queries = [" ".join(t.split()[:12]) for t in texts] or ["benchmark query"]
+    report = {}
+    for mode in [m.strip() for m in modes.split(",") if m.strip()]:
+        executor = SearchExecutor(replace(s.execution, enabled=True, mode=mode))
+        retr = Retriever(store, emb, executor)
+        retr.search(queries[0], k)
+        curve = []
+        for c in [int(x) for x in concurrency.split(",") if x.strip()]:
+            row = benchmark_search(lambda q: retr.search(q, k), queries, c, duration)
+            typer.echo(f"{mode:>10} c={c:<3} qps={row['qps']:8.1f} p50={row['p50_ms']:7.2f}ms p99={row['p99_ms']:7.2f}ms")
+            curve.append(row)
+        executor.shutdown()
+        report[mode] = {"workers": executor.workers, "faiss_threads": executor.faiss_threads, "torch_threads": executor.torch_threads, "curve": curve}
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+@app.command()
+def publish_index(
+    version: Optional[str] = typer.Option(None, "--version", help="Version name (default: timestamp)"),
+    activate: bool = typer.Option(True, "--activate/--no-activate", help="Point CURRENT at the new version"),
+    collection: Optional[str] = typer.Option(None, "--collection", help="Publish a named collection's index instead"),
+) -> None:
+    """Copy the built index into a new version directory for hot reload by the API."""
+    s = load_settings()
+    if collection:
+        s = collection_settings(s, collection)
+    v = publish_version(s, version, activate=activate)
+    typer.echo(json.dumps({"version": v, "versions_dir": s.serving.versions_dir, "current": read_current_version(s.serving.versions_dir)}))
+
+
+@app.command()
+def tune(
+    queries: str = typer.Option("data/queries.tsv", "--queries", help="Eval queries; topped up with sampled chunk texts"),
+    n: int = typer.Option(200, "--n", help="Number of tuning queries"),
+    k: Optional[int] = typer.Option(None, "--k", help="Recall@k cutoff (default index.tune_k)"),
+    target: Optional[float] = typer.Option(None, "--target", help="Recall target (default index.recall_target)"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Report without rewriting the index"),
+) -> None:
+    """Sweep nprobe/efSearch against exact search and store the cheapest setting meeting the recall target."""
+    s = load_settings()
+    emb = Embedder(s.embedding, seed=s.seed)
+    store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
+    store.load()
+    texts = load_tuning_queries(queries, store, n, s.seed)
+    qv = emb.embed_texts(texts, batch_size=s.embedding.batch_size)
+    vectors = open_embeddings(s.paths.embeddings_dir, s.paths.embeddings_path)
+    if vectors is not None and vectors.shape[0] != store.index.ntotal:
+        logger.warning(f"Embeddings ({vectors.shape[0]}) don't match the index ({store.index.ntotal}); using the index's stored vectors as ground truth")
+        vectors = None
+    report = tune_index(store, qv, k or s.index.tune_k, target if target is not None else s.index.recall_target, write=not dry_run, embeddings=vectors)
+    report.pop("sweep", None)
+    typer.echo(json.dumps(report, indent=2))
+
+
 def main():
     app()
 
@@ -131,8 +285,28 @@ if __name__ == "__main__":
 
 
 @app.command()
-def chain(q: str = typer.Option(..., "--q", help="Query text"), k: int = typer.Option(5, "--k"), engine: str = typer.Option("langchain", "--engine"), stream: bool = typer.Option(False, "--stream/--no-stream")) -> None:
+def chain(
+    q: Optional[str] = typer.Option(None, "--q", help="Query text"),
+    k: int = typer.Option(5, "--k"),
+    engine: str = typer.Option("langchain", "--engine"),
+    stream: bool = typer.Option(False, "--stream/--no-stream"),
+    batch: Optional[str] = typer.Option(None, "--batch", help="Answer every query in a TSV (qid<TAB>text) or JSONL file"),
+    out: str = typer.Option("artifacts/batch_answers.jsonl", "--out", help="JSONL output for --batch"),
+    concurrency: Optional[int] = typer.Option(None, "--concurrency", help="Concurrent LLM calls (default batch.concurrency)"),
+    rate: Optional[float] = typer.Option(None, "--rate", help="Max LLM calls per second (default batch.rate_per_s)"),
+    resume: bool = typer.Option(True, "--resume/--no-resume", help="Skip queries already answered in --out"),
+) -> None:
     s = load_settings()
+    if batch:
+        if engine != "langchain":
+            # answer_batch drives LCChain's retriever and prompt directly; there is no batched graph path
+            raise typer.BadParameter("--batch only supports --engine langchain")
+        cfg = replace(s.batch, concurrency=concurrency or s.batch.concurrency, rate_per_s=s.batch.rate_per_s if rate is None else rate)
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        typer.echo(json.dumps(answer_batch(build_chain(), read_queries(batch), out, k, cfg, resume=resume)))
+        return
+    if q is None:
+        raise typer.BadParameter("pass --q or --batch")
     if engine == "langgraph":
         runner = build_graph()
     else:
@@ -151,7 +325,11 @@ def chain(q: str = typer.Option(..., "--q", help="Query text"), k: int = typer.O
 
 
 @app.command()
-def serve(engine: str = typer.Option("langchain", "--engine"), stream: bool = typer.Option(False, "--stream/--no-stream")) -> None:
+def serve(
+    engine: str = typer.Option("langchain", "--engine"),
+    stream: bool = typer.Option(False, "--stream/--no-stream"),
+    workers: int = typer.Option(1, "--workers", help="uvicorn worker processes; pair with index.mmap to share one index copy"),
+) -> None:
     s = load_settings()
     override = {
         "orchestration": {
@@ -162,4 +340,66 @@ def serve(engine: str = typer.Option("langchain", "--engine"), stream: bool = ty
         }
     }
     os.environ["RAG_SETTINGS"] = json.dumps(override)
-    uvicorn.run("rag_toolkit.api:app", host="0.0.0.0", port=int(s.server.port))
+    if workers > 1:
+        # Workers are fresh processes, so they pick the directory up before importing prometheus_client
+        path = prepare_multiprocess_dir(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or s.metrics.multiproc_dir)
+        logger.info(f"Sharing metrics of {workers} workers through {path}")
+    uvicorn.run("rag_toolkit.api:app", host="0.0.0.0", port=int(s.server.port), workers=workers)
+
+
+@app.command("mock-llm")
+def mock_llm(
+    profile: Optional[str] = typer.Option(None, "--profile", help="instant | fast | typical | slow-tail | flaky"),
+    port: Optional[int] = typer.Option(None, "--port"),
+    ttft_ms: Optional[float] = typer.Option(None, "--ttft-ms"),
+    tokens_per_s: Optional[float] = typer.Option(None, "--tokens-per-s"),
+    error_rate: Optional[float] = typer.Option(None, "--error-rate"),
+    seed: Optional[int] = typer.Option(None, "--seed"),
+) -> None:
+    """Serve a mock OpenAI-compatible /v1/chat/completions; point llm.api_base at http://127.0.0.1:PORT/v1."""
+    s = load_settings()
+    given = {"profile": profile, "port": port, "ttft_ms": ttft_ms, "tokens_per_s": tokens_per_s, "error_rate": error_rate, "seed": seed}
+    cfg = replace(s.mock_llm, **{k: v for k, v in given.items() if v is not None})
+    uvicorn.run(create_mock_app(cfg), host="127.0.0.1", port=int(cfg.port))
+
+
+@app.command()
+def loadtest(
+    url: str = typer.Option("http://127.0.0.1:8002", "--url"),
+    traffic: Optional[str] = typer.Option(None, "--traffic", help="recorded traffic JSONL to replay (traffic.path)"),
+    queries: Optional[str] = typer.Option(None, "--queries", help="TSV/JSONL/text queries for a synthetic mix"),
+    mix: str = typer.Option("query=1", "--mix", help="synthetic endpoint weights, e.g. query=0.7,query_batch=0.1,chain_query=0.2"),
+    n: int = typer.Option(1000, "--n", help="synthetic requests to send"),
+    k: int = typer.Option(5, "--k"),
+    rate: float = typer.Option(0.0, "--rate", help="open-loop Poisson arrivals per second; 0 replays recorded timing"),
+    speedup: float = typer.Option(1.0, "--speedup", help="compress recorded inter-arrival gaps by this factor"),
+    rates: Optional[str] = typer.Option(None, "--rates", help="comma-separated QPS steps for a QPS-vs-p99 sweep"),
+    duration: float = typer.Option(30.0, "--duration", help="seconds per sweep step"),
+    concurrency: int = typer.Option(64, "--concurrency", help="max requests in flight"),
+    timeout: float = typer.Option(60.0, "--timeout"),
+    out: str = typer.Option("artifacts/loadtest.json", "--out"),
+) -> None:
+    """Replay recorded traffic or a synthetic query mix against a running API and report latency as JSON."""
+    if traffic:
+        items = list(read_traffic(traffic))
+    elif queries:
+        items = synthetic_traffic([it["query"] for it in read_queries(queries)], parse_mix(mix), n, k)
+    else:
+        raise typer.BadParameter("pass --traffic or --queries")
+    if not items:
+        raise typer.BadParameter("no requests to send")
+    if rates:
+        report = qps_sweep(url, items, [float(r) for r in rates.split(",") if r.strip()], duration, concurrency, timeout)
+    else:
+        if not rate and not traffic:
+            raise typer.BadParameter("a synthetic mix needs --rate (or --rates)")
+        report = run_load(url, items, rate, concurrency, speedup, timeout)
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if "curve" in report:
+        summary = report["curve"]
+    else:
+        summary = {key: report[key] for key in ("requests", "achieved_qps", "error_rate", "latency_ms")}
+    typer.echo(json.dumps(summary, indent=2))
+    logger.info(f"Wrote load test report to {out}")
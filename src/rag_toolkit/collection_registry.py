@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from .config import Settings
+from .embedder import Embedder
+from .logging import get_logger
+from .metrics import rag_collection_evictions_total, rag_collection_load_seconds, rag_collection_memory_bytes
+from .serving import IndexManager, get_index_manager
+
+logger = get_logger(__name__)
+
+DEFAULT_COLLECTION = "default"
+_SPEC_KEYS = {"index_path", "index_meta_path", "embeddings_path", "embeddings_dir", "versions_dir", "embedding"}
+
+
+class UnknownCollection(KeyError):
+    pass
+
+
+def collection_settings(s: Settings, name: str) -> Settings:
+    """Settings for collection ``name``: its own index/embeddings paths, versions dir and embedding overrides."""
+    spec = s.collections.items.get(name)
+    if spec is None:
+        raise UnknownCollection(name)
+    unknown = set(spec) - _SPEC_KEYS
+    if unknown:
+        raise ValueError(f"Unknown keys for collection {name!r}: {sorted(unknown)}")
+    root = os.path.join(s.paths.artifacts_dir, "collections", name)
+    paths = replace(
+        s.paths,
+        index_path=spec.get("index_path", os.path.join(root, "index.faiss")),
+        index_meta_path=spec.get("index_meta_path", os.path.join(root, "index_meta.jsonl")),
+        embeddings_path=spec.get("embeddings_path", os.path.join(root, "embeddings.npy")),
+        embeddings_dir=spec.get("embeddings_dir", os.path.join(root, "embeddings")),
+    )
+    serving = replace(s.serving, versions_dir=spec.get("versions_dir", os.path.join(root, "versions")), watch_interval_s=0.0)
+    embedding = replace(s.embedding, **spec.get("embedding", {}))
+    return replace(s, paths=paths, serving=serving, embedding=embedding)
+
+
+def _memory_bytes(manager: IndexManager) -> int:
+    cur = manager.current
+    if cur is None:
+        return 0
+    # FAISS does not report its footprint; the serialized size tracks resident codes + structures.
+    # An on-disk IVF header holds only centroids, and its list cache can grow to its capacity.
+    cache = getattr(cur.store.index, "cache_bytes", 0)
+    return os.path.getsize(cur.store.index_path) + cache + cur.store.meta.nbytes
+
+
+class CollectionRegistry:
+    """Named collections loaded on first use and kept resident under a total memory budget.
+
+    The ``default`` collection is the primary index and is never evicted. Others are evicted
+    least recently used first once the budget is exceeded and reloaded on their next request;
+    requests already holding an evicted manager finish normally. Collections with the same
+    embedding config share one embedder.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.budget = int(settings.collections.memory_budget_mb * 1024 * 1024)
+        self.resident: "OrderedDict[str, IndexManager]" = OrderedDict()
+        self.stats: Dict[str, Dict] = {}
+        self._embedders: Dict[str, Embedder] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def names(self) -> List[str]:
+        return [DEFAULT_COLLECTION] + sorted(n for n in self.settings.collections.items if n != DEFAULT_COLLECTION)
+
+    def _embedder(self, s: Settings) -> Embedder:
+        key = repr(s.embedding)
+        with self._lock:
+            emb = self._embedders.get(key)
+        if emb is None:
+            emb = Embedder(s.embedding, seed=s.seed)
+            with self._lock:
+                emb = self._embedders.setdefault(key, emb)
+        return emb
+
+    def get(self, name: Optional[str] = None) -> IndexManager:
+        name = name or DEFAULT_COLLECTION
+        if name == DEFAULT_COLLECTION and name not in self.settings.collections.items:
+            return get_index_manager(self.settings)
+        with self._lock:
+            manager = self.resident.get(name)
+            if manager is not None:
+                self.resident.move_to_end(name)
+                self.stats[name]["last_used"] = time.time()
+                return manager
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                if name in self.resident:
+                    self.resident.move_to_end(name)
+                    return self.resident[name]
+            return self._load(name)
+
+    def _load(self, name: str) -> IndexManager:
+        s = collection_settings(self.settings, name)
+        t0 = time.time()
+        manager = IndexManager(s, self._embedder(s))
+        if not manager.load_initial():
+            raise RuntimeError(f"Collection {name!r} failed to load: {manager.last_error}")
+        load_s = time.time() - t0
+        mem = _memory_bytes(manager)
+        rag_collection_load_seconds.labels(collection=name).observe(load_s)
+        rag_collection_memory_bytes.labels(collection=name).set(mem)
+        with self._lock:
+            self.resident[name] = manager
+            prev = self.stats.get(name, {})
+            self.stats[name] = {
+                "load_seconds": load_s,
+                "memory_bytes": mem,
+                "loads": prev.get("loads", 0) + 1,
+                "last_used": time.time(),
+            }
+            self._evict(keep=name)
+        logger.info(f"Loaded collection {name} in {load_s:.2f}s ({mem / 1e6:.1f} MB, {len(self.resident)} resident)")
+        return manager
+
+    def _evict(self, keep: str) -> None:
+        if self.budget <= 0:
+            return
+        while self.resident_bytes() > self.budget and len(self.resident) > 1:
+            victim = next(n for n in self.resident if n != keep)
+            self.resident.pop(victim).close()
+            rag_collection_memory_bytes.labels(collection=victim).set(0)
+            rag_collection_evictions_total.labels(collection=victim).inc()
+            logger.info(f"Evicted collection {victim} to stay under {self.budget / 1e6:.0f} MB")
+
+    def resident_managers(self) -> Dict[str, IndexManager]:
+        with self._lock:
+            return dict(self.resident)
+
+    def resident_bytes(self) -> int:
+        return sum(self.stats[n]["memory_bytes"] for n in self.resident)
+
+    def status(self) -> Dict:
+        with self._lock:
+            out = {}
+            for name in self.names():
+                st = dict(self.stats.get(name, {}))
+                if name == DEFAULT_COLLECTION and name not in self.settings.collections.items:
+                    st.update(resident=True, version=get_index_manager(self.settings).version)
+                else:
+                    manager = self.resident.get(name)
+                    st.update(resident=manager is not None, version=manager.version if manager else None)
+                out[name] = st
+            return {"memory_budget_bytes": self.budget, "resident_bytes": self.resident_bytes(), "collections": out}
+
+
+_registry: Optional[CollectionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_collections(settings: Settings) -> CollectionRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.settings.collections != settings.collections:
+            _registry = CollectionRegistry(settings)
+        return _registry
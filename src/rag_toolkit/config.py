@@ -3,7 +3,7 @@ from __future__ import annotations
 import os
 import yaml
 from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 
 def _deep_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
@@ -24,6 +24,8 @@ class Paths:
     index_path: str
     index_meta_path: str
     eval_path: str
+    dedup_map_path: str = "artifacts/dedup_map.json"
+    embeddings_dir: str = "artifacts/embeddings"
 
 
 @dataclass
@@ -33,6 +35,14 @@ class EmbeddingCfg:
     batch_size: int = 32
     normalize: bool = True
     use_dummy: bool = False
+    num_workers: int = 1
+    threads_per_worker: int = 0  # 0 = cpu_count // num_workers
+    shard_size: int = 4096
+    max_restarts: int = 3
+    backend: str = "torch"  # torch | onnx
+    onnx_dir: str = "artifacts/onnx"
+    onnx_quantized: bool = False
+    onnx_threads: int = 0
 
 
 @dataclass
@@ -41,10 +51,28 @@ class ChunkingCfg:
     chunk_overlap: int = 50
 
 
+@dataclass
+class DedupCfg:
+    enabled: bool = False
+    doc_ids: str = "relpath"  # relpath | filename | content
+    near_duplicates: bool = True
+    num_perm: int = 64
+    bands: int = 16
+    threshold: float = 0.8  # estimated Jaccard similarity for near-duplicates
+    shingle_size: int = 5
+
+
 @dataclass
 class IndexCfg:
-    type: str = "IndexFlatIP"
+    type: str = "IndexFlatIP"  # or any faiss.index_factory string, e.g. "IVF1024,Flat", "HNSW32,Flat"
     metric: str = "ip"
+    train_size: int = 65536
+    recall_target: float = 0.95  # `rag tune` picks the cheapest search params reaching this Recall@k
+    tune_k: int = 10
+    mmap: bool = False  # serve the index read-only from a file mapping shared by all workers
+    prefault: bool = False  # read the index file into the page cache before serving
+    on_disk: bool = False  # IVF only: keep inverted lists in <index_path>.ivfdata instead of RAM
+    disk_cache_mb: float = 256  # hot inverted lists cached in RAM per process
 
 
 @dataclass
@@ -62,6 +90,131 @@ class LLMcfg:
     max_tokens: int = 512
 
 
+@dataclass
+class CacheCfg:
+    enabled: bool = False
+    threshold: float = 0.95  # cosine similarity between query embeddings
+    ttl_s: float = 3600.0
+    max_entries: int = 1024
+
+
+@dataclass
+class StreamingCfg:
+    coalesce_chars: int = 32  # flush once this many characters are buffered...
+    coalesce_ms: int = 50  # ...or this long after the previous flush
+
+
+@dataclass
+class AdmissionCfg:
+    enabled: bool = False  # opt-in
+    # Cheap retrieval requests
+    query_concurrency: int = 16
+    query_queue: int = 64
+    query_max_wait_s: float = 1.0
+    # LLM-backed /chain_* requests
+    chain_concurrency: int = 4
+    chain_queue: int = 16
+    chain_max_wait_s: float = 5.0
+
+
+@dataclass
+class ExecutionCfg:
+    enabled: bool = True
+    mode: str = "throughput"  # latency | throughput
+    workers: int = 0  # 0 = mode default
+    faiss_threads: int = 0
+    torch_threads: int = 0
+    max_queue: int = 64
+    queue_timeout_s: float = 5.0  # wait for a slot before answering 503; 0 = wait forever
+
+
+@dataclass
+class ServingCfg:
+    versions_dir: str = "artifacts/versions"
+    warmup_queries: int = 8
+    watch_interval_s: float = 0.0  # 0 = reload only via /admin/reload
+    admin_token: str | None = None
+
+
+@dataclass
+class CollectionsCfg:
+    memory_budget_mb: float = 0  # 0 = never evict
+    # name -> {index_path, index_meta_path, versions_dir, embedding: {...overrides}}
+    items: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class RecallMonitorCfg:
+    enabled: bool = False
+    sample_rate: float = 0.01  # fraction of live queries re-run against exact search
+    window: int = 1000  # rolling recall is the mean over the last `window` sampled queries
+    max_pending: int = 4  # sampled batches waiting for the exact pass before new samples are dropped
+
+
+@dataclass
+class DeadlineCfg:
+    default_ms: float = 0  # chain budget when the request sends no deadline_ms; 0 = unlimited
+    full_k_min_ms: float = 1500  # with less left before retrieval, fetch only min_k chunks
+    min_k: int = 2
+    rerank_min_ms: float = 1200  # skip rerank below this
+    generate_min_ms: float = 1000  # below this, return the retrieved contexts instead of calling the LLM
+    tokens_per_s: float = 40  # provider decode rate used to cap max_tokens to the remaining budget
+
+
+@dataclass
+class BatchCfg:
+    concurrency: int = 8  # concurrent LLM calls in `rag chain --batch`
+    rate_per_s: float = 0  # max LLM calls started per second; 0 = unlimited
+    max_retries: int = 3
+    backoff_s: float = 1.0  # first retry delay; doubles per attempt, with jitter
+    search_batch: int = 256  # queries per batched embedding + FAISS pass
+
+
+@dataclass
+class LLMRouterCfg:
+    # Used when llm.provider is "router": [{provider, model, name?, api_base?}, ...] in preference order
+    routes: List[Dict[str, Any]] = field(default_factory=list)
+    hedge_percentile: float = 95  # hedge once the primary is slower than this first-token percentile
+    hedge_min_ms: float = 100
+    hedge_initial_ms: float = 2000  # threshold until min_samples first-token times are recorded
+    min_samples: int = 20
+    window: int = 200
+    breaker_failures: int = 5  # consecutive failures that open a route's circuit
+    breaker_reset_s: float = 30  # open circuits let one trial call through after this
+
+
+@dataclass
+class MockLLMCfg:
+    # `rag mock-llm`: latency/error fields left as None take the named profile's values
+    profile: str = "typical"  # instant | fast | typical | slow-tail | flaky
+    port: int = 8010
+    ttft_ms: Optional[float] = None  # median time to first token
+    tokens_per_s: Optional[float] = None  # 0 = emit the whole completion at once
+    distribution: Optional[str] = None  # fixed | uniform | lognormal
+    jitter: Optional[float] = None  # uniform: +/- fraction of ttft_ms; lognormal: sigma
+    error_rate: Optional[float] = None
+    error_status: int = 503
+    completion_tokens: int = 64
+    seed: int = 0
+
+
+@dataclass
+class TrafficCfg:
+    record: bool = False  # append sampled API requests to `path` for `rag loadtest --traffic`
+    sample_rate: float = 0.01
+    path: str = "artifacts/traffic.jsonl"
+    endpoints: List[str] = field(default_factory=lambda: ["/query", "/query_batch", "/chain_query", "/chain_stream"])
+    max_body_bytes: int = 65536  # larger request bodies are not recorded
+
+
+@dataclass
+class MetricsCfg:
+    # `rag serve --workers N` (N > 1) shares metrics through this directory, wiped at startup
+    multiproc_dir: str = "artifacts/prometheus_multiproc"
+    request_latency_buckets: List[float] = field(default_factory=lambda: [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5])
+    chain_latency_buckets: List[float] = field(default_factory=lambda: [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30])
+
+
 @dataclass
 class EvalCfg:
     k_default: int = 10
@@ -70,6 +223,10 @@ class EvalCfg:
 @dataclass
 class ServerCfg:
     port: int = 8002
+    gzip_min_bytes: int = 1024  # 0 disables response compression
+    max_batch_queries: int = 256
+    access_log_sample: float = 0.0  # fraction of requests logging a summary with stage timings
+    tracemalloc_frames: int = 0  # > 0 traces allocations (with this stack depth) for /debug/resources?top=N
 
 
 @dataclass
@@ -91,6 +248,20 @@ class Settings:
     mlflow: MLflowCfg = field(default_factory=MLflowCfg)
     orchestration: Dict[str, Any] = field(default_factory=dict)
     prompt: Dict[str, Any] = field(default_factory=dict)
+    dedup: DedupCfg = field(default_factory=DedupCfg)
+    answer_cache: CacheCfg = field(default_factory=CacheCfg)
+    streaming: StreamingCfg = field(default_factory=StreamingCfg)
+    admission: AdmissionCfg = field(default_factory=AdmissionCfg)
+    execution: ExecutionCfg = field(default_factory=ExecutionCfg)
+    serving: ServingCfg = field(default_factory=ServingCfg)
+    collections: CollectionsCfg = field(default_factory=CollectionsCfg)
+    recall_monitor: RecallMonitorCfg = field(default_factory=RecallMonitorCfg)
+    deadline: DeadlineCfg = field(default_factory=DeadlineCfg)
+    batch: BatchCfg = field(default_factory=BatchCfg)
+    llm_router: LLMRouterCfg = field(default_factory=LLMRouterCfg)
+    mock_llm: MockLLMCfg = field(default_factory=MockLLMCfg)
+    traffic: TrafficCfg = field(default_factory=TrafficCfg)
+    metrics: MetricsCfg = field(default_factory=MetricsCfg)
 
 
 def load_yaml(path: str) -> Dict[str, Any]:
@@ -123,6 +294,20 @@ def load_settings() -> Settings:
     ev = EvalCfg(**base.get("eval", {}))
     srv = ServerCfg(**base.get("server", {}))
     mf = MLflowCfg(**base.get("mlflow", {}))
+    dd = DedupCfg(**base.get("dedup", {}))
+    ac = CacheCfg(**base.get("answer_cache", {}))
+    st = StreamingCfg(**base.get("streaming", {}))
+    adm = AdmissionCfg(**base.get("admission", {}))
+    exe = ExecutionCfg(**base.get("execution", {}))
+    sv = ServingCfg(**base.get("serving", {}))
+    col = CollectionsCfg(**base.get("collections", {}))
+    rm = RecallMonitorCfg(**base.get("recall_monitor", {}))
+    dl = DeadlineCfg(**base.get("deadline", {}))
+    bt = BatchCfg(**base.get("batch", {}))
+    lr = LLMRouterCfg(**base.get("llm_router", {}))
+    ml = MockLLMCfg(**base.get("mock_llm", {}))
+    tr = TrafficCfg(**base.get("traffic", {}))
+    mt = MetricsCfg(**base.get("metrics", {}))
     return Settings(
         seed=base.get("seed", 42),
         paths=paths,
@@ -136,4 +321,18 @@ def load_settings() -> Settings:
         mlflow=mf,
         orchestration=base.get("orchestration", {}),
         prompt=base.get("prompt", {}),
+        dedup=dd,
+        answer_cache=ac,
+        streaming=st,
+        admission=adm,
+        execution=exe,
+        serving=sv,
+        collections=col,
+        recall_monitor=rm,
+        deadline=dl,
+        batch=bt,
+        llm_router=lr,
+        mock_llm=ml,
+        traffic=tr,
+        metrics=mt,
     )
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from jinja2 import Template
+from langchain_core.documents import Document
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+TokenCounter = Callable[[str], int]
+
+# Below this many free tokens a truncated span is more noise than context
+_MIN_TRUNCATED_TOKENS = 32
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: Optional[str]):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}); estimating tokens as chars/4")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _merge_spans(docs: List[Document]) -> List[Dict]:
+    by_doc: Dict[str, List[Dict]] = {}
+    for rank, d in enumerate(docs):
+        m = d.metadata
+        by_doc.setdefault(m.get("doc_id"), []).append(
+            {
+                "doc_id": m.get("doc_id"),
+                "source": m.get("source"),
+                "start": m.get("start"),
+                "end": m.get("end"),
+                "text": d.page_content,
+                "score": m.get("score"),
+                "rank": rank,
+                "chunk_ids": [m.get("chunk_id")],
+                "duplicates": list(m.get("duplicates") or []),
+            }
+        )
+    merged: List[Dict] = []
+    for spans in by_doc.values():
+        if any(s["start"] is None or s["end"] is None for s in spans):
+            merged.extend(spans)
+            continue
+        spans.sort(key=lambda s: s["start"])
+        cur = spans[0]
+        for nxt in spans[1:]:
+            if nxt["start"] > cur["end"]:
+                merged.append(cur)
+                cur = nxt
+                continue
+            # Overlapping or adjacent: append only the characters past cur's end
+            if nxt["end"] > cur["end"]:
+                cur["text"] += nxt["text"][cur["end"] - nxt["start"] :]
+                cur["end"] = nxt["end"]
+            cur["rank"] = min(cur["rank"], nxt["rank"])
+            scores = [x for x in (cur["score"], nxt["score"]) if x is not None]
+            cur["score"] = max(scores) if scores else None
+            cur["chunk_ids"] += nxt["chunk_ids"]
+            cur["duplicates"] += nxt["duplicates"]
+        merged.append(cur)
+    merged.sort(key=lambda s: s["rank"])
+    return merged
+
+
+def _truncate(span: Dict, budget: int, counter: TokenCounter) -> Optional[Dict]:
+    text = span["text"]
+    tokens = counter(text)
+    cut = int(len(text) * budget / max(tokens, 1))
+    while cut > 0 and counter(text[:cut]) > budget:
+        cut = int(cut * 0.9)
+    if cut <= 0:
+        return None
+    out = dict(span)
+    out["text"] = text[:cut]
+    if out["start"] is not None:
+        out["end"] = out["start"] + cut
+    return out
+
+
+def pack_contexts(docs: List[Document], max_tokens: int, counter: TokenCounter = count_tokens, per_span_tokens: int = 0) -> List[Document]:
+    """Merge overlapping/adjacent spans per doc_id and greedily fill ``max_tokens`` in rank order.
+
+    Each packed span also costs ``per_span_tokens`` (the prompt template's markup around it).
+    Returned documents keep exact ``doc_id``/``start``/``end`` source ranges plus the merged
+    ``chunk_ids`` and a ``tokens`` count, so citations still point at what the prompt contains.
+    """
+    packed: List[Document] = []
+    remaining = max_tokens
+    for span in _merge_spans(docs):
+        tokens = counter(span["text"])
+        if tokens + per_span_tokens > remaining:
+            if remaining - per_span_tokens < _MIN_TRUNCATED_TOKENS:
+                continue
+            span = _truncate(span, remaining - per_span_tokens, counter)
+            if span is None:
+                continue
+            tokens = counter(span["text"])
+        remaining -= tokens + per_span_tokens
+        meta = {k: v for k, v in span.items() if k != "text"}
+        meta["tokens"] = tokens
+        packed.append(Document(page_content=span["text"], metadata=meta))
+    logger.debug(f"Packed {len(docs)} chunks into {len(packed)} spans, {max_tokens - remaining}/{max_tokens} tokens")
+    return packed
+
+
+def pack_for_prompt(docs: List[Document], question: str, system: str, max_context_tokens: int, model: Optional[str] = None, template: Optional[Template] = None) -> List[Document]:
+    """Pack ``docs`` into what ``max_context_tokens`` leaves after the rest of the prompt.
+
+    With ``template`` the fixed cost is the template rendered without contexts and the markup
+    one extra context adds is charged per span; the rendered prompt is then checked and the
+    budget shrunk by any overshoot (tokenization is not quite additive). Without it only
+    system + question count.
+    """
+
+    def counter(text: str) -> int:
+        return count_tokens(text, model)
+
+    if template is None:
+        return pack_contexts(docs, max(0, max_context_tokens - counter(system) - counter(question)), counter)
+
+    def render(contexts: List[str]) -> int:
+        return counter(template.render(system=system, question=question, contexts=contexts))
+
+    fixed = render([])
+    per_span = max(0, render([""]) - fixed)
+    budget = max(0, max_context_tokens - fixed)
+    while True:
+        packed = pack_contexts(docs, budget, counter, per_span)
+        overshoot = render([d.page_content for d in packed]) - max_context_tokens
+        if overshoot <= 0 or not packed or budget == 0:
+            return packed
+        budget = max(0, budget - overshoot)
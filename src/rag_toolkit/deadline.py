@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional
+
+from .config import DeadlineCfg, LLMcfg, LLMRouterCfg
+from .logging import get_logger
+from .metrics import rag_chain_deadline_exceeded_total, rag_chain_degradations_total
+from .providers import build_llm
+
+logger = get_logger(__name__)
+
+
+class Deadline:
+    """Time budget for one chain request and the degradations applied to stay within it.
+
+    Stages ask ``below(ms)`` before optional or expensive work and call ``degrade`` when
+    they cut it; without a budget every check passes and nothing is degraded.
+    """
+
+    def __init__(self, budget_ms: Optional[float], cfg: DeadlineCfg, engine: str) -> None:
+        self.cfg = cfg
+        self.engine = engine
+        self.budget_ms = float(budget_ms) if budget_ms else None
+        self.t_end = time.monotonic() + self.budget_ms / 1000.0 if self.budget_ms else None
+        self.degradations: List[str] = []
+
+    @classmethod
+    def from_payload(cls, payload: Dict, cfg: DeadlineCfg, engine: str) -> "Deadline":
+        return cls(payload.get("deadline_ms") or cfg.default_ms, cfg, engine)
+
+    def remaining_ms(self) -> float:
+        if self.t_end is None:
+            return float("inf")
+        return max(0.0, (self.t_end - time.monotonic()) * 1000.0)
+
+    def below(self, ms: float) -> bool:
+        return self.remaining_ms() < ms
+
+    def degrade(self, kind: str) -> None:
+        if kind not in self.degradations:
+            self.degradations.append(kind)
+            rag_chain_degradations_total.labels(engine=self.engine, kind=kind).inc()
+            logger.info(f"{self.engine}: {kind} with {self.remaining_ms():.0f}ms of {self.budget_ms:.0f}ms left")
+
+    def shrink_k(self, k: int) -> int:
+        if k > self.cfg.min_k and self.below(self.cfg.full_k_min_ms):
+            self.degrade("shrink_k")
+            return self.cfg.min_k
+        return k
+
+    def skip_rerank(self) -> bool:
+        if self.below(self.cfg.rerank_min_ms):
+            self.degrade("skip_rerank")
+            return True
+        return False
+
+    def skip_generation(self) -> bool:
+        if self.below(self.cfg.generate_min_ms):
+            self.degrade("skip_generation")
+            return True
+        return False
+
+    def max_tokens(self, configured: int) -> int:
+        """``configured`` capped to what the provider can emit in the remaining time."""
+        if self.t_end is None:
+            return configured
+        affordable = max(1, int(self.remaining_ms() / 1000.0 * self.cfg.tokens_per_s))
+        if affordable < configured:
+            self.degrade("cap_max_tokens")
+            return affordable
+        return configured
+
+    def timeout_s(self) -> Optional[float]:
+        return None if self.t_end is None else max(0.001, self.remaining_ms() / 1000.0)
+
+    def finish(self) -> None:
+        if self.t_end is not None and time.monotonic() > self.t_end:
+            rag_chain_deadline_exceeded_total.labels(engine=self.engine).inc()
+
+
+def build_llm_within(deadline: Deadline, cfg: LLMcfg, stream: bool, router: Optional[LLMRouterCfg] = None):
+    """The configured LLM fitted to the remaining budget, or ``NoLLM`` (retrieved contexts) when it can't fit."""
+    if deadline.skip_generation():
+        return build_llm("null", cfg.model, float(cfg.temperature), int(cfg.max_tokens), stream)
+    provider = cfg.provider or "null"
+    if provider == "null":
+        return build_llm(provider, cfg.model, float(cfg.temperature), int(cfg.max_tokens), stream)
+    return build_llm(provider, cfg.model, float(cfg.temperature), deadline.max_tokens(int(cfg.max_tokens)), stream, timeout=deadline.timeout_s(), router=router, api_base=cfg.api_base)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from .config import DedupCfg
+from .loaders import Document, content_id
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def duplicate_documents(docs: List[Document]) -> Dict[str, List[str]]:
+    """Map the first document of each identical-content group to the relpaths of its copies."""
+    seen: Dict[str, Document] = {}
+    aliases: Dict[str, List[str]] = {}
+    for doc in docs:
+        first = seen.setdefault(content_id(doc.text or ""), doc)
+        if first is not doc:
+            aliases.setdefault(first.meta.get("relpath", first.doc_id), []).append(doc.meta.get("relpath", doc.path))
+    return aliases
+
+
+def _shingle_hashes(text: str, size: int) -> np.ndarray:
+    b = np.frombuffer(normalize_text(text).encode("utf-8"), dtype=np.uint8)
+    if b.size == 0:
+        return np.zeros(1, dtype=np.uint64)
+    if b.size < size:
+        b = np.pad(b, (0, size - b.size))
+    windows = np.lib.stride_tricks.sliding_window_view(b, size).astype(np.uint64)
+    powers = np.full(size, 257, dtype=np.uint64) ** np.arange(size, dtype=np.uint64)
+    return np.unique((windows * powers).sum(axis=1))
+
+
+def minhash_signatures(texts: List[str], num_perm: int, shingle_size: int, seed: int = 0) -> np.ndarray:
+    rs = np.random.RandomState(seed)
+    # Multiply-add permutations modulo 2**64 (uint64 wrap-around); odd multipliers keep them bijective
+    a = rs.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rs.randint(0, 1 << 62, size=num_perm, dtype=np.int64).astype(np.uint64)
+    sigs = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, t in enumerate(texts):
+        h = _shingle_hashes(t, shingle_size)
+        sigs[i] = (h[:, None] * a[None, :] + b[None, :]).min(axis=0)
+    return sigs
+
+
+def _lsh_components(sigs: np.ndarray, bands: int, threshold: float) -> np.ndarray:
+    n, num_perm = sigs.shape
+    rows = max(1, num_perm // bands)
+    parent = np.arange(n)
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        for i in range(n):
+            buckets[sigs[i, band * rows : (band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            head = members[0]
+            for j in members[1:]:
+                ri, rj = find(head), find(j)
+                if ri == rj:
+                    continue
+                if float(np.mean(sigs[head] == sigs[j])) >= threshold:
+                    parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(i) for i in range(n)])
+
+
+def find_duplicates(texts: List[str], cfg: DedupCfg) -> np.ndarray:
+    """Return ``canonical`` where ``canonical[i]`` is the index of the chunk kept in place of ``i``."""
+    canonical = np.arange(len(texts))
+    first: Dict[str, int] = {}
+    for i, t in enumerate(texts):
+        key = hashlib.sha1(normalize_text(t).encode("utf-8")).hexdigest()
+        canonical[i] = first.setdefault(key, i)
+    if cfg.near_duplicates:
+        unique = np.flatnonzero(canonical == np.arange(len(texts)))
+        if unique.size > 1:
+            sigs = minhash_signatures([texts[i] for i in unique], cfg.num_perm, cfg.shingle_size)
+            roots = unique[_lsh_components(sigs, cfg.bands, cfg.threshold)]
+            remap = dict(zip(unique.tolist(), roots.tolist()))
+            canonical = np.array([remap[c] for c in canonical])
+    return canonical
+
+
+def dedup_chunks(table: pa.Table, cfg: DedupCfg) -> Tuple[pa.Table, Dict[str, List[Dict]]]:
+    """Keep canonical chunks only; map canonical chunk_id -> duplicate chunk locations."""
+    if table.num_rows == 0:
+        return table, {}
+    canonical = find_duplicates(table.column("text").to_pylist(), cfg)
+    keep = canonical == np.arange(table.num_rows)
+    dup_idx = np.flatnonzero(~keep)
+    rows = table.take(pa.array(dup_idx)).select(["chunk_id", "doc_id", "start", "end", "source"]).to_pylist()
+    canonical_ids = table.column("chunk_id").take(pa.array(canonical[dup_idx])).to_pylist()
+    duplicates: Dict[str, List[Dict]] = {}
+    for cid, row in zip(canonical_ids, rows):
+        duplicates.setdefault(cid, []).append(row)
+    logger.info(f"Dedup kept {int(keep.sum())}/{table.num_rows} chunks ({len(duplicates)} with duplicates)")
+    return table.filter(pa.array(keep)), duplicates
+
+
+def persist_dedup_map(path: str, chunks: Dict[str, List[Dict]], documents: Dict[str, List[str]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"chunks": chunks, "documents": documents}, f)
+    logger.info(f"Saved dedup map to {path}")
+
+
+def load_dedup_map(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"chunks": {}, "documents": {}}
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .logging import get_logger
+from .metrics import rag_disk_ivf_bytes_read, rag_disk_ivf_cache_requests_total, rag_disk_ivf_read_bytes_per_query
+
+logger = get_logger(__name__)
+
+
+def disk_paths(index_path: str) -> Tuple[str, str]:
+    """(inverted-list data, per-list ``[offset, count]`` table) stored next to ``index_path``."""
+    return index_path + ".ivfdata", index_path + ".ivflists.npy"
+
+
+def is_disk_index(index_path: str) -> bool:
+    return os.path.exists(disk_paths(index_path)[1])
+
+
+def remove_disk_lists(index_path: str) -> None:
+    for path in disk_paths(index_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _blocks(embeddings):
+    return embeddings.iter_blocks() if hasattr(embeddings, "iter_blocks") else [embeddings]
+
+
+def check_disk_ivf(index) -> None:
+    """Only a bare ``IndexIVF*`` can be served from disk: lists are assigned, encoded and searched
+    with its own quantizer, which a PCA/OPQ pre-transform wrapper does not expose."""
+    if not isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+        raise ValueError(f"index.on_disk needs a plain IVF index type (e.g. 'IVF1024,PQ32'), got {type(faiss.downcast_index(index)).__name__}; drop the PCA/OPQ prefix")
+
+
+def build_disk_ivf(embeddings, index_path: str, ivf, batch_size: int = 65536, tmp_dir: Optional[str] = None) -> "DiskIVFIndex":
+    """Encode ``embeddings`` into on-disk inverted lists for the trained IVF ``ivf``.
+
+    Each batch is assigned, encoded and written to its own run file sorted by list; the runs
+    are then merged list by list into ``<index_path>.ivfdata``. Only one batch and the
+    per-run list counts are ever in memory. List ``lst`` is stored as ``ids[n]`` (int64)
+    followed by ``codes[n, code_size]`` (``ivf.sa_encode`` output, so PQ/SQ codes stay compressed).
+    """
+    check_disk_ivf(ivf)
+    nlist, code_size = faiss.extract_index_ivf(ivf).nlist, ivf.sa_code_size()
+    work = tempfile.mkdtemp(prefix="ivf-runs-", dir=tmp_dir or os.path.dirname(os.path.abspath(index_path)))
+    runs: List[Tuple[str, str, np.ndarray]] = []
+    try:
+        offset = 0
+        for block in _blocks(embeddings):
+            for lo in range(0, len(block), batch_size):
+                x = np.ascontiguousarray(block[lo : lo + batch_size], dtype=np.float32)
+                lists = ivf.quantizer.assign(x, 1).ravel()
+                order = np.argsort(lists, kind="stable")
+                i = len(runs)
+                ids_path, codes_path = os.path.join(work, f"{i}.ids.npy"), os.path.join(work, f"{i}.codes.npy")
+                np.save(ids_path, (order + offset).astype(np.int64))
+                np.save(codes_path, ivf.sa_encode(x[order]))
+                runs.append((ids_path, codes_path, np.bincount(lists, minlength=nlist)))
+                offset += len(x)
+        counts = np.sum([r[2] for r in runs], axis=0) if runs else np.zeros(nlist, dtype=np.int64)
+        sizes = counts * (8 + code_size)
+        table = np.stack([np.concatenate([[0], np.cumsum(sizes)[:-1]]), counts], axis=1).astype(np.int64)
+        data_path, table_path = disk_paths(index_path)
+        opened = [(np.load(i, mmap_mode="r"), np.load(c, mmap_mode="r"), np.concatenate([[0], np.cumsum(n)])) for i, c, n in runs]
+        with open(data_path + ".tmp", "wb") as f:
+            for lst in range(nlist):
+                f.write(b"".join(ids[starts[lst] : starts[lst + 1]].tobytes() for ids, _, starts in opened))
+                f.write(b"".join(codes[starts[lst] : starts[lst + 1]].tobytes() for _, codes, starts in opened))
+        del opened
+        np.save(table_path + ".tmp.npy", table)
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(table_path + ".tmp.npy", table_path)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    logger.info(f"Wrote {int(counts.sum())} vectors into {nlist} on-disk lists ({int(sizes.sum()) / 2**20:.1f} MB) from {len(runs)} batches")
+    return DiskIVFIndex(ivf, index_path)
+
+
+class DiskIVFIndex:
+    """IVF search with centroids in RAM and inverted lists read from local disk.
+
+    Exposes the subset of the FAISS index API the retriever and tuner use (``search``,
+    ``d``, ``ntotal``, ``metric_type``, ``nprobe``). The probed lists of a whole batch are
+    de-duplicated, served from an LRU cache of hot lists when resident, and otherwise read
+    in file order with adjacent lists coalesced into one ``pread``.
+    """
+
+    def __init__(self, ivf, index_path: str, cache_bytes: int = 256 << 20) -> None:
+        self.ivf = ivf
+        self.index_path = index_path
+        data_path, table_path = disk_paths(index_path)
+        self.table = np.load(table_path)
+        self.d = ivf.d
+        self.metric_type = ivf.metric_type
+        self.nlist = len(self.table)
+        self.ntotal = int(self.table[:, 1].sum())
+        self.code_size = ivf.sa_code_size()
+        self.cache_bytes = cache_bytes
+        self._fd = os.open(data_path, os.O_RDONLY)
+        self._cache: "OrderedDict[int, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._cached = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.bytes_read = self.queries = 0
+
+    @property
+    def nprobe(self) -> int:
+        return faiss.extract_index_ivf(self.ivf).nprobe
+
+    @nprobe.setter
+    def nprobe(self, value: int) -> None:
+        faiss.extract_index_ivf(self.ivf).nprobe = int(value)
+
+    def _split(self, lst: int, raw: bytes) -> Tuple[np.ndarray, np.ndarray]:
+        n = int(self.table[lst, 1])
+        ids = np.frombuffer(raw, dtype=np.int64, count=n)
+        codes = np.frombuffer(raw, dtype=np.uint8, offset=8 * n).reshape(n, self.code_size)
+        return ids, codes
+
+    def _fetch(self, wanted: np.ndarray) -> Tuple[Dict[int, Tuple[np.ndarray, np.ndarray]], int]:
+        """Lists ``wanted`` (sorted) from the cache or disk; returns them and the bytes read."""
+        got: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        with self._lock:
+            for lst in wanted.tolist():
+                if lst in self._cache:
+                    self._cache.move_to_end(lst)
+                    got[lst] = self._cache[lst]
+        missing = [lst for lst in wanted.tolist() if lst not in got]
+        rag_disk_ivf_cache_requests_total.labels("hit").inc(len(got))
+        rag_disk_ivf_cache_requests_total.labels("miss").inc(len(missing))
+        read = 0
+        i = 0
+        # Lists are laid out in id order, so sorted misses are sorted file offsets; runs of
+        # neighbouring lists are fetched with a single read
+        while i < len(missing):
+            j = i
+            while j + 1 < len(missing) and missing[j + 1] == missing[j] + 1:
+                j += 1
+            start = int(self.table[missing[i], 0])
+            end = int(self.table[missing[j], 0] + self.table[missing[j], 1] * (8 + self.code_size))
+            raw = os.pread(self._fd, end - start, start) if end > start else b""
+            read += len(raw)
+            for lst in missing[i : j + 1]:
+                lo = int(self.table[lst, 0]) - start
+                got[lst] = self._split(lst, raw[lo : lo + int(self.table[lst, 1]) * (8 + self.code_size)])
+            i = j + 1
+        with self._lock:
+            self.hits += len(wanted) - len(missing)
+            self.misses += len(missing)
+            self.bytes_read += read
+            for lst in missing:
+                self._admit(lst, got[lst])
+        return got, read
+
+    def _admit(self, lst: int, entry: Tuple[np.ndarray, np.ndarray]) -> None:
+        size = entry[0].nbytes + entry[1].nbytes
+        if size > self.cache_bytes or lst in self._cache:
+            return
+        self._cache[lst] = entry
+        self._cached += size
+        while self._cached > self.cache_bytes:
+            _, (ids, codes) = self._cache.popitem(last=False)
+            self._cached -= ids.nbytes + codes.nbytes
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        ip = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        _, probe = self.ivf.quantizer.search(x, min(self.nprobe, self.nlist))
+        lists, read = self._fetch(np.unique(probe[probe >= 0]))
+        decoded = {lst: (ids, self.ivf.sa_decode(codes) if len(ids) else np.empty((0, self.d), np.float32)) for lst, (ids, codes) in lists.items()}
+        D = np.full((len(x), k), -np.inf if ip else np.inf, dtype=np.float32)
+        labels = np.full((len(x), k), -1, dtype=np.int64)
+        for q in range(len(x)):
+            parts = [decoded[lst] for lst in probe[q] if lst >= 0]
+            ids = np.concatenate([p[0] for p in parts])
+            if not len(ids):
+                continue
+            vecs = np.vstack([p[1] for p in parts])
+            scores = vecs @ x[q] if ip else ((vecs - x[q]) ** 2).sum(axis=1)
+            top = min(k, len(ids))
+            sel = np.argpartition(-scores if ip else scores, top - 1)[:top]
+            sel = sel[np.argsort(-scores[sel] if ip else scores[sel], kind="stable")]
+            D[q, :top], labels[q, :top] = scores[sel], ids[sel]
+        with self._lock:
+            self.queries += len(x)
+        if len(x):
+            rag_disk_ivf_bytes_read.inc(read)
+            for _ in range(len(x)):
+                rag_disk_ivf_read_bytes_per_query.observe(read / len(x))
+        return D, labels
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "nlist": self.nlist,
+                "nprobe": self.nprobe,
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+                "cached_lists": len(self._cache),
+                "cached_bytes": self._cached,
+                "cache_capacity_bytes": self.cache_bytes,
+                "bytes_read": self.bytes_read,
+                "bytes_read_per_query": self.bytes_read / self.queries if self.queries else 0.0,
+            }
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
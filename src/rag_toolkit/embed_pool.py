@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import EmbeddingCfg
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+ProgressFn = Callable[[int, int], None]
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Per-worker state, populated once by _init_worker
+_worker_embedder = None
+_worker_texts = None
+
+
+def _init_worker(cfg: EmbeddingCfg, seed: int, chunks_path: str, threads: int) -> None:
+    global _worker_embedder, _worker_texts
+    # Must run before torch is imported so its intra-op pool picks the limit up
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+    import pyarrow.parquet as pq
+
+    from .embedder import Embedder
+
+    _worker_embedder = Embedder(cfg, seed=seed)
+    # Memory-mapped so every worker shares the same page cache pages
+    _worker_texts = pq.read_table(chunks_path, columns=["text"], memory_map=True).column("text")
+
+
+def _worker_dim() -> int:
+    return _worker_embedder.dim
+
+
+def _embed_shard(out_path: str, start: int, end: int, batch_size: int) -> Tuple[int, int]:
+    texts = _worker_texts.slice(start, end - start).to_pylist()
+    vecs = _worker_embedder.embed_texts(texts, batch_size=batch_size)
+    out = np.load(out_path, mmap_mode="r+")
+    out[start:end] = vecs
+    out.flush()
+    del out
+    return start, end
+
+
+def embed_shard_file(path: str, start: int, end: int, batch_size: int) -> Tuple[int, int]:
+    texts = _worker_texts.slice(start, end - start).to_pylist()
+    vecs = _worker_embedder.embed_texts(texts, batch_size=batch_size)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, vecs)
+    os.replace(tmp, path)
+    return start, end
+
+
+def _log_progress(done: int, total: int) -> None:
+    logger.info(f"Embedded {done}/{total} chunks")
+
+
+def shard_ranges(n: int, shard_size: int) -> List[Tuple[int, int]]:
+    return [(i, min(i + shard_size, n)) for i in range(0, n, shard_size)]
+
+
+def run_embedding_pool(
+    chunks_path: str,
+    cfg: EmbeddingCfg,
+    seed: int,
+    ranges: List[Tuple[int, int]],
+    submit: Callable[[ProcessPoolExecutor, int, int], Future],
+    on_done: Callable[[int, int], None],
+    num_workers: int,
+    threads_per_worker: Optional[int] = None,
+    on_dim: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Run embedding tasks over ``ranges`` in spawned workers and return the embedding dim.
+
+    ``submit(pool, start, end)`` schedules one range; ``on_done`` runs in the parent as
+    each range completes. Ranges lost to a crashed worker are resubmitted to a fresh
+    pool, up to ``cfg.max_restarts`` times.
+    """
+    num_workers = max(1, num_workers)
+    threads = threads_per_worker or cfg.threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+    pending = list(ranges)
+    restarts = 0
+    dim = None
+    ctx = mp.get_context("spawn")
+    logger.info(f"Embedding {len(pending)} shards with {num_workers} workers x {threads} threads")
+
+    while True:
+        pool = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(cfg, seed, chunks_path, threads),
+        )
+        try:
+            if dim is None:
+                dim = int(pool.submit(_worker_dim).result())
+                if on_dim is not None:
+                    on_dim(dim)
+            futures: Dict = {submit(pool, s, e): (s, e) for s, e in pending}
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    s, e = futures.pop(fut)
+                    fut.result()
+                    pending.remove((s, e))
+                    on_done(s, e)
+            return dim
+        except BrokenProcessPool:
+            restarts += 1
+            if restarts > cfg.max_restarts:
+                raise RuntimeError(f"Embedding pool crashed {restarts} times; {len(pending)} shards left")
+            logger.warning(f"Embedding worker crashed; restarting pool ({restarts}/{cfg.max_restarts}) with {len(pending)} shards left")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def embed_parquet_parallel(
+    chunks_path: str,
+    out_path: str,
+    cfg: EmbeddingCfg,
+    seed: int = 42,
+    num_workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+) -> Tuple[int, int]:
+    """Embed the ``text`` column of a chunks parquet into a single ``.npy`` at ``out_path``.
+
+    Each worker loads the model once and writes its shards straight into the shared memmap.
+    """
+    import pyarrow.parquet as pq
+
+    progress = progress or _log_progress
+    n = pq.ParquetFile(chunks_path).metadata.num_rows
+    done = 0
+    t0 = time.time()
+
+    def _create(dim: int) -> None:
+        out = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(n, dim))
+        del out
+
+    def _done(s: int, e: int) -> None:
+        nonlocal done
+        done += e - s
+        progress(done, n)
+
+    dim = run_embedding_pool(
+        chunks_path,
+        cfg,
+        seed,
+        shard_ranges(n, shard_size or cfg.shard_size),
+        lambda pool, s, e: pool.submit(_embed_shard, out_path, s, e, cfg.batch_size),
+        _done,
+        num_workers or cfg.num_workers,
+        threads_per_worker,
+        on_dim=_create,
+    )
+    logger.info(f"Embedded {n} chunks into {out_path} in {time.time() - t0:.1f}s")
+    return n, dim
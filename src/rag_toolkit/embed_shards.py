@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from .config import EmbeddingCfg
+from .embed_pool import ProgressFn, embed_shard_file, shard_ranges, run_embedding_pool
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ProgressTracker:
+    """Progress/ETA over a run that may have resumed with ``done`` chunks already embedded."""
+
+    def __init__(self, total: int, done: int = 0, log_every_s: float = 10.0) -> None:
+        self.total = total
+        self.resumed = done
+        self.done = done
+        self.t0 = time.time()
+        self.log_every_s = log_every_s
+        self._last_log = 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        elapsed = time.time() - self.t0
+        fresh = self.done - self.resumed
+        if fresh <= 0 or elapsed <= 0:
+            return None
+        return (self.total - self.done) / (fresh / elapsed)
+
+    def __call__(self, done: int, total: int) -> None:
+        self.done = done
+        now = time.time()
+        if done < total and now - self._last_log < self.log_every_s:
+            return
+        self._last_log = now
+        eta = self.eta_seconds()
+        rate = (self.done - self.resumed) / max(now - self.t0, 1e-9)
+        eta_s = f"{eta:.0f}s" if eta is not None else "n/a"
+        logger.info(f"Embedded {done}/{total} chunks ({100.0 * done / max(total, 1):.1f}%), {rate:.1f} chunks/s, ETA {eta_s}")
+
+
+def _shard_file(i: int) -> str:
+    return f"shard_{i:05d}.npy"
+
+
+def _file_digest(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _fingerprint(chunks_path: str, cfg: EmbeddingCfg, shard_size: int) -> str:
+    meta = pq.ParquetFile(chunks_path).metadata
+    # Content, not size: a same-length text edit must not resume against stale shards
+    key = [meta.num_rows, _file_digest(chunks_path), cfg.model_name, cfg.backend, cfg.onnx_quantized, cfg.normalize, cfg.use_dummy, shard_size]
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def _write_manifest(out_dir: str, manifest: Dict) -> None:
+    tmp = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_NAME))
+
+
+def load_manifest(out_dir: str) -> Dict:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def embed_to_shards(
+    chunks_path: str,
+    out_dir: str,
+    cfg: EmbeddingCfg,
+    seed: int = 42,
+    num_workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+) -> Dict:
+    """Embed a chunks parquet into numbered ``.npy`` shards, resuming from ``manifest.json``.
+
+    Every finished shard is recorded in the manifest before the next one is reported, so an
+    interrupted run restarts from the first missing shard. A manifest for different chunks,
+    model or shard size is discarded.
+    """
+    shard_size = shard_size or cfg.shard_size
+    num_workers = num_workers or cfg.num_workers
+    os.makedirs(out_dir, exist_ok=True)
+    n = pq.ParquetFile(chunks_path).metadata.num_rows
+    fingerprint = _fingerprint(chunks_path, cfg, shard_size)
+    manifest = load_manifest(out_dir)
+    if manifest.get("fingerprint") != fingerprint:
+        if manifest:
+            logger.info(f"Chunks or embedding config changed; discarding shards in {out_dir}")
+        for name in os.listdir(out_dir):
+            if name.startswith("shard_"):
+                os.remove(os.path.join(out_dir, name))
+        manifest = {"fingerprint": fingerprint, "num_chunks": n, "shard_size": shard_size, "dim": None, "shards": {}}
+        _write_manifest(out_dir, manifest)
+
+    ranges = shard_ranges(n, shard_size)
+    todo = [(s, e) for s, e in ranges if _shard_file(s // shard_size) not in manifest["shards"]]
+    done = n - sum(e - s for s, e in todo)
+    if todo and done:
+        logger.info(f"Resuming embedding at {done}/{n} chunks, {len(todo)} shards left")
+    tracker = progress or ProgressTracker(n, done)
+
+    def _record(s: int, e: int, dim: int) -> None:
+        nonlocal done
+        manifest["dim"] = dim
+        manifest["shards"][_shard_file(s // shard_size)] = {"start": s, "end": e}
+        _write_manifest(out_dir, manifest)
+        done += e - s
+        tracker(done, n)
+
+    if not todo:
+        logger.info(f"All {len(ranges)} embedding shards in {out_dir} are complete")
+    elif num_workers > 1:
+        dims: List[int] = []
+        run_embedding_pool(
+            chunks_path,
+            cfg,
+            seed,
+            todo,
+            lambda pool, s, e: pool.submit(
+                embed_shard_file, os.path.join(out_dir, _shard_file(s // shard_size)), s, e, cfg.batch_size
+            ),
+            lambda s, e: _record(s, e, dims[0]),
+            num_workers,
+            threads_per_worker,
+            on_dim=dims.append,
+        )
+    else:
+        from .chunker import read_chunks
+        from .embedder import Embedder
+
+        texts = read_chunks(chunks_path).column("text")
+        emb = Embedder(cfg, seed=seed)
+        for s, e in todo:
+            vecs = emb.embed_column(texts.slice(s, e - s), batch_size=cfg.batch_size)
+            path = os.path.join(out_dir, _shard_file(s // shard_size))
+            np.save(path + ".tmp.npy", vecs)
+            os.replace(path + ".tmp.npy", path)
+            _record(s, e, int(vecs.shape[1]))
+    return manifest
+
+
+class ShardedEmbeddings:
+    """Read-only view over a completed shard directory; shards are memory-mapped on demand."""
+
+    def __init__(self, out_dir: str) -> None:
+        self.out_dir = out_dir
+        self.manifest = load_manifest(out_dir)
+        if not self.manifest:
+            raise FileNotFoundError(f"No embedding manifest in {out_dir}")
+        self.shards: List[Tuple[int, int, str]] = sorted(
+            (v["start"], v["end"], os.path.join(out_dir, name)) for name, v in self.manifest["shards"].items()
+        )
+        covered = sum(e - s for s, e, _ in self.shards)
+        if covered != self.manifest["num_chunks"]:
+            raise RuntimeError(f"Embedding shards in {out_dir} cover {covered}/{self.manifest['num_chunks']} chunks; rerun `rag embed`")
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return int(self.manifest["num_chunks"]), int(self.manifest["dim"] or 0)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def iter_blocks(self) -> Iterator[np.ndarray]:
+        for _, _, path in self.shards:
+            yield np.load(path, mmap_mode="r")
+
+
+def embeddings_fingerprint(embeddings, rows: int = 64) -> str:
+    """sha1 over the shape and ``rows`` evenly spaced vectors; identifies which embeddings an index was built from."""
+    n, d = int(embeddings.shape[0]), int(embeddings.shape[1])
+    h = hashlib.sha1(f"{n}x{d}".encode("ascii"))
+    keep = np.unique(np.linspace(0, n - 1, min(rows, n)).astype(np.int64)) if n else np.empty(0, np.int64)
+    offset = 0
+    for block in embeddings.iter_blocks() if hasattr(embeddings, "iter_blocks") else [embeddings]:
+        lo, hi = np.searchsorted(keep, [offset, offset + len(block)])
+        h.update(np.ascontiguousarray(block[keep[lo:hi] - offset], dtype=np.float32).tobytes())
+        offset += len(block)
+    return h.hexdigest()
+
+
+def _shards_current(embeddings_dir: str, embeddings_path: str, manifest: Dict, chunks_path: Optional[str], cfg: Optional[EmbeddingCfg]) -> bool:
+    if chunks_path is not None and cfg is not None and manifest.get("fingerprint") != _fingerprint(chunks_path, cfg, manifest.get("shard_size")):
+        logger.warning(f"Embedding shards in {embeddings_dir} are for other chunks or another model; ignoring them")
+        return False
+    # `rag embed --single-file` or `rag index` wrote the .npy after the last shard
+    if os.path.exists(embeddings_path) and os.path.getmtime(embeddings_path) > os.path.getmtime(os.path.join(embeddings_dir, MANIFEST_NAME)):
+        logger.info(f"{embeddings_path} is newer than the shards in {embeddings_dir}; using it")
+        return False
+    return True
+
+
+def open_embeddings(embeddings_dir: str, embeddings_path: str, chunks_path: Optional[str] = None, cfg: Optional[EmbeddingCfg] = None):
+    """Sharded embeddings when their manifest is current, else a memmap of the ``.npy`` file, else None.
+
+    Shards are current unless the ``.npy`` was written after them or, given ``chunks_path``
+    and ``cfg``, their fingerprint doesn't match those chunks and that embedding config.
+    """
+    manifest = load_manifest(embeddings_dir)
+    if manifest and _shards_current(embeddings_dir, embeddings_path, manifest, chunks_path, cfg):
+        return ShardedEmbeddings(embeddings_dir)
+    if os.path.exists(embeddings_path):
+        return np.load(embeddings_path, mmap_mode="r")
+    return None
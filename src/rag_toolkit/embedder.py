@@ -14,9 +14,11 @@ from .logging import get_logger
 logger = get_logger(__name__)
 
 
-def set_seeds(seed: int) -> None:
+def set_seeds(seed: int, torch_seed: bool = True) -> None:
     random.seed(seed)
     np.random.seed(seed)
+    if not torch_seed:
+        return
     try:
         import torch
 
@@ -43,11 +45,17 @@ class DummyEmbedder:
 class Embedder:
     def __init__(self, cfg: EmbeddingCfg, seed: int = 42) -> None:
         self.cfg = cfg
-        set_seeds(seed)
+        # The ONNX backend must not pull torch in just to seed it
+        set_seeds(seed, torch_seed=cfg.backend != "onnx")
         self.model = None
         self.dummy = None
+        self.onnx = None
         if cfg.use_dummy:
             self.dummy = DummyEmbedder()
+        elif cfg.backend == "onnx":
+            from .onnx_embedder import OnnxEmbedder
+
+            self.onnx = OnnxEmbedder(cfg.onnx_dir, cfg.model_name, quantized=cfg.onnx_quantized, threads=cfg.onnx_threads)
         else:
             from sentence_transformers import SentenceTransformer
 
@@ -55,10 +63,33 @@ class Embedder:
             self.model = SentenceTransformer(cfg.model_name, device=device)
             logger.info(f"Loaded sentence-transformers model {cfg.model_name} on {device}")
 
+    @property
+    def dim(self) -> int:
+        if self.dummy is not None:
+            return self.dummy.dim
+        if self.onnx is not None:
+            return self.onnx.dim
+        return int(self.model.get_sentence_embedding_dimension())
+
+    def embed_column(self, texts, batch_size: Optional[int] = None, window: int = 8192) -> np.ndarray:
+        """Embed an Arrow string column, materializing at most ``window`` Python strings at a time."""
+        n = len(texts)
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        out = None
+        for i in range(0, n, window):
+            arr = self.embed_texts(texts.slice(i, window).to_pylist(), batch_size=batch_size)
+            if out is None:
+                out = np.empty((n, arr.shape[1]), dtype=np.float32)
+            out[i : i + arr.shape[0]] = arr
+        return out
+
     def embed_texts(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
         batch_size = batch_size or self.cfg.batch_size
         if self.dummy is not None:
             arr = self.dummy.encode(texts)
+        elif self.onnx is not None:
+            arr = self.onnx.encode(texts, batch_size=batch_size)
         else:
             arr = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=False)
         if self.cfg.normalize:
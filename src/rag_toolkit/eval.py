@@ -40,8 +40,12 @@ def evaluate(queries: List[Dict], retrieve_fn, qrels: Dict[str, Dict[str, float]
         # convert chunk-level to doc-level ranking
         doc_order: List[str] = []
         seen = set()
+        q_qrels = qrels.get(qid, {})
         for r in results:
             doc_id = r["doc_id"]
+            # qrels reference files; content-addressed doc_ids keep the relpath in `source`
+            if doc_id not in q_qrels and r.get("source") in q_qrels:
+                doc_id = r["source"]
             if doc_id not in seen:
                 doc_order.append(doc_id)
                 seen.add(doc_id)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .config import ExecutionCfg
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def resolve_threads(cfg: ExecutionCfg) -> Tuple[int, int, int]:
+    """(workers, faiss threads per worker, torch threads) for ``cfg.mode``.
+
+    ``latency`` runs few queries at once and lets each use every core; ``throughput``
+    runs one query per core with single-threaded FAISS/torch so nothing oversubscribes.
+    Non-zero settings override the mode defaults.
+    """
+    cores = os.cpu_count() or 1
+    if cfg.mode == "latency":
+        workers, faiss_threads, torch_threads = 1, cores, cores
+    elif cfg.mode == "throughput":
+        workers, faiss_threads, torch_threads = cores, 1, 1
+    else:
+        raise ValueError(f"Unknown execution.mode {cfg.mode!r}; expected 'latency' or 'throughput'")
+    return cfg.workers or workers, cfg.faiss_threads or faiss_threads, cfg.torch_threads or torch_threads
+
+
+def _set_torch_threads(n: int) -> None:
+    # torch's intra-op pool is process-wide; only touch it if something already imported torch
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(n)
+
+
+class ExecutorBusy(RuntimeError):
+    """No search slot freed up within ``execution.queue_timeout_s``; the API answers 503."""
+
+
+class SearchExecutor:
+    """Bounded thread pool that owns all embedding and FAISS work.
+
+    ``omp_set_num_threads`` is per calling thread in OpenMP, so each worker pins its own
+    FAISS thread count in the initializer. Submissions beyond ``workers + max_queue``
+    wait up to ``queue_timeout_s`` for a slot, then raise ``ExecutorBusy`` instead of
+    growing an unbounded queue.
+    """
+
+    def __init__(self, cfg: ExecutionCfg) -> None:
+        self.cfg = cfg
+        self.mode = cfg.mode
+        self.workers, self.faiss_threads, self.torch_threads = resolve_threads(cfg)
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, cfg.max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"search-{self.mode}", initializer=self._init_thread)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retired = False
+        _set_torch_threads(self.torch_threads)
+        logger.info(f"Search executor mode={self.mode}: {self.workers} workers x {self.faiss_threads} FAISS threads, torch threads={self.torch_threads}")
+
+    def _init_thread(self) -> None:
+        faiss.omp_set_num_threads(self.faiss_threads)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            retired = self._retired
+            if not retired:
+                self._in_flight += 1
+        if retired:
+            # Retrievers built before a config change still hold this executor; hand their work on
+            successor = _executor
+            if successor is not None and successor is not self:
+                return successor.submit(fn, *args, **kwargs)
+            fut: Future = Future()
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                fut.set_exception(e)
+            return fut
+        timeout = self.cfg.queue_timeout_s if self.cfg.queue_timeout_s > 0 else None
+        if not self._slots.acquire(timeout=timeout):
+            self._done()
+            raise ExecutorBusy(f"No search slot free within {self.cfg.queue_timeout_s}s ({self.workers} workers, max_queue={self.cfg.max_queue})")
+        try:
+            fut = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            self._done()
+            raise
+        fut.add_done_callback(lambda _: (self._slots.release(), self._done()))
+        return fut
+
+    def _done(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            drained = self._retired and self._in_flight == 0
+        if drained:
+            self._pool.shutdown(wait=False)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    def retire(self) -> None:
+        """Stop the pool once the work already submitted has finished; later submissions go to the successor."""
+        with self._lock:
+            self._retired = True
+            drained = self._in_flight == 0
+        if drained:
+            self._pool.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+_executor: Optional[SearchExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_search_executor(cfg: ExecutionCfg) -> Optional[SearchExecutor]:
+    """Process-wide executor for ``cfg``; None when ``execution.enabled`` is off."""
+    global _executor
+    if not cfg.enabled:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor.cfg != cfg:
+            previous = _executor
+            _executor = SearchExecutor(cfg)
+            if previous is not None:
+                # Requests may still be running on it; shutting down now would fail their searches
+                previous.retire()
+        return _executor
+
+
+def _percentile(lat: List[float], q: float) -> float:
+    return float(np.percentile(lat, q)) * 1000.0 if lat else 0.0
+
+
+def benchmark_search(search: Callable[[str], object], queries: List[str], concurrency: int, duration_s: float) -> Dict:
+    """Closed-loop load: ``concurrency`` clients issue back-to-back searches for ``duration_s``."""
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    stop = time.perf_counter() + duration_s
+
+    def _client(i: int) -> None:
+        j = i
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            search(queries[j % len(queries)])
+            latencies[i].append(time.perf_counter() - t0)
+            j += concurrency
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat = [x for per in latencies for x in per]
+    return {
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "qps": len(lat) / elapsed,
+        "p50_ms": _percentile(lat, 50),
+        "p99_ms": _percentile(lat, 99),
+    }
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
 import time
-from typing import Dict, Generator, List
+from typing import Dict, Generator, List, Optional, Tuple
 
 from jinja2 import Environment, FileSystemLoader
 from langgraph.graph import StateGraph
 
+from .answer_cache import SemanticAnswerCache, answer_fingerprint, get_answer_cache, record_stream
 from .config import load_settings
+from .context import pack_for_prompt
+from .deadline import Deadline, build_llm_within
 from .embedder import Embedder
+from .executor import get_search_executor
 from .index_store import IndexStore
 from .lc_adapters import FAISSRetrieverAdapter, citations_from_documents
-from .providers import build_llm, make_messages
+from .providers import make_messages
 from .metrics import observe_chain, rag_query_rewritten_total
 from .logging import get_logger
 
@@ -18,13 +22,15 @@ logger = get_logger(__name__)
 
 
 class LGGraph:
-    def __init__(self) -> None:
+    def __init__(self, store: Optional[IndexStore] = None, embedder: Optional[Embedder] = None) -> None:
         s = load_settings()
         self.settings = s
-        self.embedder = Embedder(s.embedding, seed=s.seed)
-        store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
-        store.load()
+        self.embedder = embedder or Embedder(s.embedding, seed=s.seed)
+        if store is None:
+            store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
+            store.load(mmap=s.index.mmap, prefault_pages=s.index.prefault, disk_cache_mb=s.index.disk_cache_mb)
         self.store = store
+        self.executor = get_search_executor(s.execution)
         env = Environment(loader=FileSystemLoader("src/rag_toolkit"))
         self.template = env.get_template(s.prompt.get("template_path", "prompts/qa.j2"))
 
@@ -36,28 +42,40 @@ class LGGraph:
         return state
 
     def _retrieve(self, state: Dict) -> Dict:
-        k = int(state.get("k", self.settings.retrieval.get("k", 5)))
-        retr = FAISSRetrieverAdapter(self.store, self.embedder, k=k)
-        docs = retr.invoke(state.get("query", ""))
+        deadline = state["deadline"]
+        k = deadline.shrink_k(int(state.get("k", self.settings.retrieval.get("k", 5))))
+        retr = FAISSRetrieverAdapter(self.store, self.embedder, k=k, executor=self.executor)
+        qv = retr.retriever.embed_query(state.get("query", ""))
+        state["qv"] = qv
+        docs = retr.invoke_vector(qv)
+        if self.settings.orchestration.get("rerank", False) and not deadline.skip_rerank():
+            docs = retr.rerank(docs)
         state["docs"] = docs
         return state
 
     def _generate(self, state: Dict) -> Dict:
-        contexts = [d.page_content for d in state.get("docs", [])]
-        rendered = self.template.render(system=self.settings.prompt.get("system", ""), question=state.get("query", ""), contexts=contexts)
-        provider = self.settings.llm.provider or "null"
-        llm = build_llm(provider, self.settings.llm.model, float(self.settings.llm.temperature), int(self.settings.llm.max_tokens), bool(state.get("stream", False)))
-        state["llm"] = llm
+        system = self.settings.prompt.get("system", "")
+        question = state.get("query", "")
+        packed = pack_for_prompt(state.get("docs", []), question, system, int(self.settings.llm.max_context_tokens), self.settings.llm.model, self.template)
+        rendered = self.template.render(system=system, question=question, contexts=[d.page_content for d in packed])
+        state["packed"] = packed
         state["rendered"] = rendered
         return state
 
     def _postprocess(self, state: Dict) -> Dict:
         docs = state.get("docs", [])
-        cits = citations_from_documents(docs)
+        cits = citations_from_documents(state.get("packed", docs))
         state["citations"] = cits
         state["used_k"] = len(docs)
         return state
 
+    def _cache_key(self, state: Dict, engine: str) -> Tuple[Optional[SemanticAnswerCache], str]:
+        qv = state["qv"]
+        cache = get_answer_cache(self.settings.answer_cache, int(qv.shape[1]))
+        if cache is None:
+            return None, ""
+        return cache, answer_fingerprint([dict(d.metadata, text=d.page_content) for d in state.get("docs", [])], self.settings, engine)
+
     def invoke(self, payload: Dict) -> Dict:
         t0 = time.time()
         engine = "langgraph"
@@ -71,12 +89,26 @@ class LGGraph:
         g.add_edge("generate", "postprocess")
         g.set_entry_point("rewrite")
         graph = g.compile()
-        state = graph.invoke({"query": payload.get("query", ""), "k": payload.get("k", self.settings.retrieval.get("k", 5)), "stream": False})
-        llm = state.get("llm")
+        deadline = Deadline.from_payload(payload, self.settings.deadline, engine)
+        state = graph.invoke({"query": payload.get("query", ""), "k": payload.get("k", self.settings.retrieval.get("k", 5)), "stream": False, "deadline": deadline})
+        cache, fp = self._cache_key(state, engine)
+        if cache is not None:
+            cached = cache.get(state["qv"], fp, engine)
+            if cached is not None:
+                observe_chain(engine, "200", time.time() - t0, None)
+                return dict(cached, cached=True, degradations=deadline.degradations)
+        t_gen = time.time()
+        # Built only on a cache miss, as in LCChain: a hit must not pay for (or be degraded by) client setup
+        llm = build_llm_within(deadline, self.settings.llm, False, self.settings.llm_router)
         answer = llm.invoke(make_messages(self.settings.prompt.get("system", ""), state.get("rendered", "")))
+        result = {"answer": answer, "citations": state.get("citations", []), "used_k": state.get("used_k", 0), "engine": engine, "degradations": deadline.degradations}
+        # A degraded answer is not what a later request with time to spare should get
+        if cache is not None and not deadline.degradations:
+            cache.put(state["qv"], fp, result, time.time() - t_gen)
+        deadline.finish()
         latency = time.time() - t0
-        observe_chain(engine, "200", latency, None)
-        return {"answer": answer, "citations": state.get("citations", []), "used_k": state.get("used_k", 0), "engine": engine}
+        observe_chain(engine, "200", latency, {"context": sum(d.metadata["tokens"] for d in state.get("packed", []))})
+        return result
 
     def stream(self, payload: Dict) -> Generator[str, None, Dict]:
         t0 = time.time()
@@ -91,13 +123,27 @@ class LGGraph:
         g.add_edge("generate", "postprocess")
         g.set_entry_point("rewrite")
         graph = g.compile()
-        state = graph.invoke({"query": payload.get("query", ""), "k": payload.get("k", self.settings.retrieval.get("k", 5)), "stream": True})
-        llm = state.get("llm")
-        usage = yield from llm.stream(make_messages(self.settings.prompt.get("system", ""), state.get("rendered", "")))
+        deadline = Deadline.from_payload(payload, self.settings.deadline, engine)
+        state = graph.invoke({"query": payload.get("query", ""), "k": payload.get("k", self.settings.retrieval.get("k", 5)), "stream": True, "deadline": deadline})
+        cache, fp = self._cache_key(state, engine)
+        if cache is not None:
+            cached = cache.get(state["qv"], fp, engine)
+            if cached is not None:
+                yield cached["answer"]
+                observe_chain(engine, "200", time.time() - t0, None)
+                return {"answer": "", "citations": cached["citations"], "used_k": cached["used_k"], "engine": engine, "cached": True, "degradations": deadline.degradations}
+        t_gen = time.time()
+        llm = build_llm_within(deadline, self.settings.llm, True, self.settings.llm_router)
+        parts: List[str] = []
+        usage = yield from record_stream(llm.stream(make_messages(self.settings.prompt.get("system", ""), state.get("rendered", ""))), parts)
+        result = {"answer": "", "citations": state.get("citations", []), "used_k": state.get("used_k", 0), "engine": engine, "degradations": deadline.degradations}
+        if cache is not None and not deadline.degradations:
+            cache.put(state["qv"], fp, dict(result, answer="".join(parts)), time.time() - t_gen)
+        deadline.finish()
         latency = time.time() - t0
         observe_chain(engine, "200", latency, usage)
-        return {"answer": "", "citations": state.get("citations", []), "used_k": state.get("used_k", 0), "engine": engine}
+        return result
 
 
-def build_graph() -> LGGraph:
-    return LGGraph()
+def build_graph(store: Optional[IndexStore] = None, embedder: Optional[Embedder] = None) -> LGGraph:
+    return LGGraph(store, embedder)
@@ -1,54 +1,235 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, List, Tuple
+import os
+import time
+from typing import Dict, List, Optional, Sequence
 
 import faiss
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pj
+import pyarrow.parquet as pq
 
+from .embed_shards import embeddings_fingerprint
+from .disk_ivf import DiskIVFIndex, build_disk_ivf, check_disk_ivf, disk_paths, is_disk_index, remove_disk_lists
 from .logging import get_logger
 
 logger = get_logger(__name__)
 
+META_SCHEMA = pa.schema(
+    [
+        ("chunk_id", pa.string()),
+        ("doc_id", pa.string()),
+        ("start", pa.int64()),
+        ("end", pa.int64()),
+        ("text", pa.string()),
+        ("source", pa.string()),
+    ]
+)
+
+
+def factory_string(index_type: str) -> str:
+    # Legacy config names the flat class directly; everything else is a faiss.index_factory string
+    return "Flat" if index_type in ("IndexFlatIP", "IndexFlatL2") else index_type
+
+
+def tuning_path(index_path: str) -> str:
+    return index_path + ".tuning.json"
+
+
+def fingerprint_path(index_path: str) -> str:
+    return index_path + ".embeddings.json"
+
+
+def mmap_flags() -> int:
+    # IO_FLAG_MMAP_IFC maps flat codes, HNSW graphs and IVF lists in place; older FAISS only maps IVF lists
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", 0) or (faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+def write_index(index, path: str) -> None:
+    """Write via a temp file and rename: processes that mmap ``path`` keep the old inode instead of faulting.
+
+    For an on-disk IVF only the trained header (quantizer, nprobe) is written; its lists are already on disk.
+    """
+    tmp = path + ".tmp"
+    faiss.write_index(getattr(index, "ivf", index), tmp)
+    os.replace(tmp, path)
+
+
+def prefault(path: str, chunk_bytes: int = 1 << 24) -> float:
+    """Read ``path`` once so its pages are in the page cache before the first query; returns seconds."""
+    t0 = time.time()
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    buf = bytearray(chunk_bytes)
+    with open(path, "rb", buffering=0) as f:
+        while f.readinto(buf):
+            pass
+    return time.time() - t0
+
+
+def _blocks(embeddings):
+    return embeddings.iter_blocks() if hasattr(embeddings, "iter_blocks") else [embeddings]
+
+
+def training_sample(embeddings, n: int, seed: int = 0) -> np.ndarray:
+    """Uniform sample of up to ``n`` rows, drawn block by block so shards are never all resident."""
+    total = embeddings.shape[0]
+    if total <= n:
+        return np.vstack([np.asarray(b, dtype=np.float32) for b in _blocks(embeddings)])
+    rng = np.random.RandomState(seed)
+    keep = np.sort(rng.choice(total, n, replace=False))
+    parts, offset = [], 0
+    for block in _blocks(embeddings):
+        lo, hi = np.searchsorted(keep, [offset, offset + len(block)])
+        parts.append(np.asarray(block[keep[lo:hi] - offset], dtype=np.float32))
+        offset += len(block)
+    return np.vstack(parts)
+
 
 class IndexStore:
     def __init__(self, index_path: str, meta_path: str) -> None:
         self.index_path = index_path
         self.meta_path = meta_path
         self.index = None
-        self.meta: List[Dict] = []
+        self.meta: pa.Table = META_SCHEMA.empty_table()
+        self.search_params: Dict[str, float] = {}
+        self.mmap = False
+        # embeddings_fingerprint() of the vectors the index was built from, for ground-truth checks
+        self.embeddings_fingerprint: Optional[str] = None
 
-    def build(self, embeddings: np.ndarray, chunks_df: pd.DataFrame) -> None:
+    def build(
+        self,
+        embeddings,
+        chunks: pa.Table,
+        duplicates: Optional[Dict[str, List[Dict]]] = None,
+        index_type: str = "IndexFlatIP",
+        metric: str = "ip",
+        train_size: int = 65536,
+        on_disk: bool = False,
+    ) -> None:
+        """Build from an ``(n, d)`` array/memmap or anything with ``shape`` and ``iter_blocks()`` (sharded embeddings).
+
+        ``index_type`` is a ``faiss.index_factory`` string (``IVF1024,Flat``, ``HNSW32,Flat``, ...);
+        indexes that need training are trained on a sample of ``train_size`` vectors first.
+        With ``on_disk`` (plain IVF types only, no PCA/OPQ prefix) the inverted lists are written straight to
+        ``<index_path>.ivfdata`` batch by batch and only the centroids stay in memory.
+        """
+        if embeddings.shape[0] != chunks.num_rows:
+            raise ValueError(f"{embeddings.shape[0]} embeddings for {chunks.num_rows} chunks; re-run the embed stage")
         d = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(d)
-        self.index.add(embeddings)
-        logger.info(f"Built FAISS IndexFlatIP with {embeddings.shape[0]} vectors, dim={d}")
-        # Persist meta as JSONL
-        self.meta = []
-        for _, row in chunks_df.iterrows():
-            self.meta.append(
-                {
-                    "chunk_id": row["chunk_id"],
-                    "doc_id": row["doc_id"],
-                    "start": int(row["start"]),
-                    "end": int(row["end"]),
-                    "text": row["text"],
-                }
-            )
+        faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+        self.index = faiss.index_factory(d, factory_string(index_type), faiss_metric)
+        if on_disk:
+            check_disk_ivf(self.index)
+        if not self.index.is_trained:
+            sample = training_sample(embeddings, train_size)
+            logger.info(f"Training {index_type} on {len(sample)} vectors")
+            self.index.train(sample)
+        if on_disk:
+            self.index = build_disk_ivf(embeddings, self.index_path, self.index)
+        else:
+            for block in _blocks(embeddings):
+                self.index.add(np.ascontiguousarray(block, dtype=np.float32))
+        self.search_params = {}
+        self.mmap = False
+        self.embeddings_fingerprint = embeddings_fingerprint(embeddings)
+        logger.info(f"Built FAISS {index_type} with {self.index.ntotal} vectors, dim={d}")
+        if "source" not in chunks.column_names:
+            chunks = chunks.append_column("source", chunks.column("doc_id"))
+        # Column selection is zero-copy; chunk text stays in the Arrow buffers
+        meta = chunks.select(META_SCHEMA.names)
+        if duplicates:
+            ids = meta.column("chunk_id").to_pylist()
+            meta = meta.append_column("duplicates", pa.array([duplicates.get(cid) for cid in ids]))
+        self.meta = meta
+
+    def rows(self, ids: Sequence[int], columns: Optional[Sequence[str]] = None, snippet_chars: int = 0) -> List[Dict]:
+        table = self.meta if columns is None else self.meta.select([c for c in columns if c in self.meta.column_names])
+        table = table.take(pa.array(ids, pa.int64()))
+        if snippet_chars and "text" in table.column_names:
+            # Truncate in Arrow so full chunk texts never become Python strings
+            i = table.schema.get_field_index("text")
+            table = table.set_column(i, "text", pc.utf8_slice_codeunits(table.column("text"), 0, snippet_chars))
+        return table.to_pylist()
 
     def save(self) -> None:
         assert self.index is not None
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            for m in self.meta:
-                f.write(json.dumps(m) + "\n")
+        write_index(self.index, self.index_path)
+        if not isinstance(self.index, DiskIVFIndex):
+            # Lists left over from an earlier on-disk build would shadow this index on load
+            remove_disk_lists(self.index_path)
+        fp = fingerprint_path(self.index_path)
+        if self.embeddings_fingerprint is not None:
+            with open(fp + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": self.embeddings_fingerprint, "vectors": int(self.index.ntotal)}, f)
+            os.replace(fp + ".tmp", fp)
+        elif os.path.exists(fp):
+            os.remove(fp)
+        tmp = self.meta_path + ".tmp"
+        if self.meta_path.endswith(".parquet"):
+            pq.write_table(self.meta, tmp)
+        else:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for batch in self.meta.to_batches(max_chunksize=8192):
+                    for m in batch.to_pylist():
+                        f.write(json.dumps({k: v for k, v in m.items() if v is not None}) + "\n")
+        os.replace(tmp, self.meta_path)
         logger.info(f"Saved index to {self.index_path} and meta to {self.meta_path}")
 
-    def load(self) -> None:
-        self.index = faiss.read_index(self.index_path)
-        self.meta = []
-        with open(self.meta_path, "r", encoding="utf-8") as f:
-            for line in f:
-                self.meta.append(json.loads(line))
-        logger.info(f"Loaded index from {self.index_path} with {len(self.meta)} meta entries")
\ No newline at end of file
+    def load(self, mmap: bool = False, prefault_pages: bool = False, disk_cache_mb: float = 256) -> None:
+        """Read the index into the heap, or with ``mmap`` map it read-only from the file.
+
+        Mapped indexes load in constant time and their pages live in the OS page cache, so
+        every worker process on the host shares one copy. ``prefault_pages`` reads the file
+        up front so the first queries don't pay for page faults. Indexes built ``on_disk``
+        always keep their lists on disk, with up to ``disk_cache_mb`` of hot lists cached.
+        """
+        t0 = time.time()
+        disk = is_disk_index(self.index_path)
+        if prefault_pages:
+            path = disk_paths(self.index_path)[0] if disk else self.index_path
+            logger.info(f"Prefaulted {path} in {prefault(path):.2f}s")
+        if disk:
+            self.index = DiskIVFIndex(faiss.read_index(self.index_path), self.index_path, int(disk_cache_mb * (1 << 20)))
+            self.mmap = False
+        else:
+            self.index = faiss.read_index(self.index_path, mmap_flags() if mmap else 0)
+            self.mmap = mmap
+        self.meta = self._read_meta()
+        self.search_params = {}
+        tuned = tuning_path(self.index_path)
+        if os.path.exists(tuned):
+            with open(tuned, "r", encoding="utf-8") as f:
+                self.set_search_params(json.load(f).get("params", {}))
+        self.embeddings_fingerprint = None
+        fp = fingerprint_path(self.index_path)
+        if os.path.exists(fp):
+            with open(fp, "r", encoding="utf-8") as f:
+                self.embeddings_fingerprint = json.load(f).get("fingerprint")
+        mode = "on-disk lists" if disk else "mmap" if mmap else "heap"
+        logger.info(f"Loaded index from {self.index_path} ({mode}, {time.time() - t0:.3f}s) with {self.meta.num_rows} meta entries")
+
+    def set_search_params(self, params: Dict[str, float]) -> None:
+        """Apply search-time parameters such as ``nprobe`` or ``efSearch``."""
+        ps = faiss.ParameterSpace()
+        for name, value in params.items():
+            ps.set_index_parameter(getattr(self.index, "ivf", self.index), name, value)
+        self.search_params = dict(params)
+
+    def _read_meta(self) -> pa.Table:
+        if self.meta_path.endswith(".parquet"):
+            return pq.read_table(self.meta_path, memory_map=True)
+        if os.path.getsize(self.meta_path) == 0:
+            return META_SCHEMA.empty_table()
+        opts = pj.ParseOptions(explicit_schema=META_SCHEMA, unexpected_field_behavior="infer")
+        meta = pj.read_json(self.meta_path, parse_options=opts)
+        # Indexes written before chunks carried a source fall back to doc_id
+        source = pc.coalesce(meta.column("source"), meta.column("doc_id"))
+        return meta.set_column(meta.schema.get_field_index("source"), "source", source)
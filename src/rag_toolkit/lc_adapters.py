@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from langchain_core.documents import Document
 
 from .embedder import Embedder
+from .executor import SearchExecutor
 from .index_store import IndexStore
 from .retrieval import Retriever
 
@@ -16,15 +17,17 @@ def chunk_to_document(chunk: Dict) -> Document:
         "start": chunk.get("start"),
         "end": chunk.get("end"),
         "score": chunk.get("score"),
+        "source": chunk.get("source"),
+        "duplicates": chunk.get("duplicates", []),
     })
 
 
 class FAISSRetrieverAdapter:
-    def __init__(self, store: IndexStore, embedder: Embedder, k: int) -> None:
+    def __init__(self, store: IndexStore, embedder: Embedder, k: int, executor: Optional[SearchExecutor] = None) -> None:
         self.store = store
         self.embedder = embedder
         self.k = k
-        self.retriever = Retriever(store, embedder)
+        self.retriever = Retriever(store, embedder, executor)
 
     def get_relevant_documents(self, query: str) -> List[Document]:
         results = self.retriever.search(query, self.k)
@@ -33,14 +36,29 @@ class FAISSRetrieverAdapter:
     def invoke(self, query: str) -> List[Document]:
         return self.get_relevant_documents(query)
 
+    def invoke_vector(self, qv) -> List[Document]:
+        return [chunk_to_document(r) for r in self.retriever.search_vector(qv, self.k)]
+
+    def rerank(self, docs: List[Document]) -> List[Document]:
+        results = self.retriever.rerank([dict(d.metadata, text=d.page_content) for d in docs])
+        return [chunk_to_document(r) for r in results]
+
 
 def citations_from_documents(docs: List[Document]) -> List[Dict]:
     cits: List[Dict] = []
     for d in docs:
         m = d.metadata
-        cits.append({
+        cit = {
             "doc_id": m.get("doc_id"),
             "start": m.get("start"),
             "end": m.get("end"),
-        })
+        }
+        if m.get("chunk_ids"):
+            cit["chunk_ids"] = m["chunk_ids"]
+        if m.get("duplicates"):
+            cit["duplicates"] = [
+                {"doc_id": d["doc_id"], "source": d.get("source"), "start": d["start"], "end": d["end"]}
+                for d in m["duplicates"]
+            ]
+        cits.append(cit)
     return cits
@@ -15,6 +15,17 @@ class NoLLM:
         return "\n".join(contexts)
 
 
+# One pooled client per process so repeated answers reuse keep-alive connections
+_http: httpx.Client | None = None
+
+
+def _http_client() -> httpx.Client:
+    global _http
+    if _http is None:
+        _http = httpx.Client(timeout=30, limits=httpx.Limits(max_connections=64, max_keepalive_connections=16))
+    return _http
+
+
 class OpenAICompatibleLLM:
     def __init__(self, api_key: str, api_base: str, model: str) -> None:
         self.api_key = api_key
@@ -33,7 +44,7 @@ class OpenAICompatibleLLM:
         headers = {"Authorization": f"Bearer {self.api_key}"}
         url = f"{self.api_base}/chat/completions"
         try:
-            r = httpx.post(url, json=payload, headers=headers, timeout=30)
+            r = _http_client().post(url, json=payload, headers=headers)
             r.raise_for_status()
             data = r.json()
             return data["choices"][0]["message"]["content"].strip()
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Generator, List, Optional
+
+import numpy as np
+
+from .config import LLMRouterCfg
+from .logging import get_logger
+from .metrics import rag_llm_breaker_open, rag_llm_errors_total, rag_llm_hedges_fired_total, rag_llm_hedges_won_total, rag_llm_ttft_seconds
+from .providers import build_llm
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive errors; after ``reset_s`` lets one trial call through."""
+
+    def __init__(self, name: str, failures: int, reset_s: float) -> None:
+        self.name = name
+        self.failures = failures
+        self.reset_s = reset_s
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_s:
+                self._trial = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a trial slot whose call was abandoned without a verdict (a losing hedge, a closed stream)."""
+        with self._lock:
+            self._trial = False
+
+    def success(self) -> None:
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self._trial = False
+        rag_llm_breaker_open.labels(route=self.name).set(0)
+
+    def failure(self) -> None:
+        with self._lock:
+            self.consecutive += 1
+            if self._trial or self.consecutive >= self.failures:
+                if self.opened_at is None or self._trial:
+                    logger.warning(f"Circuit open for LLM route {self.name} after {self.consecutive} consecutive failures")
+                self.opened_at = time.monotonic()
+                self._trial = False
+        if self.opened_at is not None:
+            rag_llm_breaker_open.labels(route=self.name).set(1)
+
+
+class Route:
+    """One provider/model the router can send to, with its breaker and recent time-to-first-token."""
+
+    def __init__(self, spec: Dict, cfg: LLMRouterCfg) -> None:
+        self.provider = spec["provider"]
+        self.model = spec.get("model", "")
+        self.api_base = spec.get("api_base")
+        self.name = spec.get("name") or f"{self.provider}:{self.model}"
+        self.breaker = CircuitBreaker(self.name, cfg.breaker_failures, cfg.breaker_reset_s)
+        self.ttft: deque = deque(maxlen=max(1, cfg.window))
+        self.cfg = cfg
+
+    def hedge_after_s(self) -> float:
+        """Hedge once this route is slower than its ``hedge_percentile`` first-token latency."""
+        if len(self.ttft) < self.cfg.min_samples:
+            return self.cfg.hedge_initial_ms / 1000.0
+        return max(self.cfg.hedge_min_ms / 1000.0, float(np.percentile(self.ttft, self.cfg.hedge_percentile)))
+
+
+class _Attempt:
+    """Streams one route on a daemon thread into the shared event queue until told to stop."""
+
+    def __init__(self, route: Route, client, messages: List, events: "queue.Queue") -> None:
+        self.route = route
+        # Admitted through a half-open breaker: the attempt owns its single trial slot
+        self.trial = route.breaker.opened_at is not None
+        self.stop = threading.Event()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._pump, args=(client, messages, events), name=f"llm-{route.name}", daemon=True)
+        self._thread.start()
+
+    def _pump(self, client, messages: List, events: "queue.Queue") -> None:
+        gen = client.stream(messages)
+        try:
+            while True:
+                try:
+                    tok = next(gen)
+                except StopIteration as e:
+                    events.put((self, "done", e.value or {}))
+                    return
+                if self.stop.is_set():
+                    return
+                events.put((self, "token", tok))
+        except Exception as e:
+            events.put((self, "error", e))
+        finally:
+            # Closing the provider stream drops the upstream HTTP response of a losing attempt
+            gen.close()
+
+
+class HedgedLLM:
+    """Client with the ``invoke``/``stream`` interface of the provider clients, spread over routes.
+
+    The first route with a closed breaker is tried. If it has produced no token after its
+    hedge threshold, the next available route is started as well; whichever streams a
+    token first wins and the other attempt is stopped. An attempt that fails before
+    producing a token fails over to the next route immediately.
+    """
+
+    def __init__(self, router: "LLMRouter", temperature: float, max_tokens: int, stream: bool, timeout: Optional[float]) -> None:
+        self.router = router
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.stream_enabled = stream
+        self.timeout = timeout
+
+    def _start(self, route: Route, messages: List, events: "queue.Queue") -> _Attempt:
+        client = build_llm(route.provider, route.model, self.temperature, self.max_tokens, True, timeout=self.timeout, api_base=route.api_base)
+        return _Attempt(route, client, messages, events)
+
+    @staticmethod
+    def _take(candidates: List[Route]) -> Optional[Route]:
+        """Next route whose breaker admits a call; ``allow`` is only asked of a route about to start,
+        since on a half-open breaker it hands out the one trial slot."""
+        while candidates:
+            route = candidates.pop(0)
+            if route.breaker.allow():
+                return route
+        return None
+
+    def invoke(self, messages: List) -> str:
+        return "".join(self.stream(messages))
+
+    def stream(self, messages: List) -> Generator[str, None, Dict[str, int]]:
+        events: "queue.Queue" = queue.Queue()
+        candidates = list(self.router.routes)
+        route = self._take(candidates)
+        if route is None:
+            raise RuntimeError("No LLM route available: every circuit breaker is open")
+        attempts = [self._start(route, messages, events)]
+        hedge_at = time.monotonic() + attempts[0].route.hedge_after_s()
+        live = 1
+        winner: Optional[_Attempt] = None
+        first: Optional[str] = None
+        while winner is None:
+            wait = hedge_at - time.monotonic() if candidates and len(attempts) == 1 else None
+            try:
+                attempt, kind, payload = events.get(timeout=max(0.0, wait) if wait is not None else None)
+            except queue.Empty:
+                route = self._take(candidates)
+                if route is None:
+                    continue
+                rag_llm_hedges_fired_total.labels(route=route.name).inc()
+                logger.info(f"No first token from {attempts[0].route.name} after {hedge_at - attempts[0].started:.2f}s; hedging to {route.name}")
+                attempts.append(self._start(route, messages, events))
+                live += 1
+                continue
+            if kind == "error":
+                live -= 1
+                attempt.route.breaker.failure()
+                rag_llm_errors_total.labels(route=attempt.route.name).inc()
+                logger.warning(f"LLM route {attempt.route.name} failed: {type(payload).__name__}: {payload}")
+                if live == 0:
+                    route = self._take(candidates)
+                    if route is None:
+                        raise payload
+                    attempts.append(self._start(route, messages, events))
+                    live += 1
+                continue
+            winner = attempt
+            if kind == "token":
+                first = payload
+        ttft = time.monotonic() - winner.started
+        winner.route.ttft.append(ttft)
+        rag_llm_ttft_seconds.labels(route=winner.route.name).observe(ttft)
+        if winner is not attempts[0]:
+            rag_llm_hedges_won_total.labels(route=winner.route.name).inc()
+        for a in attempts:
+            if a is not winner:
+                a.stop.set()
+                if a.trial:
+                    a.route.breaker.release()
+        if first is None:
+            winner.route.breaker.success()
+            return payload
+        try:
+            yield first
+            while True:
+                attempt, kind, payload = events.get()
+                if attempt is not winner:
+                    continue
+                if kind == "token":
+                    yield payload
+                elif kind == "done":
+                    winner.route.breaker.success()
+                    return payload
+                else:
+                    winner.route.breaker.failure()
+                    rag_llm_errors_total.labels(route=winner.route.name).inc()
+                    raise payload
+        finally:
+            # Also reached when our caller closes this stream early
+            winner.stop.set()
+            if winner.trial:
+                # No-op after success()/failure(); frees the slot if the caller walked away
+                winner.route.breaker.release()
+
+
+class LLMRouter:
+    """Process-wide routes, breakers and latency history; ``client`` builds a per-request caller."""
+
+    def __init__(self, cfg: LLMRouterCfg) -> None:
+        if not cfg.routes:
+            raise ValueError("llm.provider is 'router' but llm_router.routes is empty")
+        self.cfg = cfg
+        self.routes = [Route(spec, cfg) for spec in cfg.routes]
+
+    def client(self, temperature: float, max_tokens: int, stream: bool, timeout: Optional[float] = None) -> HedgedLLM:
+        return HedgedLLM(self, temperature, max_tokens, stream, timeout)
+
+    def status(self) -> List[Dict]:
+        return [
+            {
+                "route": r.name,
+                "breaker_open": r.breaker.opened_at is not None,
+                "hedge_after_s": r.hedge_after_s(),
+                "ttft_samples": len(r.ttft),
+            }
+            for r in self.routes
+        ]
+
+
+_routers: Dict[str, LLMRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_llm_router(cfg: LLMRouterCfg) -> LLMRouter:
+    key = repr(cfg)
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = LLMRouter(cfg)
+        return router
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import os
 from dataclasses import dataclass
 from typing import Dict, Iterable, List
@@ -33,7 +34,25 @@ def _load_pdf(path: str) -> str:
     return extract_text(path) or ""
 
 
-def load_documents(root: str) -> List[Document]:
+def content_id(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+DOC_ID_MODES = ("relpath", "filename", "content")
+
+
+def _doc_id(name: str, relpath: str, text: str, mode: str) -> str:
+    if mode == "content":
+        return content_id(text)
+    if mode == "filename":
+        return name
+    return relpath
+
+
+def load_documents(root: str, doc_ids: str = "relpath") -> List[Document]:
+    if doc_ids not in DOC_ID_MODES:
+        # Checked up front: inside the loop the per-file error handling would swallow it
+        raise ValueError(f"Unknown doc_ids mode {doc_ids!r}; expected one of {list(DOC_ID_MODES)}")
     exts = {".txt", ".md", ".pdf"}
     docs: List[Document] = []
     for dirpath, _, filenames in os.walk(root):
@@ -49,8 +68,9 @@ def load_documents(root: str) -> List[Document]:
                     text = _load_md(full)
                 else:
                     text = _load_pdf(full)
-                doc_id = name  # use filename as id
-                meta = {"relpath": os.path.relpath(full, root), "ext": ext}
+                relpath = os.path.relpath(full, root)
+                doc_id = _doc_id(name, relpath, text, doc_ids)
+                meta = {"relpath": relpath, "ext": ext}
                 docs.append(Document(doc_id=doc_id, path=full, text=text, meta=meta))
             except Exception as e:
                 logger.error(f"Failed to load {full}: {e}")
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+ENDPOINTS = ("/query", "/query_batch", "/chain_query", "/chain_stream")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """``"query=0.7,chain_query=0.3"`` -> ``{"/query": 0.7, "/chain_query": 0.3}``."""
+    mix: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        endpoint = "/" + name.strip().lstrip("/")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix; choose from {list(ENDPOINTS)}")
+        mix[endpoint] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("mix needs at least one endpoint with a positive weight")
+    return mix
+
+
+def synthetic_traffic(queries: List[str], mix: Dict[str, float], n: int, k: int = 5, batch_size: int = 16, seed: int = 0) -> List[Dict]:
+    """``n`` requests drawing endpoints by ``mix`` weight and queries uniformly from ``queries``."""
+    rng = random.Random(seed)
+    endpoints, weights = list(mix), list(mix.values())
+    items = []
+    for _ in range(n):
+        endpoint = rng.choices(endpoints, weights)[0]
+        if endpoint == "/query_batch":
+            payload = {"queries": [rng.choice(queries) for _ in range(batch_size)], "k": k}
+        else:
+            payload = {"query": rng.choice(queries), "k": k}
+        items.append({"endpoint": endpoint, "payload": payload})
+    return items
+
+
+def arrival_offsets(items: List[Dict], rate: float, speedup: float = 1.0, seed: int = 0) -> List[float]:
+    """Send times in seconds from the start of the run.
+
+    With ``rate`` > 0 arrivals are a Poisson process at that rate (open loop); with 0 the
+    recorded ``ts`` gaps are replayed, compressed by ``speedup``.
+    """
+    if rate > 0:
+        rng = random.Random(seed)
+        t, out = 0.0, []
+        for _ in items:
+            out.append(t)
+            t += rng.expovariate(rate)
+        return out
+    if not items or "ts" not in items[0]:
+        raise ValueError("Replaying recorded timing needs 'ts' on every record; pass a rate instead")
+    t0 = float(items[0]["ts"])
+    return [max(0.0, (float(it["ts"]) - t0) / max(speedup, 1e-9)) for it in items]
+
+
+async def _send(client: httpx.AsyncClient, item: Dict, scheduled: float, sem: asyncio.Semaphore) -> Dict:
+    async with sem:
+        status, ttfb = 0, None
+        try:
+            async with client.stream("POST", item["endpoint"], json=item["payload"]) as r:
+                status = r.status_code
+                async for _ in r.aiter_raw():
+                    if ttfb is None:
+                        ttfb = time.monotonic() - scheduled
+        except httpx.HTTPError as e:
+            logger.debug(f"{item['endpoint']} failed: {type(e).__name__}: {e}")
+    # Measured from the scheduled arrival, so time spent waiting for a client slot counts
+    return {"endpoint": item["endpoint"], "status": status, "latency_s": time.monotonic() - scheduled, "ttfb_s": ttfb}
+
+
+async def _run(base_url: str, items: List[Dict], offsets: List[float], concurrency: int, timeout_s: float, transport=None) -> List[Dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s, limits=limits, transport=transport) as client:
+        sem = asyncio.Semaphore(concurrency)
+        start = time.monotonic()
+        tasks = []
+        for item, offset in zip(items, offsets):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_send(client, item, start + offset, sem)))
+        return list(await asyncio.gather(*tasks))
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000.0
+    p50, p90, p95, p99 = np.percentile(ms, [50, 90, 95, 99])
+    return {"p50": float(p50), "p90": float(p90), "p95": float(p95), "p99": float(p99), "max": float(ms.max()), "mean": float(ms.mean())}
+
+
+def summarize(results: List[Dict], wall_s: float, offered_qps: Optional[float] = None) -> Dict:
+    """Throughput, error rate and latency percentiles (ms) overall and per endpoint."""
+    ok = [r for r in results if 200 <= r["status"] < 300]
+    status_counts: Dict[str, int] = {}
+    for r in results:
+        status_counts[str(r["status"])] = status_counts.get(str(r["status"]), 0) + 1
+    report = {
+        "requests": len(results),
+        "offered_qps": offered_qps,
+        "achieved_qps": len(ok) / wall_s if wall_s > 0 else 0.0,
+        "error_rate": 1 - len(ok) / len(results) if results else 0.0,
+        "status_counts": status_counts,
+        "latency_ms": _percentiles([r["latency_s"] for r in ok]),
+        "ttfb_ms": _percentiles([r["ttfb_s"] for r in ok if r["ttfb_s"] is not None]),
+        "wall_s": wall_s,
+        "by_endpoint": {},
+    }
+    for endpoint in sorted({r["endpoint"] for r in results}):
+        rs = [r for r in results if r["endpoint"] == endpoint]
+        good = [r for r in rs if 200 <= r["status"] < 300]
+        report["by_endpoint"][endpoint] = {"requests": len(rs), "error_rate": 1 - len(good) / len(rs), "latency_ms": _percentiles([r["latency_s"] for r in good])}
+    return report
+
+
+def run_load(base_url: str, items: List[Dict], rate: float = 0.0, concurrency: int = 64, speedup: float = 1.0, timeout_s: float = 60.0, seed: int = 0, transport=None) -> Dict:
+    """Send ``items`` open-loop (see ``arrival_offsets``) with at most ``concurrency`` in flight."""
+    offsets = arrival_offsets(items, rate, speedup, seed)
+    t0 = time.monotonic()
+    results = asyncio.run(_run(base_url, items, offsets, max(1, concurrency), timeout_s, transport))
+    wall_s = time.monotonic() - t0
+    offered = rate if rate > 0 else (len(items) / offsets[-1] if offsets and offsets[-1] > 0 else None)
+    return summarize(results, wall_s, offered)
+
+
+def qps_sweep(base_url: str, items: List[Dict], rates: List[float], duration_s: float, concurrency: int = 64, timeout_s: float = 60.0, seed: int = 0, transport=None) -> Dict:
+    """Run each rate for ``duration_s`` (cycling through ``items``) and collect the QPS-vs-latency curve."""
+    steps, curve = [], []
+    for rate in rates:
+        n = max(1, int(rate * duration_s))
+        batch = [items[i % len(items)] for i in range(n)]
+        report = run_load(base_url, batch, rate, concurrency, timeout_s=timeout_s, seed=seed, transport=transport)
+        logger.info(f"{rate:g} qps offered: {report['achieved_qps']:.1f} ok/s, p99 {report['latency_ms'].get('p99', float('nan')):.0f}ms, errors {report['error_rate']:.1%}")
+        steps.append(report)
+        lat = report["latency_ms"]
+        curve.append({"offered_qps": rate, "achieved_qps": report["achieved_qps"], "p50_ms": lat.get("p50"), "p99_ms": lat.get("p99"), "error_rate": report["error_rate"]})
+    return {"curve": curve, "steps": steps}
@@ -1,23 +1,207 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
 import os
-from typing import Optional
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Per-request fields (request id, stage timings) attached to every record logged while they are bound
+_context: contextvars.ContextVar[Dict] = contextvars.ContextVar("rag_log_context")
+
+# Attributes every LogRecord has; anything else on a record came from ``extra=`` and is serialized
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "ctx", "suppressed"}
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; runs on the listener thread, never on the caller's."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        doc.update(getattr(record, "ctx", None) or {})
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                doc[key] = value
+        if getattr(record, "suppressed", 0):
+            doc["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener through a bounded queue; drops (and counts) rather than block."""
+
+    def __init__(self, q: "queue.Queue") -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve what must be captured on the caller's thread; serialization happens later
+        record.ctx = dict(_context.get(None) or {})
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site for records below ERROR; the next record let through reports how many were suppressed."""
+
+    def __init__(self, per_s: float, burst: int) -> None:
+        super().__init__()
+        self.per_s = per_s
+        self.burst = max(1, burst)
+        self._buckets: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_s <= 0 or record.levelno >= logging.ERROR:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.per_s)
+            if tokens < 1:
+                self._buckets[key] = [tokens, now, suppressed + 1]
+                return False
+            self._buckets[key] = [tokens - 1, now, 0]
+        if suppressed:
+            record.suppressed = suppressed
+        return True
 
 
 def setup_logging(level: Optional[str] = None) -> None:
-    lvl = level or os.getenv("RAG_LOG_LEVEL", "INFO").upper()
-    logging.basicConfig(
-        level=getattr(logging, lvl, logging.INFO),
-        format=(
-            "{"
-            "\"time\":\"%(asctime)s\","
-            "\"level\":\"%(levelname)s\","
-            "\"name\":\"%(name)s\","
-            "\"message\":\"%(message)s\""
-            "}"
-        ),
-    )
+    """Install the queue handler on the root logger and start the listener; later calls only adjust the level.
+
+    Environment: ``RAG_LOG_LEVEL``, ``RAG_LOG_FORMAT`` (json | text), ``RAG_LOG_QUEUE`` (max
+    buffered records before dropping), ``RAG_LOG_RATE_PER_S`` and ``RAG_LOG_BURST`` (per call
+    site limit for records below ERROR; 0 disables).
+    """
+    global _listener, _queue_handler
+    lvl = (level or os.getenv("RAG_LOG_LEVEL", "INFO")).upper()
+    root = logging.getLogger()
+    with _setup_lock:
+        if _listener is not None:
+            if level:
+                root.setLevel(getattr(logging, lvl, logging.INFO))
+            return
+        root.setLevel(getattr(logging, lvl, logging.INFO))
+        out = logging.StreamHandler(sys.stderr)
+        if os.getenv("RAG_LOG_FORMAT", "json").lower() == "text":
+            out.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        else:
+            out.setFormatter(JSONFormatter())
+        q: "queue.Queue" = queue.Queue(maxsize=int(os.getenv("RAG_LOG_QUEUE", "10000")))
+        _queue_handler = NonBlockingQueueHandler(q)
+        _queue_handler.addFilter(RateLimitFilter(float(os.getenv("RAG_LOG_RATE_PER_S", "0")), int(os.getenv("RAG_LOG_BURST", "20"))))
+        root.addHandler(_queue_handler)
+        _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        if _queue_handler is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
 
 
 def get_logger(name: str) -> logging.Logger:
     setup_logging()
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[Dict]:
+    """Bind ``fields`` to every record logged inside the block, including from worker threads it spawns via copied contexts."""
+    ctx = {**(_context.get(None) or {}), **fields}
+    token = _context.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _context.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the block's duration as ``<name>_ms`` in the bound request context."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ctx = _context.get(None)
+        if ctx is not None:
+            # Mutated in place so the middleware that bound the context sees timings from threadpool stages
+            ctx[f"{name}_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware binding a request id (``x-request-id`` or a fresh one) and path for the request.
+
+    The id is echoed in the response header. With ``sample_rate`` > 0 that fraction of
+    requests also logs one summary record carrying the status and any ``stage`` timings.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.logger = get_logger("rag_toolkit.access")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex[:16]
+        status = {"code": 500}
+        t0 = time.perf_counter()
+
+        async def _send(message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with log_context(request_id=request_id, path=scope.get("path", "")):
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                if self.sample_rate > 0 and random.random() < self.sample_rate:
+                    self.logger.info("request", extra={"status": status["code"], "total_ms": round((time.perf_counter() - t0) * 1000.0, 3)})
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import atexit
+import glob
+import os
+import re
+import threading
 import time
-from typing import Callable, Dict
+from typing import Callable, Dict, Optional
 
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+
+from .config import MetricsCfg, load_settings
 
 rag_requests_total = Counter(
     "rag_requests_total",
@@ -11,13 +18,6 @@ rag_requests_total = Counter(
     labelnames=("endpoint", "method", "status"),
 )
 
-rag_request_latency_seconds = Histogram(
-    "rag_request_latency_seconds",
-    "Latency of RAG requests in seconds",
-    labelnames=("endpoint",),
-    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
-)
-
 rag_query_score = Histogram(
     "rag_query_score",
     "Distribution of retrieval scores (0..1)",
@@ -30,37 +30,357 @@ rag_chain_requests_total = Counter(
     labelnames=("engine", "status"),
 )
 
-rag_chain_latency_seconds = Histogram(
-    "rag_chain_latency_seconds",
-    "Latency of chain/graph requests in seconds",
-    labelnames=("engine",),
-    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
-)
-
 rag_chain_tokens_total = Counter(
     "rag_chain_tokens_total",
     "Total tokens processed/emitted",
     labelnames=("engine", "role"),
 )
 
+rag_chain_ttft_seconds = Histogram(
+    "rag_chain_ttft_seconds",
+    "Time from request to first streamed token",
+    labelnames=("engine",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+rag_chain_stream_tokens_per_second = Histogram(
+    "rag_chain_stream_tokens_per_second",
+    "Streamed tokens per second after the first token",
+    labelnames=("engine",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+rag_chain_stream_cancelled_total = Counter(
+    "rag_chain_stream_cancelled_total",
+    "Streams cancelled because the client disconnected",
+    labelnames=("engine",),
+)
+
+rag_chain_degradations_total = Counter(
+    "rag_chain_degradations_total",
+    "Chain stages cut short to meet the request deadline",
+    labelnames=("engine", "kind"),
+)
+
+rag_chain_deadline_exceeded_total = Counter(
+    "rag_chain_deadline_exceeded_total",
+    "Chain requests that finished after their deadline despite degrading",
+    labelnames=("engine",),
+)
+
+rag_llm_ttft_seconds = Histogram(
+    "rag_llm_ttft_seconds",
+    "Time to first token of the winning LLM route",
+    labelnames=("route",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+rag_llm_hedges_fired_total = Counter(
+    "rag_llm_hedges_fired_total",
+    "Hedged duplicate requests sent to a secondary route",
+    labelnames=("route",),
+)
+
+rag_llm_hedges_won_total = Counter(
+    "rag_llm_hedges_won_total",
+    "Hedged or failover requests that produced the first token",
+    labelnames=("route",),
+)
+
+rag_llm_errors_total = Counter(
+    "rag_llm_errors_total",
+    "LLM route failures",
+    labelnames=("route",),
+)
+
+rag_llm_breaker_open = Gauge(
+    "rag_llm_breaker_open",
+    "1 while a route's circuit breaker is open",
+    labelnames=("route",),
+    multiprocess_mode="livemax",
+)
+
 rag_query_rewritten_total = Counter(
     "rag_query_rewritten_total",
     "Total count of query rewrites",
 )
 
+rag_answer_cache_requests_total = Counter(
+    "rag_answer_cache_requests_total",
+    "Semantic answer cache lookups",
+    labelnames=("engine", "result"),
+)
+
+rag_answer_cache_hit_ratio = Gauge(
+    "rag_answer_cache_hit_ratio",
+    "Answer cache hit rate since process start",
+    multiprocess_mode="liveall",
+)
+
+rag_answer_cache_latency_saved_seconds = Counter(
+    "rag_answer_cache_latency_saved_seconds_total",
+    "Generation time avoided by answer cache hits",
+    labelnames=("engine",),
+)
+
+rag_answer_cache_entries = Gauge(
+    "rag_answer_cache_entries",
+    "Entries currently held in the answer cache",
+    multiprocess_mode="livesum",
+)
+
+rag_admission_queue_depth = Gauge(
+    "rag_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    labelnames=("lane",),
+    multiprocess_mode="livesum",
+)
+
+rag_admission_in_flight = Gauge(
+    "rag_admission_in_flight",
+    "Requests holding an admission slot",
+    labelnames=("lane",),
+    multiprocess_mode="livesum",
+)
+
+rag_admission_rejected_total = Counter(
+    "rag_admission_rejected_total",
+    "Requests shed by admission control",
+    labelnames=("lane", "reason"),
+)
+
+rag_admission_wait_seconds = Histogram(
+    "rag_admission_wait_seconds",
+    "Time admitted requests spent queued",
+    labelnames=("lane",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+rag_collection_load_seconds = Histogram(
+    "rag_collection_load_seconds",
+    "Time to load and warm a collection",
+    labelnames=("collection",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+
+rag_collection_memory_bytes = Gauge(
+    "rag_collection_memory_bytes",
+    "Estimated resident size of a loaded collection (0 when evicted)",
+    labelnames=("collection",),
+    multiprocess_mode="livesum",
+)
+
+rag_collection_evictions_total = Counter(
+    "rag_collection_evictions_total",
+    "Collections evicted to stay under the memory budget",
+    labelnames=("collection",),
+)
+
+rag_disk_ivf_cache_requests_total = Counter(
+    "rag_disk_ivf_cache_requests_total",
+    "On-disk IVF list lookups by hot-list cache result",
+    labelnames=("result",),
+)
+
+rag_disk_ivf_bytes_read = Counter(
+    "rag_disk_ivf_bytes_read_total",
+    "Bytes of inverted lists read from disk",
+)
+
+rag_disk_ivf_read_bytes_per_query = Histogram(
+    "rag_disk_ivf_read_bytes_per_query",
+    "Inverted-list bytes read from disk per query (0 when every probed list was cached)",
+    buckets=(0, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864),
+)
+
+rag_ann_recall = Gauge(
+    "rag_ann_recall",
+    "Rolling overlap@k between served ANN results and exact search on sampled live queries",
+    labelnames=("index",),
+    multiprocess_mode="livemostrecent",
+)
+
+rag_ann_recall_samples_total = Counter(
+    "rag_ann_recall_samples_total",
+    "Live queries re-run against exact search",
+    labelnames=("index",),
+)
+
+rag_ann_recall_skipped_total = Counter(
+    "rag_ann_recall_skipped_total",
+    "Sampled queries not checked (exact pass busy or failed)",
+    labelnames=("index", "reason"),
+)
+
+rag_index_vectors = Gauge(
+    "rag_index_vectors",
+    "Vectors in a collection's serving index",
+    labelnames=("collection",),
+    multiprocess_mode="livemax",
+)
+
+rag_index_bytes = Gauge(
+    "rag_index_bytes",
+    "Serialized size of a collection's serving index plus any on-disk IVF list cache",
+    labelnames=("collection",),
+    multiprocess_mode="liveall",
+)
+
+rag_index_meta_bytes = Gauge(
+    "rag_index_meta_bytes",
+    "Arrow buffer size of a collection's chunk metadata",
+    labelnames=("collection",),
+    multiprocess_mode="liveall",
+)
+
+rag_model_param_bytes = Gauge(
+    "rag_model_param_bytes",
+    "Parameter and buffer memory of a loaded embedding model (ONNX: weights file size)",
+    labelnames=("model",),
+    multiprocess_mode="liveall",
+)
+
+rag_answer_cache_bytes = Gauge(
+    "rag_answer_cache_bytes",
+    "Query vector memory held by the answer cache",
+    multiprocess_mode="liveall",
+)
+
+rag_process_rss_bytes = Gauge(
+    "rag_process_rss_bytes",
+    "Resident set size of the serving process",
+    multiprocess_mode="liveall",
+)
+
+rag_process_threads = Gauge(
+    "rag_process_threads",
+    "OS threads in the serving process",
+    multiprocess_mode="liveall",
+)
+
+rag_process_open_fds = Gauge(
+    "rag_process_open_fds",
+    "Open file descriptors in the serving process",
+    multiprocess_mode="liveall",
+)
+
+rag_worker_info = Gauge(
+    "rag_worker_info",
+    "1 per live serving process; the pid label tells workers apart in multiprocess mode",
+    labelnames=("worker",),
+    multiprocess_mode="liveall",
+)
+
+
+def worker_id() -> str:
+    return os.getenv("RAG_WORKER_ID") or str(os.getpid())
+
+
+def multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def prepare_multiprocess_dir(path: str) -> str:
+    """Remove the ``*.db`` files in ``path`` and export it as ``PROMETHEUS_MULTIPROC_DIR`` for worker processes started afterwards.
+
+    Must run in the parent before workers import prometheus_client; stale files from a
+    previous run would otherwise be summed into the new one. Refuses a directory holding
+    anything else, so a mistyped ``metrics.multiproc_dir`` cannot delete unrelated files.
+    """
+    os.makedirs(path, exist_ok=True)
+    other = [name for name in os.listdir(path) if not name.endswith(".db")]
+    if other:
+        raise ValueError(f"metrics.multiproc_dir {path!r} holds files other than metrics (*.db), e.g. {sorted(other)[:3]}; point it at an empty directory")
+    for f in glob.glob(os.path.join(path, "*.db")):
+        os.remove(f)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop a finished worker's live gauges; its counters and histograms stay in the totals.
+
+    Called on exit by each worker; under gunicorn also call it from the ``child_exit`` hook
+    so workers killed without running exit handlers are cleaned up too.
+    """
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def reap_dead_workers(path: str) -> None:
+    """``mark_worker_dead`` for every pid with live-gauge files whose process no longer exists."""
+    pids = set()
+    for f in glob.glob(os.path.join(path, "gauge_live*_*.db")):
+        m = re.search(r"_(\d+)\.db$", f)
+        if m:
+            pids.add(int(m.group(1)))
+    for pid in pids:
+        if not _pid_alive(pid):
+            multiprocess.mark_process_dead(pid, path)
+
+
+rag_worker_info.labels(worker=worker_id()).set(1)
+if multiprocess_dir():
+    atexit.register(mark_worker_dead, os.getpid())
+
+
+_latency: Dict[str, Histogram] = {}
+_latency_lock = threading.Lock()
+
+
+def _metrics_cfg() -> MetricsCfg:
+    # A missing or broken settings file must not break request accounting
+    try:
+        return load_settings().metrics
+    except Exception:
+        return MetricsCfg()
+
+
+def latency_histogram(name: str) -> Histogram:
+    """``rag_request_latency_seconds`` or ``rag_chain_latency_seconds``, with buckets from ``metrics.*``.
+
+    Created on first use rather than at import, so importing this module never reads the
+    settings file and the buckets follow the settings active when serving starts.
+    """
+    with _latency_lock:
+        if name not in _latency:
+            cfg = _metrics_cfg()
+            if name == "rag_request_latency_seconds":
+                _latency[name] = Histogram(name, "Latency of RAG requests in seconds", labelnames=("endpoint",), buckets=tuple(cfg.request_latency_buckets))
+            else:
+                _latency[name] = Histogram(name, "Latency of chain/graph requests in seconds", labelnames=("engine",), buckets=tuple(cfg.chain_latency_buckets))
+        return _latency[name]
+
 
 def observe_request(endpoint: str, method: str, status: str, latency: float) -> None:
     rag_requests_total.labels(endpoint=endpoint, method=method, status=status).inc()
-    rag_request_latency_seconds.labels(endpoint=endpoint).observe(latency)
+    latency_histogram("rag_request_latency_seconds").labels(endpoint=endpoint).observe(latency)
 
 
 def observe_chain(engine: str, status: str, latency: float, tokens: Dict[str, int] | None = None) -> None:
     rag_chain_requests_total.labels(engine=engine, status=status).inc()
-    rag_chain_latency_seconds.labels(engine=engine).observe(latency)
+    latency_histogram("rag_chain_latency_seconds").labels(engine=engine).observe(latency)
     if tokens:
         for role, count in tokens.items():
             rag_chain_tokens_total.labels(engine=engine, role=role).inc(count)
 
 
 def metrics_response() -> tuple:
-    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    path = multiprocess_dir()
+    if path is None:
+        return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    # Every worker's files merged per scrape, so any worker answers for the whole server
+    reap_dead_workers(path)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import random
+import time
+from dataclasses import asdict, replace
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .config import MockLLMCfg
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Named starting points; any latency/error field set on MockLLMCfg (not None) overrides its profile value
+PROFILES: Dict[str, Dict] = {
+    "instant": {"ttft_ms": 0, "tokens_per_s": 0, "distribution": "fixed", "jitter": 0.0, "error_rate": 0.0},
+    "fast": {"ttft_ms": 150, "tokens_per_s": 120, "distribution": "uniform", "jitter": 0.2, "error_rate": 0.0},
+    "typical": {"ttft_ms": 450, "tokens_per_s": 45, "distribution": "lognormal", "jitter": 0.35, "error_rate": 0.0},
+    "slow-tail": {"ttft_ms": 600, "tokens_per_s": 30, "distribution": "lognormal", "jitter": 0.9, "error_rate": 0.01},
+    "flaky": {"ttft_ms": 300, "tokens_per_s": 60, "distribution": "uniform", "jitter": 0.3, "error_rate": 0.1},
+}
+
+_WORDS = (
+    "the index retrieves relevant chunks and the model answers from the provided contexts with citations "
+    "latency depends on time to first token and decode rate while retrieval adds a few milliseconds"
+).split()
+
+
+def resolve_profile(cfg: MockLLMCfg) -> MockLLMCfg:
+    """``cfg`` with every field left as None filled from its named profile."""
+    if cfg.profile not in PROFILES:
+        raise ValueError(f"Unknown mock LLM profile {cfg.profile!r}; choose from {sorted(PROFILES)}")
+    return replace(cfg, **{k: v for k, v in PROFILES[cfg.profile].items() if getattr(cfg, k) is None})
+
+
+def sample_ttft_s(cfg: MockLLMCfg, rng: random.Random) -> float:
+    base = cfg.ttft_ms / 1000.0
+    if base <= 0 or cfg.distribution == "fixed":
+        return max(0.0, base)
+    if cfg.distribution == "uniform":
+        return max(0.0, rng.uniform(base * (1 - cfg.jitter), base * (1 + cfg.jitter)))
+    if cfg.distribution == "lognormal":
+        # ttft_ms is the median; jitter is sigma, so p99 ~= median * exp(2.33 * jitter)
+        return rng.lognormvariate(math.log(base), cfg.jitter)
+    raise ValueError(f"Unknown latency distribution {cfg.distribution!r}")
+
+
+def completion_text(messages: List[Dict], n_tokens: int) -> str:
+    """Deterministic reply for a prompt: the same messages always produce the same words."""
+    seed = int(hashlib.sha1(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    return " ".join(rng.choice(_WORDS) for _ in range(n_tokens))
+
+
+def _chunk(rid: str, model: str, delta: Dict, finish: str | None = None) -> str:
+    body = {"id": rid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    return f"data: {json.dumps(body)}\n\n"
+
+
+def create_mock_app(cfg: MockLLMCfg) -> FastAPI:
+    """OpenAI-compatible ``/chat/completions`` (plain and streamed) with injected latency and errors.
+
+    Latency and error draws come from a generator seeded with ``cfg.seed`` and the request
+    sequence number, so a run replays identically for the same request order.
+    """
+    cfg = resolve_profile(cfg)
+    app = FastAPI(title="mock-llm")
+    seq = itertools.count()
+    stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    @app.get("/health")
+    async def health() -> Dict:
+        return {"status": "ok", "profile": cfg.profile, "config": asdict(cfg), **stats}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        n = next(seq)
+        rng = random.Random(cfg.seed * 1_000_003 + n)
+        stats["requests"] += 1
+        ttft = sample_ttft_s(cfg, rng)
+        if rng.random() < cfg.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(ttft)
+            return JSONResponse(status_code=cfg.error_status, content={"error": {"message": "injected mock failure", "type": "server_error"}})
+        messages = payload.get("messages", [])
+        limit = int(payload.get("max_tokens") or payload.get("max_completion_tokens") or cfg.completion_tokens)
+        words = completion_text(messages, min(cfg.completion_tokens, limit)).split(" ")
+        model = payload.get("model", "mock")
+        rid = f"chatcmpl-mock-{n}"
+        per_token = 1.0 / cfg.tokens_per_s if cfg.tokens_per_s > 0 else 0.0
+        usage = {"prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in messages), "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if payload.get("stream"):
+            stats["streams"] += 1
+
+            async def _events():
+                await asyncio.sleep(ttft)
+                yield _chunk(rid, model, {"role": "assistant", "content": ""})
+                for i, w in enumerate(words):
+                    if i and per_token:
+                        await asyncio.sleep(per_token)
+                    yield _chunk(rid, model, {"content": w if i == 0 else " " + w})
+                yield _chunk(rid, model, {}, "stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(_events(), media_type="text/event-stream")
+
+        await asyncio.sleep(ttft + per_token * max(0, len(words) - 1))
+        return {
+            "id": rid,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    logger.info(f"Mock LLM profile={cfg.profile}: ttft={cfg.ttft_ms}ms ({cfg.distribution}), {cfg.tokens_per_s} tok/s, error_rate={cfg.error_rate}")
+    return app
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import inspect
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_NAME = "export.json"
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+_POOLING_MODES = {"mean", "cls", "max"}
+
+
+def load_export_manifest(model_dir: str) -> Dict:
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _pool(hidden: np.ndarray, mask: np.ndarray, mode: str) -> np.ndarray:
+    if mode == "cls":
+        return hidden[:, 0]
+    m = mask[:, :, None].astype(hidden.dtype)
+    if mode == "max":
+        return np.where(m > 0, hidden, -1e9).max(axis=1)
+    return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+
+def _padding(model_dir: str, tokenizer) -> Tuple[int, str]:
+    """Pad id/token from the exported ``tokenizer_config.json``; ``enable_padding()`` alone assumes BERT's ``[PAD]`` = 0."""
+    path = os.path.join(model_dir, "tokenizer_config.json")
+    token = None
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            token = json.load(f).get("pad_token")
+        if isinstance(token, dict):
+            token = token.get("content")
+    if token is None and tokenizer.padding:
+        return tokenizer.padding["pad_id"], tokenizer.padding["pad_token"]
+    token = token or "[PAD]"
+    pad_id = tokenizer.token_to_id(token)
+    if pad_id is None:
+        raise RuntimeError(f"Pad token {token!r} is not in the vocabulary of {model_dir}; re-run `rag export-onnx --force`")
+    return pad_id, token
+
+
+def _pooling_mode(st) -> str:
+    if len(st) < 2:
+        return "mean"
+    pooling = st[1]
+    # sentence-transformers renamed the accessor across major versions
+    if hasattr(pooling, "get_pooling_mode_str"):
+        return pooling.get_pooling_mode_str()
+    return str(getattr(pooling, "pooling_mode", "mean"))
+
+
+def export_onnx(model_name: str, out_dir: str, quantize: bool = False, opset: int = 17, force: bool = False) -> Dict:
+    """Export a sentence-transformers model to ONNX (optionally int8) under ``out_dir``.
+
+    The export is cached: a matching ``export.json`` short-circuits unless ``force``.
+    """
+    manifest = load_export_manifest(out_dir)
+    if not force and manifest.get("model_name") == model_name and (manifest.get("quantized_file") or not quantize):
+        logger.info(f"Using cached ONNX export of {model_name} in {out_dir}")
+        return manifest
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = _pooling_mode(st)
+    if pooling not in _POOLING_MODES:
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling}")
+    tokenizer = st.tokenizer
+    tokenizer.save_pretrained(out_dir)
+    sample = tokenizer(["onnx export sample"], return_tensors="pt")
+    input_names = [n for n in _INPUT_NAMES if n in sample]
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {n: {0: "batch", 1: "seq"} for n in input_names + ["last_hidden_state"]}
+    fp32_file = "model.onnx"
+    # Newer torch defaults to the dynamo exporter; the TorchScript one handles dynamic_axes
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(st[0].auto_model.eval()),
+            tuple(sample[n] for n in input_names),
+            os.path.join(out_dir, fp32_file),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            **extra,
+        )
+    manifest = {
+        "model_name": model_name,
+        "file": fp32_file,
+        "quantized_file": None,
+        "pooling": pooling,
+        "max_seq_length": int(st.max_seq_length),
+        "dim": int(st.get_sentence_embedding_dimension()),
+    }
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        manifest["quantized_file"] = "model.int8.onnx"
+        quantize_dynamic(
+            os.path.join(out_dir, fp32_file),
+            os.path.join(out_dir, manifest["quantized_file"]),
+            weight_type=QuantType.QInt8,
+        )
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported {model_name} to ONNX in {out_dir} (quantized={quantize})")
+    return manifest
+
+
+class OnnxEmbedder:
+    def __init__(self, model_dir: str, model_name: str, quantized: bool = False, threads: int = 0) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        manifest = load_export_manifest(model_dir)
+        if manifest.get("model_name") != model_name:
+            raise RuntimeError(f"No ONNX export of {model_name} in {model_dir}; run `rag export-onnx` first")
+        fname = manifest.get("quantized_file") if quantized else manifest.get("file")
+        if not fname:
+            raise RuntimeError(f"No quantized ONNX export in {model_dir}; run `rag export-onnx --quantize`")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.model_path = os.path.join(model_dir, fname)
+        self.session = ort.InferenceSession(self.model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=int(manifest["max_seq_length"]))
+        pad_id, pad_token = _padding(model_dir, self.tokenizer)
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token=pad_token)
+        self.pooling = manifest["pooling"]
+        self.dim = int(manifest["dim"])
+        logger.info(f"Loaded ONNX model {model_dir}/{fname} (pooling={self.pooling})")
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer.encode_batch(texts[i : i + batch_size])
+            mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in enc], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in enc], dtype=np.int64),
+            }
+            feeds = {k: v for k, v in feeds.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            out.append(_pool(hidden, mask, self.pooling))
+        if not out:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(out).astype(np.float32)
+
+
+def parity_report(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    ref = reference / (np.linalg.norm(reference, axis=1, keepdims=True) + 1e-12)
+    cand = candidate / (np.linalg.norm(candidate, axis=1, keepdims=True) + 1e-12)
+    cos = np.sum(ref * cand, axis=1)
+    return {
+        "n": int(cos.shape[0]),
+        "cosine_mean": float(cos.mean()),
+        "cosine_min": float(cos.min()),
+        "cosine_p01": float(np.percentile(cos, 1)),
+        "max_drift": float(1.0 - cos.min()),
+    }
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import math
 import os
+import re
 from typing import Dict, Generator, List, Optional
 
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -11,6 +13,10 @@ except Exception:
     ChatOllama = None
 
 
+# Word plus trailing whitespace, so joining the tokens reproduces the text exactly
+_WORD_RE = re.compile(r"\s*\S+\s*|\s+")
+
+
 class NoLLM:
     def __init__(self, max_tokens: int = 512) -> None:
         self.max_tokens = max_tokens
@@ -24,14 +30,14 @@ class NoLLM:
 
     def stream(self, messages: List) -> Generator[str, None, Dict[str, int]]:
         full = self.invoke(messages)
-        for ch in full:
-            yield ch
+        for tok in _WORD_RE.findall(full):
+            yield tok
         return {"prompt": len(full), "completion": len(full)}
 
 
 class OpenAIClient:
-    def __init__(self, model: str, temperature: float, max_tokens: int, api_key: Optional[str], stream: bool) -> None:
-        self.llm = ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key)
+    def __init__(self, model: str, temperature: float, max_tokens: int, api_key: Optional[str], stream: bool, timeout: Optional[float] = None, api_base: Optional[str] = None) -> None:
+        self.llm = ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key, timeout=timeout, base_url=api_base or None)
         self.stream_enabled = stream
 
     def invoke(self, messages: List) -> str:
@@ -48,17 +54,18 @@ class OpenAIClient:
 
 
 class AzureOpenAIClient(OpenAIClient):
-    def __init__(self, model: str, temperature: float, max_tokens: int, stream: bool) -> None:
+    def __init__(self, model: str, temperature: float, max_tokens: int, stream: bool, timeout: Optional[float] = None) -> None:
         api_key = os.getenv("OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_API_KEY")
-        super().__init__(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key, stream=stream)
+        super().__init__(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key, stream=stream, timeout=timeout)
 
 
 class OllamaClient:
-    def __init__(self, model: str, temperature: float, max_tokens: int, stream: bool) -> None:
+    def __init__(self, model: str, temperature: float, max_tokens: int, stream: bool, timeout: Optional[float] = None) -> None:
         if ChatOllama is None:
             self.llm = None
         else:
-            self.llm = ChatOllama(model=model, temperature=temperature)
+            # ChatOllama takes whole seconds
+            self.llm = ChatOllama(model=model, temperature=temperature, num_predict=max_tokens, timeout=math.ceil(timeout) if timeout else None)
         self.stream_enabled = stream
         self.max_tokens = max_tokens
 
@@ -79,14 +86,19 @@ class OllamaClient:
         return usage
 
 
-def build_llm(provider: str, model: str, temperature: float, max_tokens: int, stream: bool):
+def build_llm(provider: str, model: str, temperature: float, max_tokens: int, stream: bool, timeout: Optional[float] = None, router=None, api_base: Optional[str] = None):
+    if provider == "router":
+        # Imported here: the router builds its per-route clients through this function
+        from .llm_router import get_llm_router
+
+        return get_llm_router(router).client(temperature, max_tokens, stream, timeout)
     if provider == "openai":
         api_key = os.getenv("OPENAI_API_KEY")
-        return OpenAIClient(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key, stream=stream)
+        return OpenAIClient(model=model, temperature=temperature, max_tokens=max_tokens, api_key=api_key, stream=stream, timeout=timeout, api_base=api_base)
     if provider == "azure":
-        return AzureOpenAIClient(model=model, temperature=temperature, max_tokens=max_tokens, stream=stream)
+        return AzureOpenAIClient(model=model, temperature=temperature, max_tokens=max_tokens, stream=stream, timeout=timeout)
     if provider == "ollama":
-        return OllamaClient(model=model, temperature=temperature, max_tokens=max_tokens, stream=stream)
+        return OllamaClient(model=model, temperature=temperature, max_tokens=max_tokens, stream=stream, timeout=timeout)
     return NoLLM(max_tokens=max_tokens)
 
 
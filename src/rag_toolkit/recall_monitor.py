@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from .config import RecallMonitorCfg
+from .embed_shards import embeddings_fingerprint
+from .logging import get_logger
+from .metrics import rag_ann_recall, rag_ann_recall_samples_total, rag_ann_recall_skipped_total
+from .tuning import flat_ground_truth
+
+logger = get_logger(__name__)
+
+
+def is_exact(index) -> bool:
+    """Flat indexes already return exact neighbours; there is nothing to monitor."""
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat) if isinstance(index, faiss.Index) else False
+
+
+def overlap_at_k(served: np.ndarray, exact: np.ndarray) -> float:
+    truth = set(exact[exact >= 0].tolist())
+    if not truth:
+        return 1.0
+    return len(truth & set(served[served >= 0].tolist())) / len(truth)
+
+
+class RecallMonitor:
+    """Re-runs a sample of live queries against exact search and tracks overlap@k.
+
+    ``observe`` is called on the search path with the ids the ANN index returned; sampled
+    queries are handed to a single background thread that brute-forces them over the
+    embeddings, so serving latency is unaffected. When that thread falls behind, new
+    samples are dropped rather than queued.
+    """
+
+    def __init__(self, cfg: RecallMonitorCfg, index, embeddings, label: str) -> None:
+        self.cfg = cfg
+        self.index = index
+        self.embeddings = embeddings
+        self.label = label
+        self.window: deque = deque(maxlen=max(1, cfg.window))
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recall-monitor")
+        self._rng = random.Random()
+
+    def observe(self, qv: np.ndarray, ids: np.ndarray, k: int) -> None:
+        sampled = [i for i in range(len(qv)) if self._rng.random() < self.cfg.sample_rate]
+        if not sampled:
+            return
+        with self._lock:
+            if self._pending >= self.cfg.max_pending:
+                rag_ann_recall_skipped_total.labels(self.label, "busy").inc(len(sampled))
+                return
+            self._pending += 1
+        try:
+            # Copies: the caller's arrays may be reused once the request returns
+            self._pool.submit(self._check, np.array(qv[sampled], dtype=np.float32), np.array(ids[sampled]), k)
+        except RuntimeError:
+            # Shut down while a request on the dropped index version was still in flight
+            with self._lock:
+                self._pending -= 1
+            rag_ann_recall_skipped_total.labels(self.label, "closed").inc(len(sampled))
+
+    def _check(self, qv: np.ndarray, served: np.ndarray, k: int) -> None:
+        try:
+            exact = flat_ground_truth(self.index, qv, k, self.embeddings)
+            with self._lock:
+                for s, e in zip(served, exact):
+                    self.window.append(overlap_at_k(s[:k], e))
+                recall = sum(self.window) / len(self.window)
+            rag_ann_recall.labels(self.label).set(recall)
+            rag_ann_recall_samples_total.labels(self.label).inc(len(qv))
+        except Exception as e:
+            rag_ann_recall_skipped_total.labels(self.label, "error").inc(len(qv))
+            logger.warning(f"Recall check for {self.label} failed: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            n = len(self.window)
+            return {"recall": sum(self.window) / n if n else None, "samples": n, "sample_rate": self.cfg.sample_rate}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def build_recall_monitor(cfg: RecallMonitorCfg, index, embeddings, label: str, fingerprint: Optional[str] = None) -> Optional[RecallMonitor]:
+    """A monitor for ``index``, or None when disabled, the index is exact, or no matching embeddings exist.
+
+    With ``fingerprint`` (what the index recorded at build time; "" when it recorded none)
+    the embeddings must hash to it, not just have ``ntotal`` rows.
+    """
+    if not cfg.enabled or cfg.sample_rate <= 0 or is_exact(index):
+        return None
+    if embeddings is None or embeddings.shape[0] != index.ntotal:
+        found = "none" if embeddings is None else embeddings.shape[0]
+        logger.warning(f"Recall monitoring disabled for {label}: need {index.ntotal} embeddings as ground truth, found {found}")
+        return None
+    if fingerprint is not None and embeddings_fingerprint(embeddings) != fingerprint:
+        reason = "the index recorded no embeddings fingerprint; rebuild it" if not fingerprint else "they are not the embeddings the index was built from"
+        logger.warning(f"Recall monitoring disabled for {label}: {reason}")
+        return None
+    return RecallMonitor(cfg, index, embeddings, label)
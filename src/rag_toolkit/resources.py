@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+from .answer_cache import SemanticAnswerCache
+from .embedder import Embedder
+from .index_store import IndexStore
+from .logging import get_logger
+from .metrics import (
+    rag_answer_cache_bytes,
+    rag_index_bytes,
+    rag_index_meta_bytes,
+    rag_index_vectors,
+    rag_model_param_bytes,
+    rag_process_open_fds,
+    rag_process_rss_bytes,
+    rag_process_threads,
+)
+
+logger = get_logger(__name__)
+
+
+def _proc_status() -> Dict[str, int]:
+    """VmRSS/VmHWM (bytes) and Threads from ``/proc/self/status``; empty off Linux."""
+    out: Dict[str, int] = {}
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    out[key] = int(value.split()[0]) * 1024
+                elif key == "Threads":
+                    out[key] = int(value)
+    except OSError:
+        pass
+    return out
+
+
+def process_stats() -> Dict:
+    st = _proc_status()
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    try:
+        fds: Optional[int] = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        fds = None
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": st.get("VmRSS"),
+        "peak_rss_bytes": st.get("VmHWM", peak),
+        "threads": st.get("Threads", threading.active_count()),
+        "python_threads": threading.active_count(),
+        "open_fds": fds,
+    }
+
+
+def index_stats(store: IndexStore) -> Dict:
+    """Vector count and byte sizes of one loaded index and its chunk metadata.
+
+    ``index_bytes`` is the serialized size, which tracks the resident codes and structures
+    (page cache rather than anonymous memory when ``mmap``); an on-disk IVF adds what its
+    list cache currently holds.
+    """
+    index = store.index
+    disk = index.stats() if hasattr(index, "stats") else None
+    size = os.path.getsize(store.index_path) if os.path.exists(store.index_path) else 0
+    return {
+        "index_type": type(getattr(index, "ivf", index)).__name__,
+        "vectors": int(index.ntotal) if index is not None else 0,
+        "dim": int(index.d) if index is not None else 0,
+        "index_bytes": size + (disk["cached_bytes"] if disk else 0),
+        "mmap": store.mmap,
+        "on_disk": disk is not None,
+        "meta_rows": store.meta.num_rows,
+        "meta_bytes": store.meta.nbytes,
+    }
+
+
+def model_stats(embedder: Embedder) -> Dict:
+    if embedder.dummy is not None:
+        return {"backend": "dummy", "params": 0, "param_bytes": 0}
+    if embedder.onnx is not None:
+        # onnxruntime does not report its arena; the weights file is the floor of what it holds
+        return {"backend": "onnx", "params": None, "param_bytes": os.path.getsize(embedder.onnx.model_path)}
+    tensors = list(embedder.model.parameters()) + list(embedder.model.buffers())
+    return {
+        "backend": "sentence-transformers",
+        "params": sum(int(p.numel()) for p in embedder.model.parameters()),
+        "param_bytes": sum(int(t.numel()) * t.element_size() for t in tensors),
+    }
+
+
+def answer_cache_stats(cache: Optional[SemanticAnswerCache]) -> Optional[Dict]:
+    if cache is None:
+        return None
+    # Stored values are small dicts; the query vectors dominate
+    return {**cache.stats(), "vector_bytes": int(cache.index.ntotal) * cache.dim * 4}
+
+
+def top_allocations(limit: int = 20, key_type: str = "lineno") -> Optional[List[Dict]]:
+    """Largest live allocation sites, or None when tracemalloc is not tracing."""
+    if not tracemalloc.is_tracing():
+        return None
+    stats = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),)).statistics(key_type)
+    return [{"site": str(s.traceback[0]), "size_bytes": s.size, "count": s.count} for s in stats[:limit]]
+
+
+def resource_report(managers: Dict, cache: Optional[SemanticAnswerCache]) -> Dict:
+    """Per-collection index/metadata sizes, embedding models, caches and process counters; also updates the gauges."""
+    collections: Dict[str, Dict] = {}
+    models: Dict[str, Dict] = {}
+    for name, manager in managers.items():
+        cur = manager.current
+        if cur is not None:
+            collections[name] = {"version": cur.version, **index_stats(cur.store)}
+            st = collections[name]
+            rag_index_vectors.labels(collection=name).set(st["vectors"])
+            rag_index_bytes.labels(collection=name).set(st["index_bytes"])
+            rag_index_meta_bytes.labels(collection=name).set(st["meta_bytes"])
+        model = manager.embedder.cfg.model_name
+        if model not in models:
+            # Collections with the same embedding config share one embedder
+            models[model] = model_stats(manager.embedder)
+            rag_model_param_bytes.labels(model=model).set(models[model]["param_bytes"])
+    caches = {"answer_cache": answer_cache_stats(cache)}
+    rag_answer_cache_bytes.set(caches["answer_cache"]["vector_bytes"] if caches["answer_cache"] else 0)
+    proc = process_stats()
+    if proc["rss_bytes"] is not None:
+        rag_process_rss_bytes.set(proc["rss_bytes"])
+    rag_process_threads.set(proc["threads"])
+    if proc["open_fds"] is not None:
+        rag_process_open_fds.set(proc["open_fds"])
+    return {"process": proc, "collections": collections, "models": models, "caches": caches, "tracemalloc": tracemalloc.is_tracing()}
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# Fields a search result can carry; `fields` projections are validated against these
+RESULT_FIELDS = ("chunk_id", "doc_id", "start", "end", "text", "source", "duplicates", "score")
+
+
+def _numpy_default(o: Any) -> Any:
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed (stdlib json otherwise)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_numpy_default).encode("utf-8")
+
+
+def parse_fields(value) -> Optional[List[str]]:
+    """``fields`` as a list or comma-separated string; None keeps every field."""
+    if value is None:
+        return None
+    fields = [f.strip() for f in value.split(",")] if isinstance(value, str) else [str(f) for f in value]
+    fields = [f for f in fields if f]
+    unknown = set(fields) - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}; choose from {list(RESULT_FIELDS)}")
+    return fields
+
+
+def project(results: List[Dict], fields: Optional[Sequence[str]], snippet_chars: int = 0) -> List[Dict]:
+    """Trim already-built results (e.g. after the LLM has used the full text) in place."""
+    if fields is None and not snippet_chars:
+        return results
+    for r in results:
+        if fields is not None:
+            for key in [k for k in r if k not in fields]:
+                del r[key]
+        if snippet_chars and "text" in r:
+            r["text"] = r["text"][:snippet_chars]
+    return results
@@ -1,41 +1,71 @@
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 
 from .embedder import Embedder
+from .executor import SearchExecutor
 from .index_store import IndexStore
 from .logging import get_logger
+from .recall_monitor import RecallMonitor
 
 logger = get_logger(__name__)
 
 
 class Retriever:
-    def __init__(self, store: IndexStore, embedder: Embedder) -> None:
+    def __init__(self, store: IndexStore, embedder: Embedder, executor: Optional[SearchExecutor] = None, monitor: Optional[RecallMonitor] = None) -> None:
         self.store = store
         self.embedder = embedder
+        self.executor = executor
+        self.monitor = monitor
 
-    def search(self, query: str, k: int) -> List[Dict]:
+    def _run(self, fn, *args):
+        if self.executor is None:
+            return fn(*args)
+        return self.executor.run(fn, *args)
+
+    def search(self, query: str, k: int, fields: Optional[Sequence[str]] = None, snippet_chars: int = 0) -> List[Dict]:
+        return self._run(self._search_vectors, None, [query], k, fields, snippet_chars)[0]
+
+    def search_vector(self, qv: np.ndarray, k: int, fields: Optional[Sequence[str]] = None, snippet_chars: int = 0) -> List[Dict]:
+        return self._run(self._search_vectors, qv, None, k, fields, snippet_chars)[0]
+
+    def search_batch(self, queries: List[str], k: int, fields: Optional[Sequence[str]] = None, snippet_chars: int = 0) -> List[List[Dict]]:
+        """One embedding batch and one FAISS call for all ``queries``."""
+        if not queries:
+            return []
+        return self._run(self._search_vectors, None, queries, k, fields, snippet_chars)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self._run(self.embedder.embed_texts, [query])
+
+    def _search_vectors(self, qv: Optional[np.ndarray], queries: Optional[List[str]], k: int, fields=None, snippet_chars: int = 0) -> List[List[Dict]]:
         assert self.store.index is not None, "Index not loaded"
-        qv = self.embedder.embed_texts([query])
+        if qv is None:
+            qv = self.embedder.embed_texts(queries)
+        qv = np.ascontiguousarray(qv, dtype=np.float32)
         scores, idxs = self.store.index.search(qv, k)
-        idxs = idxs[0]
-        scores = scores[0]
-        results: List[Dict] = []
-        for i, score in zip(idxs, scores):
-            if i < 0 or i >= len(self.store.meta):
-                continue
-            m = self.store.meta[i]
-            results.append({
-                "chunk_id": m["chunk_id"],
-                "doc_id": m["doc_id"],
-                "start": m["start"],
-                "end": m["end"],
-                "text": m["text"],
-                "score": float(score),
-            })
-        return results
+        if self.monitor is not None:
+            self.monitor.observe(qv, idxs, k)
+        return [self._results(i, sc, fields, snippet_chars) for i, sc in zip(idxs, scores)]
+
+    def _results(self, idxs: np.ndarray, scores: np.ndarray, fields: Optional[Sequence[str]] = None, snippet_chars: int = 0) -> List[Dict]:
+        """Result dicts straight from the Arrow meta, fetching only the projected columns."""
+        keep = (idxs >= 0) & (idxs < len(self.store.meta))
+        columns = None if fields is None else [f for f in fields if f != "score"]
+        rows = self.store.rows(idxs[keep], columns, snippet_chars)
+        with_score = fields is None or "score" in fields
+        for m, score in zip(rows, scores[keep].tolist()):
+            if fields is None:
+                # Optional columns only appear when they carry something
+                if not m.get("source"):
+                    m.pop("source", None)
+                if not m.get("duplicates"):
+                    m.pop("duplicates", None)
+            if with_score:
+                m["score"] = score
+        return rows
 
     def rerank(self, results: List[Dict]) -> List[Dict]:
         # Stub for reranking extension point
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import Settings, load_settings
+from .embed_shards import open_embeddings
+from .embedder import Embedder
+from .executor import get_search_executor
+from .disk_ivf import disk_paths
+from .index_store import IndexStore, fingerprint_path, tuning_path
+from .logging import get_logger
+from .recall_monitor import build_recall_monitor
+from .retrieval import Retriever
+
+logger = get_logger(__name__)
+
+CURRENT_FILE = "CURRENT"
+
+
+def read_current_version(versions_dir: str) -> Optional[str]:
+    path = os.path.join(versions_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def check_version(versions_dir: str, version: str) -> str:
+    """``version`` if it names a published directory directly under ``versions_dir``.
+
+    Versions arrive in admin request bodies and in CURRENT, so anything that could resolve
+    outside ``versions_dir`` (separators, ``..``, hidden or in-progress ``.tmp`` names) is refused.
+    """
+    if not isinstance(version, str) or not version or os.path.basename(version) != version or version.startswith(".") or version.endswith(".tmp") or "\\" in version:
+        raise ValueError(f"Invalid index version {version!r}: must be a plain directory name")
+    if not os.path.isdir(os.path.join(versions_dir, version)):
+        raise FileNotFoundError(f"No index version {version!r} in {versions_dir}")
+    return version
+
+
+def set_current_version(versions_dir: str, version: str) -> None:
+    check_version(versions_dir, version)
+    tmp = os.path.join(versions_dir, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(versions_dir, CURRENT_FILE))
+
+
+def clear_current_version(versions_dir: str) -> None:
+    try:
+        os.remove(os.path.join(versions_dir, CURRENT_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def version_paths(s: Settings, version: Optional[str]) -> Tuple[str, str]:
+    """Index/meta paths for ``version``; ``None`` is the unversioned ``paths.*`` pair."""
+    if version is None:
+        return s.paths.index_path, s.paths.index_meta_path
+    root = os.path.join(s.serving.versions_dir, check_version(s.serving.versions_dir, version))
+    return os.path.join(root, os.path.basename(s.paths.index_path)), os.path.join(root, os.path.basename(s.paths.index_meta_path))
+
+
+def publish_version(s: Settings, version: Optional[str] = None, activate: bool = True) -> str:
+    """Copy the built index + meta into ``serving.versions_dir/<version>`` and optionally point CURRENT at it."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    final = os.path.join(s.serving.versions_dir, version)
+    if os.path.exists(final):
+        raise FileExistsError(f"Index version {version!r} already exists in {s.serving.versions_dir}")
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    optional = (tuning_path(s.paths.index_path), fingerprint_path(s.paths.index_path)) + disk_paths(s.paths.index_path)
+    for path in (s.paths.index_path, s.paths.index_meta_path) + optional:
+        if path in optional and not os.path.exists(path):
+            continue
+        shutil.copy2(path, os.path.join(tmp, os.path.basename(path)))
+    # A version directory only ever appears complete
+    os.replace(tmp, final)
+    if activate:
+        set_current_version(s.serving.versions_dir, version)
+    logger.info(f"Published index version {version} to {final}")
+    return version
+
+
+@dataclass
+class ServingIndex:
+    version: Optional[str]
+    store: IndexStore
+    retriever: Retriever
+    loaded_at: float
+    load_seconds: float
+
+    def close(self) -> None:
+        """Stop background work once no longer reachable from the manager; in-flight requests still finish."""
+        if self.retriever.monitor is not None:
+            self.retriever.monitor.shutdown(wait=False)
+
+
+class IndexManager:
+    """Owns the serving index and swaps it without dropping requests.
+
+    Handlers read ``manager.current`` once and keep that reference, so requests in flight
+    finish on the version they started with while a reload swaps the attribute. A new
+    version is loaded and warmed off the request path; a failed load leaves the serving
+    version untouched and is reported in ``status()``.
+    """
+
+    def __init__(self, settings: Settings, embedder: Optional[Embedder] = None) -> None:
+        self.settings = settings
+        self.embedder = embedder or Embedder(settings.embedding, seed=settings.seed)
+        self.executor = get_search_executor(settings.execution)
+        self.current: Optional[ServingIndex] = None
+        self.previous: Optional[ServingIndex] = None
+        self.loading: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._failed_version: Optional[str] = None
+
+    @property
+    def retriever(self) -> Optional[Retriever]:
+        cur = self.current
+        return cur.retriever if cur is not None else None
+
+    def _load(self, version: Optional[str]) -> ServingIndex:
+        t0 = time.time()
+        index_path, meta_path = version_paths(self.settings, version)
+        store = IndexStore(index_path, meta_path)
+        cfg = self.settings.index
+        store.load(mmap=cfg.mmap, prefault_pages=cfg.prefault, disk_cache_mb=cfg.disk_cache_mb)
+        embeddings = open_embeddings(self.settings.paths.embeddings_dir, self.settings.paths.embeddings_path) if self.settings.recall_monitor.enabled else None
+        # The embeddings on disk may belong to a newer build than this version; only matching ones are ground truth
+        monitor = build_recall_monitor(self.settings.recall_monitor, store.index, embeddings, index_path, store.embeddings_fingerprint or "")
+        retriever = Retriever(store, self.embedder, self.executor, monitor)
+        self._warm(retriever)
+        return ServingIndex(version, store, retriever, time.time(), time.time() - t0)
+
+    def _warm(self, retriever: Retriever) -> None:
+        n = min(self.settings.serving.warmup_queries, retriever.store.meta.num_rows)
+        if n <= 0:
+            return
+        texts = retriever.store.meta.column("text").slice(0, n).to_pylist()
+        k = int(self.settings.retrieval.get("k", 5))
+        for t in texts:
+            retriever.search(" ".join(t.split()[:16]), k)
+
+    def load_initial(self) -> bool:
+        version = read_current_version(self.settings.serving.versions_dir)
+        try:
+            self.current = self._load(version)
+            self.last_error = None
+            logger.info(f"Serving index version {version or 'unversioned'}")
+            return True
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Failed to load index version {version or 'unversioned'}: {self.last_error}")
+            return False
+
+    def reload(self, version: Optional[str] = None, background: bool = True) -> Dict:
+        """Load ``version`` (default: whatever CURRENT points at) and swap it in once warm."""
+        version = version or read_current_version(self.settings.serving.versions_dir)
+        if version is not None:
+            try:
+                check_version(self.settings.serving.versions_dir, version)
+            except (ValueError, FileNotFoundError) as e:
+                return {"status": "invalid", "error": str(e), "version": self.version}
+        with self._lock:
+            if self.loading is not None:
+                return {"status": "busy", "loading": self.loading}
+            self.loading = version or "unversioned"
+        if background:
+            threading.Thread(target=self._reload, args=(version,), name="index-reload", daemon=True).start()
+            return {"status": "loading", "loading": self.loading}
+        return self._reload(version)
+
+    def _reload(self, version: Optional[str]) -> Dict:
+        try:
+            new = self._load(version)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Reload of index version {version} failed; still serving {self.version}: {self.last_error}")
+            with self._lock:
+                self.loading = None
+            return {"status": "failed", "error": self.last_error, "version": self.version}
+        with self._lock:
+            dropped, self.previous, self.current = self.previous, self.current, new
+            self.loading = None
+            self._pin_current(new.version)
+        if dropped is not None:
+            dropped.close()
+        self.last_error = None
+        logger.info(f"Swapped serving index to version {new.version} (loaded in {new.load_seconds:.2f}s)")
+        return {"status": "ok", "version": new.version, "previous": self.previous.version if self.previous else None}
+
+    def rollback(self) -> Dict:
+        with self._lock:
+            if self.previous is None:
+                return {"status": "failed", "error": "no previous version loaded", "version": self.version}
+            self.previous, self.current = self.current, self.previous
+            self._pin_current(self.current.version)
+        logger.info(f"Rolled serving index back to version {self.current.version}")
+        return {"status": "ok", "version": self.current.version, "previous": self.previous.version}
+
+    def _pin_current(self, version: Optional[str]) -> None:
+        # Keep CURRENT in step with what is served so the watcher doesn't undo a manual swap
+        versions_dir = self.settings.serving.versions_dir
+        if read_current_version(versions_dir) == version:
+            return
+        if version is None:
+            # Back on the unversioned paths.* index: no CURRENT is what load_initial maps to it
+            clear_current_version(versions_dir)
+        else:
+            set_current_version(versions_dir, version)
+
+    @property
+    def version(self) -> Optional[str]:
+        cur = self.current
+        return cur.version if cur is not None else None
+
+    def status(self) -> Dict:
+        cur = self.current
+        return {
+            "index_loaded": cur is not None,
+            "index_version": cur.version if cur else None,
+            "index_mmap": cur.store.mmap if cur else None,
+            "index_disk": cur.store.index.stats() if cur and hasattr(cur.store.index, "stats") else None,
+            "recall": cur.retriever.monitor.stats() if cur and cur.retriever.monitor else None,
+            "previous_version": self.previous.version if self.previous else None,
+            "loaded_at": cur.loaded_at if cur else None,
+            "load_seconds": cur.load_seconds if cur else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+        }
+
+    def start_watcher(self) -> None:
+        """Poll CURRENT every ``serving.watch_interval_s`` and reload when it changes."""
+        interval = self.settings.serving.watch_interval_s
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def _watch() -> None:
+            while not self._stop.wait(interval):
+                target = read_current_version(self.settings.serving.versions_dir)
+                # A broken version is not retried every poll; a new CURRENT value is
+                if target is None or target in (self.version, self._failed_version) or self.loading is not None:
+                    continue
+                logger.info(f"CURRENT now points at {target}; reloading")
+                if self.reload(target, background=False).get("status") == "failed":
+                    self._failed_version = target
+
+        self._watcher = threading.Thread(target=_watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        """Stop the watcher and the background work of both held versions."""
+        self.stop()
+        for held in (self.current, self.previous):
+            if held is not None:
+                held.close()
+
+
+_managers: Dict[Tuple[str, str, str], IndexManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_index_manager(settings: Optional[Settings] = None) -> IndexManager:
+    """Process-wide manager per artifact location, shared by the query and chain routers."""
+    s = settings or load_settings()
+    key = (s.serving.versions_dir, s.paths.index_path, s.paths.index_meta_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = IndexManager(s)
+            manager.load_initial()
+            manager.start_watcher()
+            _managers[key] = manager
+        return manager
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .config import TrafficCfg
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class TrafficRecorder:
+    """Appends ``{"ts", "endpoint", "payload"}`` records to a JSONL file from a background thread.
+
+    ``record`` only enqueues; when the writer falls behind by ``max_pending`` records new
+    ones are dropped, so recording never adds disk latency to a request.
+    """
+
+    def __init__(self, path: str, max_pending: int = 10000) -> None:
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_pending)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name="traffic-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, endpoint: str, payload: Dict, ts: Optional[float] = None) -> None:
+        try:
+            self._queue.put_nowait({"ts": time.time() if ts is None else ts, "endpoint": endpoint, "payload": payload})
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                rec = self._queue.get()
+                if rec is None:
+                    return
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class TrafficRecordingMiddleware:
+    """Pure ASGI middleware that records a sample of POST bodies sent to ``cfg.endpoints``.
+
+    The body is captured as the app reads it, so the request is neither delayed nor
+    consumed twice. Shed and failed requests are recorded too: the log is the offered load.
+    """
+
+    def __init__(self, app, cfg: TrafficCfg, recorder: Optional[TrafficRecorder] = None) -> None:
+        self.app = app
+        self.cfg = cfg
+        self.endpoints = set(cfg.endpoints)
+        self.recorder = recorder or TrafficRecorder(cfg.path)
+        self._rng = random.Random()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope.get("method") != "POST" or scope.get("path") not in self.endpoints or self._rng.random() >= self.cfg.sample_rate:
+            await self.app(scope, receive, send)
+            return
+        ts = time.time()
+        chunks: List[bytes] = []
+        size = 0
+
+        async def _receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size <= self.cfg.max_body_bytes:
+                body = message.get("body", b"")
+                chunks.append(body)
+                size += len(body)
+                if not message.get("more_body", False) and size <= self.cfg.max_body_bytes:
+                    try:
+                        self.recorder.record(scope["path"], json.loads(b"".join(chunks) or b"{}"), ts)
+                    except ValueError:
+                        pass
+            return message
+
+        await self.app(scope, _receive, send)
+
+
+def read_traffic(path: str, endpoints: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Records from a traffic log in arrival order, optionally only for ``endpoints``."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "endpoint" in rec and (not endpoints or rec["endpoint"] in endpoints):
+                yield rec
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .index_store import IndexStore, tuning_path, write_index
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def search_grid(index) -> Tuple[Optional[str], List[int]]:
+    """The search-time knob for ``index`` and the values worth sweeping."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        values = [v for v in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024) if v < ivf.nlist] + [ivf.nlist]
+        return "nprobe", values
+    if hasattr(faiss.downcast_index(index), "hnsw"):
+        return "efSearch", [16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512]
+    return None, []
+
+
+def flat_ground_truth(index, queries: np.ndarray, k: int, embeddings=None, block_rows: int = 65536) -> np.ndarray:
+    """Exact top-k ids by brute force over ``embeddings`` (array or sharded), or the vectors held in ``index``."""
+    if embeddings is None:
+        if not hasattr(index, "reconstruct_n"):
+            raise ValueError("Index vectors can't be reconstructed; pass the embeddings as ground truth")
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        blocks = [index.reconstruct_n(0, index.ntotal)]
+        if ivf is not None:
+            ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    else:
+        # Memory-mapped arrays are scanned in slices so the exact pass never copies the whole corpus
+        blocks = embeddings.iter_blocks() if hasattr(embeddings, "iter_blocks") else (embeddings[i : i + block_rows] for i in range(0, len(embeddings), block_rows))
+    ip = index.metric_type == faiss.METRIC_INNER_PRODUCT
+    best_d = np.full((len(queries), k), -np.inf if ip else np.inf, dtype=np.float32)
+    best_i = np.full((len(queries), k), -1, dtype=np.int64)
+    offset = 0
+    for block in blocks:
+        flat = faiss.IndexFlat(index.d, index.metric_type)
+        flat.add(np.ascontiguousarray(block, dtype=np.float32))
+        d, i = flat.search(queries, min(k, flat.ntotal))
+        i = np.where(i >= 0, i + offset, -1)
+        offset += flat.ntotal
+        all_d = np.hstack([best_d, d])
+        all_i = np.hstack([best_i, i])
+        order = np.argsort(-all_d if ip else all_d, axis=1, kind="stable")[:, :k]
+        best_d = np.take_along_axis(all_d, order, axis=1)
+        best_i = np.take_along_axis(all_i, order, axis=1)
+    return best_i
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0].tolist()) & set(t[t >= 0].tolist())) for f, t in zip(found, truth))
+    return hits / float(truth.shape[0] * k)
+
+
+def sweep(index, queries: np.ndarray, truth: np.ndarray, param: str, values: List[int]) -> List[Dict]:
+    """Recall@k, per-query latency and single-client QPS for each setting of ``param``."""
+    ps = faiss.ParameterSpace()
+    k = truth.shape[1]
+    rows = []
+    for v in values:
+        ps.set_index_parameter(getattr(index, "ivf", index), param, v)
+        index.search(queries[:1], k)
+        found = np.empty_like(truth)
+        lat = np.empty(len(queries))
+        t0 = time.perf_counter()
+        for i in range(len(queries)):
+            t = time.perf_counter()
+            _, found[i : i + 1] = index.search(queries[i : i + 1], k)
+            lat[i] = time.perf_counter() - t
+        elapsed = time.perf_counter() - t0
+        rows.append(
+            {
+                param: v,
+                "recall": recall_at_k(found, truth),
+                "p50_ms": float(np.percentile(lat, 50)) * 1000.0,
+                "p99_ms": float(np.percentile(lat, 99)) * 1000.0,
+                "qps": len(queries) / elapsed,
+            }
+        )
+    return rows
+
+
+def pareto_front(rows: List[Dict]) -> List[Dict]:
+    """Settings not beaten on both recall and p50 latency by another setting."""
+    front = []
+    for r in sorted(rows, key=lambda r: (r["p50_ms"], -r["recall"])):
+        if not front or r["recall"] > front[-1]["recall"]:
+            front.append(r)
+    return front
+
+
+def choose(rows: List[Dict], param: str, target: float) -> Tuple[Dict, bool]:
+    """Smallest ``param`` reaching ``target``, else the highest-recall setting.
+
+    Search cost grows monotonically with nprobe/efSearch, so the parameter value is a steadier
+    cost measure than microsecond timings, which tie on small indexes.
+    """
+    met = [r for r in rows if r["recall"] >= target]
+    if met:
+        return min(met, key=lambda r: r[param]), True
+    return max(rows, key=lambda r: (r["recall"], -r[param])), False
+
+
+def tune_index(store: IndexStore, queries: np.ndarray, k: int, target: float, write: bool = True, embeddings=None) -> Dict:
+    """Sweep the index's search parameter against exact search and persist the chosen setting.
+
+    The parameter is set on the index before it is re-written (FAISS serializes ``nprobe`` and
+    ``efSearch``) and also recorded in a ``.tuning.json`` sidecar that ``IndexStore.load`` applies.
+    """
+    # On-disk IVF keeps its parameters on the in-memory header index
+    param, values = search_grid(getattr(store.index, "ivf", store.index))
+    if param is None:
+        return {"status": "skipped", "reason": f"{type(faiss.downcast_index(store.index)).__name__} has no search parameters to tune"}
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, store.index.ntotal)
+    truth = flat_ground_truth(store.index, queries, k, embeddings)
+    rows = sweep(store.index, queries, truth, param, values)
+    front = pareto_front(rows)
+    chosen, met = choose(rows, param, target)
+    if not met:
+        logger.warning(f"No {param} reaches Recall@{k} >= {target}; using best available {chosen[param]} (recall {chosen['recall']:.3f})")
+    report = {
+        "status": "ok" if met else "target_not_met",
+        "param": param,
+        "params": {param: chosen[param]},
+        "k": k,
+        "recall_target": target,
+        "queries": len(queries),
+        "chosen": chosen,
+        "pareto_front": front,
+        "sweep": rows,
+    }
+    store.set_search_params(report["params"])
+    if write:
+        write_index(store.index, store.index_path)
+        with open(tuning_path(store.index_path), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote {param}={chosen[param]} to {store.index_path} (Recall@{k}={chosen['recall']:.3f}, p50={chosen['p50_ms']:.2f}ms)")
+    return report
+
+
+def load_tuning_queries(queries_path: str, store: IndexStore, n: int, seed: int) -> List[str]:
+    """Eval queries when available, otherwise sampled chunk openings as pseudo-queries."""
+    if os.path.exists(queries_path):
+        with open(queries_path, "r", encoding="utf-8") as f:
+            texts = [line.rstrip("\n").split("\t", 1)[1] for line in f if "\t" in line]
+        if len(texts) >= n:
+            return texts[:n]
+    else:
+        texts = []
+    rng = np.random.RandomState(seed)
+    total = store.meta.num_rows
+    picks = rng.choice(total, min(n - len(texts), total), replace=False)
+    sampled = store.rows(picks.tolist(), columns=["text"])
+    return texts + [" ".join(r["text"].split()[:16]) for r in sampled]
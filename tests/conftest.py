@@ -0,0 +1,81 @@
+import pyarrow as pa
+import pytest
+import yaml
+
+from rag_toolkit.config import load_settings
+from rag_toolkit.loaders import load_documents
+from rag_toolkit.chunker import chunk_documents
+from rag_toolkit.embedder import Embedder
+from rag_toolkit.index_store import IndexStore
+
+
+@pytest.fixture
+def make_settings(tmp_path, monkeypatch):
+    """``make_settings(section={...})``: config/test_settings.yaml with artifacts under ``tmp_path`` and the sections updated.
+
+    The result is written to ``tmp_path/settings.yaml`` and exported as ``RAG_SETTINGS``, so code
+    that calls ``load_settings()`` itself (``build_chain()``, the API routers) sees the same values.
+    """
+
+    def _make(**sections):
+        with open("config/test_settings.yaml", "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+        for key in ("chunks_path", "embeddings_path", "index_path", "index_meta_path", "eval_path"):
+            cfg["paths"][key] = str(tmp_path / cfg["paths"][key].split("/")[-1])
+        cfg["paths"]["artifacts_dir"] = str(tmp_path)
+        cfg["serving"] = {"versions_dir": str(tmp_path / "versions")}
+        for section, values in sections.items():
+            cfg.setdefault(section, {}).update(values)
+        path = tmp_path / "settings.yaml"
+        path.write_text(yaml.safe_dump(cfg), encoding="utf-8")
+        monkeypatch.setenv("RAG_SETTINGS", str(path))
+        return load_settings()
+
+    return _make
+
+
+@pytest.fixture
+def settings(make_settings):
+    return make_settings()
+
+
+@pytest.fixture
+def chunks(settings):
+    return chunk_documents(load_documents(settings.paths.raw_data_dir), settings.chunking.chunk_size, settings.chunking.chunk_overlap)
+
+
+@pytest.fixture
+def embedder(settings):
+    return Embedder(settings.embedding, seed=settings.seed)
+
+
+@pytest.fixture
+def build_store():
+    """``build_store(s, chunks=None)``: embed ``chunks`` (default: the test corpus) and save an index at ``s.paths``."""
+
+    def _build(s, chunks=None):
+        if chunks is None:
+            chunks = chunk_documents(load_documents(s.paths.raw_data_dir), s.chunking.chunk_size, s.chunking.chunk_overlap)
+        store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
+        store.build(Embedder(s.embedding, seed=s.seed).embed_texts(chunks.column("text").to_pylist()), chunks)
+        store.save()
+        return store
+
+    return _build
+
+
+@pytest.fixture
+def store(settings, chunks, build_store):
+    return build_store(settings, chunks)
+
+
+@pytest.fixture
+def chunk_table():
+    """``chunk_table(n, **columns)``: an ``n``-row chunk table with placeholder values, for indexes over synthetic vectors."""
+
+    def _table(n, **columns):
+        cols = {"chunk_id": [str(i) for i in range(n)], "doc_id": ["d"] * n, "start": [0] * n, "end": [1] * n, "text": ["t"] * n, "source": ["s"] * n}
+        cols.update(columns)
+        return pa.table(cols)
+
+    return _table
@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from rag_toolkit.admission import AdmissionMiddleware
+from rag_toolkit.config import AdmissionCfg
+
+
+def _app(release: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/query")
+    async def query():
+        await release.wait()
+        return {"ok": True}
+
+    @app.post("/chain_query")
+    async def chain_query():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    cfg = AdmissionCfg(query_concurrency=1, query_queue=1, query_max_wait_s=0.2, chain_concurrency=1)
+    app.add_middleware(AdmissionMiddleware, cfg=cfg)
+    return app
+
+
+def test_lanes_shed_load_with_retry_after():
+    async def run():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=_app(release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = asyncio.create_task(client.post("/query"))
+            await asyncio.sleep(0.05)
+            queued = asyncio.create_task(client.post("/query"))
+            await asyncio.sleep(0.05)
+            full = await client.post("/query")
+            # Separate lane and unlimited paths are unaffected by the busy query lane
+            chain = await client.post("/chain_query")
+            health = await client.get("/health")
+            timed_out = await queued
+            release.set()
+            ok = await busy
+            after = await client.post("/query")
+        return full, timed_out, chain, health, ok, after
+
+    full, timed_out, chain, health, ok, after = asyncio.run(run())
+    assert full.status_code == 429 and full.headers["Retry-After"] == "1"
+    assert timed_out.status_code == 503 and timed_out.json()["reason"] == "timeout"
+    assert chain.status_code == 200 and health.status_code == 200
+    assert ok.status_code == 200 and after.status_code == 200
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+
+from rag_toolkit.answer_cache import SemanticAnswerCache, context_fingerprint
+from rag_toolkit import graphs
+from rag_toolkit.chains import build_chain
+from rag_toolkit.graphs import build_graph
+
+
+def _vec(seed, dim=16):
+    return np.random.RandomState(seed).rand(1, dim).astype(np.float32)
+
+
+def test_cache_requires_similar_query_and_same_chunks():
+    cache = SemanticAnswerCache(16, threshold=0.99, ttl_s=60, max_entries=2)
+    chunks = [{"chunk_id": 1, "doc_id": "a", "start": 0, "end": 5, "text": "hello"}]
+    fp = context_fingerprint(chunks, "langchain")
+    cache.put(_vec(0), fp, {"answer": "hi"}, cost_s=1.5)
+
+    assert cache.get(_vec(0) * 2, fp)["answer"] == "hi"
+    assert cache.get(_vec(1), fp) is None
+    # Same chunk id after a re-index with different text is a different context
+    reindexed = [dict(chunks[0], text="HELLO")]
+    assert cache.get(_vec(0), context_fingerprint(reindexed, "langchain")) is None
+
+    cache.put(_vec(2), fp, {"answer": "two"})
+    cache.put(_vec(3), fp, {"answer": "three"})
+    assert len(cache.entries) == 2
+    assert cache.get(_vec(2), fp)["answer"] == "two"
+    assert cache.stats()["hits"] == 2
+
+    cache.ttl_s = 0.01
+    cache.put(_vec(4), fp, {"answer": "four"})
+    time.sleep(0.02)
+    assert cache.get(_vec(4), fp) is None
+
+
+def test_chain_serves_repeat_query_from_cache(make_settings, build_store):
+    build_store(make_settings(answer_cache={"enabled": True, "threshold": 0.99}))
+
+    chain = build_chain()
+    first = chain.invoke({"query": "what is in these docs?", "k": 3})
+    second = chain.invoke({"query": "what is in these docs?", "k": 3})
+    assert "cached" not in first
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+    assert second["citations"] == first["citations"]
+
+
+def test_graph_cache_hit_skips_llm_setup(make_settings, build_store, monkeypatch):
+    build_store(make_settings(answer_cache={"enabled": True, "threshold": 0.99}))
+
+    graph = build_graph()
+    first = graph.invoke({"query": "what is in these docs?", "k": 3})
+    built = []
+    monkeypatch.setattr(graphs, "build_llm_within", lambda *a: built.append(a))
+    second = graph.invoke({"query": "what is in these docs?", "k": 3})
+    assert second["cached"] is True and second["answer"] == first["answer"]
+    assert built == []
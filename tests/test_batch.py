@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from rag_toolkit.config import BatchCfg
+from rag_toolkit.chains import build_chain
+from rag_toolkit.batch import RateLimiter, answer_batch, completed_ids, read_queries, with_retries
+from rag_toolkit.cli import app
+
+
+def test_retries_back_off_then_give_up():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("429")
+        return "ok"
+
+    cfg = BatchCfg(max_retries=3, backoff_s=0.001)
+    assert with_retries(flaky, cfg, RateLimiter(0)) == ("ok", 3)
+
+    def down():
+        raise RuntimeError("503")
+
+    with pytest.raises(RuntimeError):
+        with_retries(down, BatchCfg(max_retries=1, backoff_s=0.001), RateLimiter(0))
+
+
+def test_batch_answers_resume_after_interruption(tmp_path, store, embedder):
+    queries = tmp_path / "queries.jsonl"
+    queries.write_text("".join(json.dumps({"id": f"q{i}", "query": f"question {i} about the docs"}) + "\n" for i in range(7)))
+    items = read_queries(str(queries))
+    out = tmp_path / "answers.jsonl"
+    cfg = BatchCfg(concurrency=3, search_batch=3)
+
+    chain = build_chain(store, embedder)
+    # A previous run answered q0 and q1, then died halfway through writing q2
+    out.write_text(json.dumps({"id": "q0", "answer": "a"}) + "\n" + json.dumps({"id": "q1", "error": "boom"}) + "\n" + '{"id": "q2", "ans')
+    assert completed_ids(str(out)) == {"q0"}
+    stats = answer_batch(chain, items, str(out), 2, cfg)
+    assert stats["skipped"] == 1 and stats["answered"] == 6 and stats["failed"] == 0
+
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    answered = {r["id"] for r in records if "answer" in r}
+    assert answered == {f"q{i}" for i in range(7)}
+    assert all(r["used_k"] == 2 and r["citations"] for r in records if r["id"] != "q0" and "answer" in r)
+    assert answer_batch(chain, items, str(out), 2, cfg)["skipped"] == 7
+
+
+def test_batch_records_render_errors_and_rejects_other_engines(tmp_path, monkeypatch, store, embedder):
+    queries = tmp_path / "queries.tsv"
+    queries.write_text("q0\tfirst question\nq1\tbad question\nq2\tthird question\n")
+    out = tmp_path / "answers.jsonl"
+    chain = build_chain(store, embedder)
+    render = chain._render
+
+    def flaky_render(question, docs):
+        if question.startswith("bad"):
+            raise ValueError("template broke")
+        return render(question, docs)
+
+    monkeypatch.setattr(chain, "_render", flaky_render)
+    stats = answer_batch(chain, read_queries(str(queries)), str(out), 2, BatchCfg(concurrency=2))
+    assert stats["answered"] == 2 and stats["failed"] == 1
+    records = {r["id"]: r for r in map(json.loads, out.read_text().splitlines())}
+    assert records["q1"]["error"] == "ValueError: template broke" and records["q1"]["attempts"] == 0
+
+    result = CliRunner().invoke(app, ["chain", "--batch", str(queries), "--out", str(out), "--engine", "langgraph"])
+    assert result.exit_code != 0 and "--engine langchain" in result.output
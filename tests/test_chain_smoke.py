@@ -20,7 +20,7 @@ def test_chain_smoke(monkeypatch):
     persist_chunks(df, s.paths.chunks_path)
 
     emb = Embedder(s.embedding, seed=s.seed)
-    vectors = emb.embed_texts(df["text"].tolist(), batch_size=s.embedding.batch_size)
+    vectors = emb.embed_texts(df.column("text").to_pylist(), batch_size=s.embedding.batch_size)
     np.save(s.paths.embeddings_path, vectors)
 
     store = IndexStore(s.paths.index_path, s.paths.index_meta_path)
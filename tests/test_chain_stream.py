@@ -0,0 +1,89 @@
+import asyncio
+import json
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from rag_toolkit import api_chain
+from rag_toolkit.api_chain import _TokenPump, _pull, router
+
+
+def _tokens(words):
+    for w in words:
+        yield w
+    return {"done": True}
+
+
+def test_pull_coalesces_tokens():
+    pump = _TokenPump(_tokens(["a ", "b ", "c ", "d ", "e "]))
+    # Let the pump queue everything so coalescing doesn't depend on thread timing
+    pump.thread.join()
+    gen = pump.queue
+    assert _pull(gen, 4, 10.0, True) == ("a ", 1, False, {})
+    assert _pull(gen, 4, 10.0, False) == ("b c ", 2, False, {})
+    assert _pull(gen, 4, 10.0, False) == ("d e ", 2, False, {})
+    assert _pull(gen, 4, 10.0, False) == ("", 0, True, {"done": True})
+
+
+def test_chain_stream_sse_events(store):
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    r = client.post("/chain_stream", json={"query": "what is in these docs?", "k": 3, "format": "sse", "coalesce_chars": 64})
+    assert r.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in r.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    kinds = [e for e, _ in events]
+    assert kinds[0] == "token" and kinds[-1] == "citations" and kinds.count("citations") == 1
+    texts = [d["text"] for e, d in events if e == "token"]
+    assert all(len(t) < 64 + 40 for t in texts)
+    assert len("".join(texts)) > 0
+    assert len(events[-1][1]["citations"]) > 0
+
+
+def test_disconnect_closes_upstream_stream(monkeypatch):
+    closed = threading.Event()
+    release = threading.Event()
+
+    class _SlowChain:
+        def stream(self, inputs):
+            try:
+                yield "first "
+                # Still inside next() when the client goes away
+                release.wait(5)
+                yield "second "
+                return {"citations": []}
+            finally:
+                closed.set()
+
+    monkeypatch.setattr(api_chain, "_select_engine", lambda engine, collection=None: _SlowChain())
+
+    class _Request:
+        headers = {}
+
+        async def json(self):
+            return {"query": "q", "engine": "fake-disconnect"}
+
+        async def is_disconnected(self):
+            return False
+
+    def cancelled():
+        return REGISTRY.get_sample_value("rag_chain_stream_cancelled_total", {"engine": "fake-disconnect"}) or 0.0
+
+    async def _run():
+        response = await api_chain.chain_stream(_Request())
+        body = response.body_iterator
+        assert await body.__anext__() == "first "
+        # What Starlette does when the client disconnects mid-stream
+        await body.aclose()
+
+    before = cancelled()
+    asyncio.run(_run())
+    assert cancelled() == before + 1
+    release.set()
+    assert closed.wait(5)
@@ -10,4 +10,18 @@ def test_chunker_creates_chunks(tmp_path, monkeypatch):
     docs = load_documents(s.paths.raw_data_dir)
     df = chunk_documents(docs, s.chunking.chunk_size, s.chunking.chunk_overlap)
     assert len(df) > 0
-    assert {"chunk_id", "doc_id", "start", "end", "text"}.issubset(df.columns)
\ No newline at end of file
+    assert {"chunk_id", "doc_id", "start", "end", "text"}.issubset(df.column_names)
+
+
+def test_arrow_chunks_match_chunk_text():
+    from rag_toolkit.chunker import chunk_text
+    from rag_toolkit.loaders import Document
+
+    docs = [
+        Document(doc_id="a.txt", path="a.txt", text="héllo wörld, ünïcode 😀 " * 7, meta={"relpath": "a.txt"}),
+        Document(doc_id="b.txt", path="b.txt", text="", meta={"relpath": "b.txt"}),
+        Document(doc_id="c.txt", path="c.txt", text="plain ascii text " * 5, meta={"relpath": "sub/c.txt"}),
+    ]
+    for size, overlap in [(10, 3), (16, 0), (7, 7), (200, 20)]:
+        expected = [c.__dict__ for d in docs for c in chunk_text(d, size, overlap)]
+        assert chunk_documents(docs, size, overlap).to_pylist() == expected
@@ -0,0 +1,33 @@
+import pytest
+
+from rag_toolkit.index_store import IndexStore
+from rag_toolkit.collection_registry import CollectionRegistry, UnknownCollection
+
+
+def test_lru_eviction_under_memory_budget(tmp_path, settings, chunks, embedder):
+    s, df = settings, chunks
+    vectors = embedder.embed_texts(df.column("text").to_pylist())
+    for name in ("a", "b"):
+        store = IndexStore(str(tmp_path / f"{name}.faiss"), str(tmp_path / f"{name}.jsonl"))
+        store.build(vectors, df)
+        store.save()
+        s.collections.items[name] = {"index_path": store.index_path, "index_meta_path": store.meta_path}
+    # Room for one collection at a time
+    s.collections.memory_budget_mb = 1.5 * (tmp_path / "a.faiss").stat().st_size / (1024 * 1024)
+
+    registry = CollectionRegistry(s)
+    a = registry.get("a")
+    assert len(a.retriever.search("what is in these docs?", 3)) == 3
+    b = registry.get("b")
+    assert list(registry.resident) == ["b"]
+    # An evicted manager held by an in-flight request keeps working
+    assert len(a.retriever.search("what is in these docs?", 3)) == 3
+
+    registry.get("a")
+    status = registry.status()["collections"]
+    assert status["a"]["resident"] and not status["b"]["resident"]
+    assert status["a"]["loads"] == 2 and status["a"]["memory_bytes"] > 0
+    assert a.embedder is b.embedder
+
+    with pytest.raises(UnknownCollection):
+        registry.get("missing")
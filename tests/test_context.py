@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+
+from jinja2 import Template
+
+from rag_toolkit.context import count_tokens, pack_contexts, pack_for_prompt
+
+
+TEXT = "abcdefghijklmnopqrstuvwxyz" * 4
+
+
+def _doc(doc_id, start, end, score, chunk_id):
+    return Document(page_content=TEXT[start:end], metadata={"doc_id": doc_id, "start": start, "end": end, "score": score, "chunk_id": chunk_id})
+
+
+def chars(text):
+    return len(text)
+
+
+def test_overlapping_and_adjacent_chunks_merge():
+    docs = [_doc("a", 10, 30, 0.9, 1), _doc("b", 0, 10, 0.8, 2), _doc("a", 0, 15, 0.7, 0), _doc("a", 30, 40, 0.6, 3)]
+    packed = pack_contexts(docs, 1000, chars)
+    assert [d.metadata["doc_id"] for d in packed] == ["a", "b"]
+    a = packed[0]
+    assert (a.metadata["start"], a.metadata["end"]) == (0, 40)
+    assert a.page_content == TEXT[0:40]
+    assert sorted(a.metadata["chunk_ids"]) == [0, 1, 3]
+    assert a.metadata["score"] == 0.9
+    assert a.metadata["tokens"] == 40
+
+
+def test_budget_truncates_then_drops():
+    docs = [_doc("a", 0, 60, 0.9, 0), _doc("b", 0, 50, 0.8, 1), _doc("c", 0, 50, 0.7, 2)]
+    packed = pack_contexts(docs, 100, chars)
+    assert [d.metadata["doc_id"] for d in packed] == ["a", "b"]
+    b = packed[1]
+    assert b.page_content == TEXT[0:40]
+    assert (b.metadata["start"], b.metadata["end"]) == (0, 40)
+
+    # Too little room left to be worth truncating into
+    packed = pack_contexts(docs, 80, chars)
+    assert [d.metadata["doc_id"] for d in packed] == ["a"]
+
+
+def test_prompt_budget_counts_the_template():
+    template = Template("{{ system }}\nQuestion: {{ question }}\n{% for c in contexts %}<context>\n{{ c }}\n</context>\n{% endfor %}Answer:")
+    docs = [_doc("a", 0, 104, 0.9, 0), _doc("b", 0, 104, 0.8, 1)]
+
+    def prompt_tokens(packed):
+        return count_tokens(template.render(system="s", question="q", contexts=[d.page_content for d in packed]))
+
+    budget = prompt_tokens(docs) - 1
+    # Counting only system + question leaves room for both spans, and the rendered prompt overflows
+    assert prompt_tokens(pack_for_prompt(docs, "q", "s", budget)) > budget
+    assert prompt_tokens(pack_for_prompt(docs, "q", "s", budget, template=template)) <= budget
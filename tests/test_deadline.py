@@ -0,0 +1,28 @@
+from rag_toolkit.config import DeadlineCfg, LLMcfg
+from rag_toolkit.chains import build_chain
+from rag_toolkit.graphs import build_graph
+from rag_toolkit.deadline import Deadline, build_llm_within
+from rag_toolkit.providers import NoLLM
+
+
+def test_budget_checks_degrade_in_order():
+    cfg = DeadlineCfg(full_k_min_ms=500, min_k=2, rerank_min_ms=400, generate_min_ms=100, tokens_per_s=10)
+    unlimited = Deadline(None, cfg, "langchain")
+    assert unlimited.shrink_k(8) == 8 and not unlimited.skip_rerank() and unlimited.max_tokens(512) == 512
+    assert unlimited.degradations == []
+
+    tight = Deadline(300, cfg, "langchain")
+    assert tight.shrink_k(8) == 2 and tight.skip_rerank() and not tight.skip_generation()
+    assert tight.max_tokens(512) <= 3
+    assert tight.degradations == ["shrink_k", "skip_rerank", "cap_max_tokens"]
+    # Out of time for generation: the configured provider is replaced by the contexts passthrough
+    assert isinstance(build_llm_within(Deadline(50, cfg, "langchain"), LLMcfg(provider="openai"), False), NoLLM)
+
+
+def test_chains_report_degradations(settings, store, embedder):
+    for runner in (build_chain(store, embedder), build_graph(store, embedder)):
+        res = runner.invoke({"query": "what is in these docs?", "k": 5, "deadline_ms": 1})
+        assert res["degradations"] == ["shrink_k", "skip_generation"]
+        assert res["used_k"] == settings.deadline.min_k and res["answer"]
+        relaxed = runner.invoke({"query": "what is in these docs?", "k": 5})
+        assert relaxed["degradations"] == [] and relaxed["used_k"] == 5
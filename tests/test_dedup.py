@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from rag_toolkit.config import DedupCfg
+from rag_toolkit.loaders import load_documents
+from rag_toolkit.chunker import chunk_documents
+from rag_toolkit.dedup import dedup_chunks, duplicate_documents, find_duplicates
+
+
+BOILERPLATE = "This document is confidential and intended only for the named recipient of the message. " * 3
+
+
+def test_content_ids_and_document_dedup(tmp_path):
+    for folder, text in [("a", "alpha report"), ("b", "beta report"), ("c", "alpha report")]:
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "report.txt").write_text(text, encoding="utf-8")
+
+    assert {d.doc_id for d in load_documents(str(tmp_path))} == {os.path.join(f, "report.txt") for f in "abc"}
+    assert len({d.doc_id for d in load_documents(str(tmp_path), doc_ids="filename")}) == 1
+    with pytest.raises(ValueError, match="doc_ids"):
+        load_documents(str(tmp_path), doc_ids="path")
+
+    docs = load_documents(str(tmp_path), doc_ids="content")
+    assert len({d.doc_id for d in docs}) == 2
+    aliases = duplicate_documents(docs)
+    assert sum(len(v) for v in aliases.values()) == 1
+
+
+def test_exact_and_near_duplicate_chunks(tmp_path):
+    (tmp_path / "one.txt").write_text(BOILERPLATE, encoding="utf-8")
+    (tmp_path / "two.txt").write_text(BOILERPLATE, encoding="utf-8")
+    # One word changed: not an exact copy, but well above the similarity threshold
+    (tmp_path / "three.txt").write_text(BOILERPLATE.replace("recipient", "addressee", 1), encoding="utf-8")
+    (tmp_path / "other.txt").write_text("Completely unrelated notes about FAISS index tuning. " * 5, encoding="utf-8")
+
+    docs = load_documents(str(tmp_path), doc_ids="relpath")
+    df = chunk_documents(docs, chunk_size=1000, chunk_overlap=0)
+    texts = df.column("text").to_pylist()
+    assert len(set(find_duplicates(texts, DedupCfg()).tolist())) == 2
+    assert len(set(find_duplicates(texts, DedupCfg(near_duplicates=False)).tolist())) == 3
+
+    kept, duplicates = dedup_chunks(df, DedupCfg())
+    assert len(kept) == 2
+    merged = [d["doc_id"] for v in duplicates.values() for d in v]
+    assert len(merged) == 2 and set(merged) < {"one.txt", "two.txt", "three.txt"}
+
+    kept, duplicates = dedup_chunks(df, DedupCfg(near_duplicates=False))
+    assert len(kept) == 3
+    merged = [d["doc_id"] for v in duplicates.values() for d in v]
+    assert len(merged) == 1 and merged[0] in {"one.txt", "two.txt"}
+    assert "three.txt" in kept.column("doc_id").to_pylist()
@@ -0,0 +1,52 @@
+import faiss
+import numpy as np
+import pytest
+
+from rag_toolkit.disk_ivf import build_disk_ivf, disk_paths
+from rag_toolkit.index_store import IndexStore
+
+
+def test_disk_lists_match_in_memory_ivf(tmp_path):
+    rng = np.random.RandomState(0)
+    x = rng.rand(3000, 16).astype(np.float32)
+    mem = faiss.index_factory(16, "IVF8,Flat", faiss.METRIC_INNER_PRODUCT)
+    mem.train(x)
+    mem.add(x)
+    trained = faiss.clone_index(mem)
+    trained.reset()
+    # Small batches force a multi-run merge
+    disk = build_disk_ivf(x, str(tmp_path / "index.faiss"), trained, batch_size=700)
+    mem.nprobe = disk.nprobe = 3
+    q = x[:20] + 0.01
+    d1, i1 = mem.search(q, 5)
+    d2, i2 = disk.search(q, 5)
+    assert np.array_equal(i1, i2) and np.allclose(d1, d2, atol=1e-5)
+    first = disk.stats()
+    disk.search(q, 5)
+    stats = disk.stats()
+    assert first["cache_hit_rate"] == 0.0 and stats["cache_hit_rate"] == 0.5
+    assert stats["bytes_read"] == first["bytes_read"] > 0
+
+
+def test_index_store_round_trip_on_disk(tmp_path, chunk_table):
+    x = np.random.RandomState(1).rand(500, 8).astype(np.float32)
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(x, chunk_table(500), index_type="IVF4,Flat", on_disk=True)
+    store.save()
+    loaded = IndexStore(store.index_path, store.meta_path)
+    loaded.load(disk_cache_mb=0)
+    loaded.set_search_params({"nprobe": 4})
+    assert loaded.index.ntotal == 500 and loaded.index.search(x[:1], 1)[1][0, 0] >= 0
+    assert loaded.index.stats()["cached_lists"] == 0
+
+    # Rebuilding in memory drops the on-disk lists
+    store.build(x, chunk_table(500), index_type="IVF4,Flat")
+    store.save()
+    assert not any(tmp_path.joinpath(p).exists() for p in disk_paths("index.faiss"))
+
+
+def test_on_disk_rejects_pre_transformed_ivf(tmp_path, chunk_table):
+    x = np.random.RandomState(2).rand(200, 16).astype(np.float32)
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    with pytest.raises(ValueError, match="plain IVF"):
+        store.build(x, chunk_table(200), index_type="PCA8,IVF4,Flat", on_disk=True)
@@ -21,7 +21,7 @@ def test_embed_and_index(monkeypatch):
 
     # Embed with dummy embedder for deterministic outputs
     emb = Embedder(s.embedding, seed=s.seed)
-    vectors = emb.embed_texts(df["text"].tolist(), batch_size=s.embedding.batch_size)
+    vectors = emb.embed_texts(df.column("text").to_pylist(), batch_size=s.embedding.batch_size)
     np.save(s.paths.embeddings_path, vectors)
 
     # Build and persist index
@@ -36,4 +36,25 @@ def test_embed_and_index(monkeypatch):
     df2 = pd.read_parquet(s.paths.chunks_path)
     with open(s.paths.index_meta_path, "r", encoding="utf-8") as f:
         meta_lines = list(f)
-    assert len(meta_lines) == len(df2)
\ No newline at end of file
+    assert len(meta_lines) == len(df2)
+
+
+def test_mmap_load_matches_heap_and_survives_rewrite(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_SETTINGS", "config/test_settings.yaml")
+    s = load_settings()
+    df = chunk_documents(load_documents(s.paths.raw_data_dir), s.chunking.chunk_size, s.chunking.chunk_overlap)
+    vectors = Embedder(s.embedding, seed=s.seed).embed_texts(df.column("text").to_pylist())
+    for index_type in ("IndexFlatIP", "HNSW8,Flat"):
+        path = str(tmp_path / f"{index_type}.faiss")
+        built = IndexStore(path, str(tmp_path / "meta.jsonl"))
+        built.build(vectors, df, index_type=index_type)
+        built.save()
+
+        heap, mapped = IndexStore(path, built.meta_path), IndexStore(path, built.meta_path)
+        heap.load()
+        mapped.load(mmap=True, prefault_pages=True)
+        assert mapped.mmap and not heap.mmap
+        assert np.array_equal(heap.index.search(vectors[:3], 3)[1], mapped.index.search(vectors[:3], 3)[1])
+        # Saving over a mapped file replaces the inode, so the mapped reader keeps working
+        built.save()
+        assert mapped.index.search(vectors[:3], 3)[1].shape == (3, 3)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from rag_toolkit.chunker import persist_chunks
+from rag_toolkit.embed_pool import embed_parquet_parallel
+
+
+def test_parallel_embed_matches_single_process(tmp_path, settings, chunks, embedder):
+    s, df = settings, chunks
+    chunks_path = str(tmp_path / "chunks.parquet")
+    out_path = str(tmp_path / "embeddings.npy")
+    persist_chunks(df, chunks_path)
+
+    seen = []
+    n, dim = embed_parquet_parallel(
+        chunks_path, out_path, s.embedding, seed=s.seed, num_workers=2, shard_size=2,
+        progress=lambda done, total: seen.append((done, total)),
+    )
+
+    expected = embedder.embed_texts(df.column("text").to_pylist())
+    vectors = np.load(out_path)
+    assert (n, dim) == expected.shape
+    assert np.allclose(vectors, expected)
+    assert seen[-1] == (n, n)
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from rag_toolkit.chunker import persist_chunks
+from rag_toolkit.embed_shards import ShardedEmbeddings, embed_to_shards, open_embeddings
+from rag_toolkit.index_store import IndexStore
+
+
+def test_sharded_embedding_resumes(tmp_path, settings, chunks, embedder):
+    s, df = settings, chunks
+    chunks_path = str(tmp_path / "chunks.parquet")
+    out_dir = str(tmp_path / "embeddings")
+    persist_chunks(df, chunks_path)
+
+    manifest = embed_to_shards(chunks_path, out_dir, s.embedding, seed=s.seed, shard_size=2)
+    assert len(manifest["shards"]) == (len(df) + 1) // 2
+
+    # Simulate a crash that lost the last shard
+    last = sorted(manifest["shards"])[-1]
+    del manifest["shards"][last]
+    os.remove(os.path.join(out_dir, last))
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    seen = []
+    embed_to_shards(chunks_path, out_dir, s.embedding, seed=s.seed, shard_size=2, progress=lambda d, t: seen.append(d))
+    assert seen == [len(df)]
+
+    sharded = ShardedEmbeddings(out_dir)
+    expected = embedder.embed_texts(df.column("text").to_pylist())
+    assert np.allclose(np.vstack(list(sharded.iter_blocks())), expected)
+
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(sharded, df)
+    assert store.index.ntotal == len(df)
+
+
+def test_same_size_edit_discards_shards(tmp_path, settings, embedder, chunk_table):
+    import pyarrow as pa
+
+    s = settings
+    chunks_path = str(tmp_path / "chunks.parquet")
+    out_dir = str(tmp_path / "embeddings")
+    table = chunk_table(1, end=[19], text=["teh quick brown fox"])
+    persist_chunks(table, chunks_path)
+    first = embed_to_shards(chunks_path, out_dir, s.embedding, seed=s.seed, shard_size=1)
+    size = os.path.getsize(chunks_path)
+
+    persist_chunks(table.set_column(4, "text", pa.array(["the quick brown fox"])), chunks_path)
+    assert os.path.getsize(chunks_path) == size
+    second = embed_to_shards(chunks_path, out_dir, s.embedding, seed=s.seed, shard_size=1)
+    assert second["fingerprint"] != first["fingerprint"]
+    expected = embedder.embed_texts(["the quick brown fox"])
+    assert np.allclose(np.vstack(list(ShardedEmbeddings(out_dir).iter_blocks())), expected)
+
+
+def test_open_embeddings_skips_stale_shards(tmp_path, settings, chunks, embedder):
+    s = settings
+    chunks_path = str(tmp_path / "chunks.parquet")
+    out_dir = str(tmp_path / "embeddings")
+    npy = str(tmp_path / "embeddings.npy")
+    persist_chunks(chunks, chunks_path)
+    embed_to_shards(chunks_path, out_dir, s.embedding, seed=s.seed, shard_size=2)
+    assert isinstance(open_embeddings(out_dir, npy, chunks_path, s.embedding), ShardedEmbeddings)
+
+    # A later single-file embed wins over the older shards
+    newer = embedder.embed_texts(chunks.column("text").to_pylist()) * 2
+    np.save(npy, newer)
+    os.utime(npy, (time.time() + 5, time.time() + 5))
+    assert np.allclose(open_embeddings(out_dir, npy, chunks_path, s.embedding), newer)
+
+    # Shards for other chunks are never used, whatever the timestamps
+    os.utime(npy, (0, 0))
+    persist_chunks(chunks.slice(0, 2), chunks_path)
+    assert not isinstance(open_embeddings(out_dir, npy, chunks_path, s.embedding), ShardedEmbeddings)
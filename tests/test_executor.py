@@ -0,0 +1,68 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from rag_toolkit import executor as executor_mod
+from rag_toolkit.config import ExecutionCfg
+from rag_toolkit.retrieval import Retriever
+from rag_toolkit.executor import ExecutorBusy, SearchExecutor, benchmark_search, get_search_executor, resolve_threads
+
+
+def test_modes_resolve_thread_counts():
+    assert resolve_threads(ExecutionCfg(mode="throughput"))[1:] == (1, 1)
+    assert resolve_threads(ExecutionCfg(mode="latency"))[0] == 1
+    assert resolve_threads(ExecutionCfg(mode="latency", workers=3, faiss_threads=2))[:2] == (3, 2)
+
+
+def test_executor_search_and_batch_match_direct(store, embedder):
+    queries = ["what is in these docs?", "faiss index", "embedding model"]
+    direct = Retriever(store, embedder)
+    executor = SearchExecutor(ExecutionCfg(mode="throughput", workers=2))
+    pooled = Retriever(store, embedder, executor)
+    expected = [direct.search(q, 3) for q in queries]
+    assert [pooled.search(q, 3) for q in queries] == expected
+    batch = pooled.search_batch(queries, 3)
+    assert [[r["chunk_id"] for r in b] for b in batch] == [[r["chunk_id"] for r in e] for e in expected]
+    assert np.allclose([r["score"] for b in batch for r in b], [r["score"] for e in expected for r in e], atol=1e-5)
+
+    row = benchmark_search(lambda q: pooled.search(q, 3), queries, concurrency=2, duration_s=0.2)
+    assert row["requests"] > 0 and row["p99_ms"] >= row["p50_ms"]
+    executor.shutdown()
+
+
+def test_full_pool_times_out_and_replaced_pool_drains(monkeypatch):
+    release = threading.Event()
+    ex = SearchExecutor(ExecutionCfg(workers=1, max_queue=0, queue_timeout_s=0.05))
+    running = ex.submit(release.wait, 5)
+    with pytest.raises(ExecutorBusy):
+        ex.submit(lambda: None)
+
+    # Replacing the process-wide executor must not cancel the search still running on the old one
+    monkeypatch.setattr(executor_mod, "_executor", ex)
+    current = get_search_executor(ExecutionCfg(mode="latency", workers=1))
+    assert current is not ex and not ex._pool._shutdown
+    # Retrievers still holding the old executor are served by its successor
+    assert ex.run(lambda: threading.current_thread().name).startswith("search-latency")
+    release.set()
+    assert running.result(timeout=5) is True
+    deadline = time.monotonic() + 5
+    while not ex._pool._shutdown and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ex._pool._shutdown
+    current.shutdown()
+
+
+def test_busy_search_answers_503(monkeypatch):
+    from rag_toolkit import api
+
+    class Busy:
+        def embed_query(self, query):
+            raise ExecutorBusy("full")
+
+    monkeypatch.setattr(api, "_resolve", lambda name: (SimpleNamespace(retriever=Busy()), None))
+    r = TestClient(api.app).post("/query", json={"query": "q"})
+    assert r.status_code == 503 and r.headers["retry-after"] == "1"
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from rag_toolkit import llm_router
+from rag_toolkit.config import LLMRouterCfg
+from rag_toolkit.llm_router import LLMRouter
+
+
+class FakeClient:
+    def __init__(self, delay_s: float, text: str, fail: bool = False) -> None:
+        self.delay_s, self.text, self.fail = delay_s, text, fail
+        self.closed = False
+
+    def stream(self, messages):
+        try:
+            time.sleep(self.delay_s)
+            if self.fail:
+                raise ConnectionError("upstream reset")
+            for tok in self.text.split(" "):
+                yield tok + " "
+                time.sleep(0.01)
+            return {"completion": len(self.text)}
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    made = {}
+    behaviour = {}
+
+    def fake_build_llm(provider, model, temperature, max_tokens, stream, timeout=None, api_base=None):
+        made.setdefault(provider, []).append(FakeClient(*behaviour[provider]))
+        return made[provider][-1]
+
+    monkeypatch.setattr(llm_router, "build_llm", fake_build_llm)
+    return made, behaviour
+
+
+def _router(**kw) -> LLMRouter:
+    routes = [{"provider": "slow", "model": "a"}, {"provider": "fast", "model": "b"}]
+    return LLMRouter(LLMRouterCfg(routes=routes, hedge_initial_ms=50, **kw))
+
+
+def test_hedge_wins_and_loser_is_cancelled(clients):
+    made, behaviour = clients
+    behaviour.update(slow=(0.5, "slow answer"), fast=(0.0, "fast answer here"))
+    t0 = time.monotonic()
+    assert _router().client(0.0, 64, False).invoke([]) == "fast answer here "
+    assert time.monotonic() - t0 < 0.4
+    time.sleep(0.6)
+    assert made["slow"][0].closed
+
+
+def test_failover_and_circuit_breaker(clients):
+    made, behaviour = clients
+    behaviour.update(slow=(0.0, "", True), fast=(0.0, "backup"))
+    router = _router(breaker_failures=1, breaker_reset_s=60)
+    assert router.client(0.0, 64, False).invoke([]) == "backup "
+    assert router.status()[0]["breaker_open"]
+    # The open route is skipped entirely on the next request
+    assert router.client(0.0, 64, False).invoke([]) == "backup "
+    assert len(made["slow"]) == 1 and len(made["fast"]) == 2
+
+    behaviour["fast"] = (0.0, "", True)
+    with pytest.raises(ConnectionError):
+        router.client(0.0, 64, False).invoke([])
+    with pytest.raises(RuntimeError):
+        router.client(0.0, 64, False).invoke([])
+
+
+def test_unused_half_open_route_keeps_its_trial(clients):
+    made, behaviour = clients
+    behaviour.update(fast=(0.0, "primary"), slow=(0.0, "secondary"))
+    router = LLMRouter(LLMRouterCfg(routes=[{"provider": "fast"}, {"provider": "slow"}], breaker_failures=1, breaker_reset_s=0.05))
+    secondary = router.routes[1].breaker
+    secondary.failure()
+    time.sleep(0.1)
+    assert router.client(0.0, 64, False).invoke([]) == "primary "
+    assert "slow" not in made
+    # The secondary was never called, so its half-open trial is still available
+    assert secondary.allow()
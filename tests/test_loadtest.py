@@ -0,0 +1,82 @@
+import json
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from typer.testing import CliRunner
+
+from rag_toolkit.cli import app as cli
+from rag_toolkit.config import TrafficCfg
+from rag_toolkit.loadtest import arrival_offsets, parse_mix, qps_sweep, run_load, synthetic_traffic
+from rag_toolkit.traffic import TrafficRecorder, TrafficRecordingMiddleware, read_traffic
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/query")
+    def query(payload: dict):
+        return {"results": [payload.get("query")]}
+
+    @app.post("/chain_query")
+    def chain_query(payload: dict):
+        return {"answer": "no" if payload.get("query") == "fail" else "ok"}
+
+    return app
+
+
+def test_recording_and_replay(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    cfg = TrafficCfg(record=True, sample_rate=1.0, path=path, endpoints=["/query"])
+    recorder = TrafficRecorder(path)
+    app = _app()
+    app.add_middleware(TrafficRecordingMiddleware, cfg=cfg, recorder=recorder)
+    client = TestClient(app)
+    for q in ["a", "b", "c"]:
+        assert client.post("/query", json={"query": q, "k": 3}).json() == {"results": [q]}
+    client.post("/chain_query", json={"query": "not recorded"})
+    recorder.close()
+    records = list(read_traffic(path))
+    assert [r["payload"]["query"] for r in records] == ["a", "b", "c"]
+    assert all(r["endpoint"] == "/query" for r in records)
+
+    offsets = arrival_offsets(records, rate=0, speedup=1000)
+    assert offsets[0] == 0 and offsets == sorted(offsets)
+    report = run_load("http://test", records, speedup=1000, concurrency=2, transport=httpx.ASGITransport(app=_app()))
+    assert report["requests"] == 3 and report["error_rate"] == 0.0
+    assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] > 0
+
+
+def test_synthetic_mix_sweep():
+    mix = parse_mix("query=3,chain_query=1")
+    items = synthetic_traffic(["x", "y"], mix, 40, seed=1)
+    assert {it["endpoint"] for it in items} == {"/query", "/chain_query"}
+    result = qps_sweep("http://test", items, [200, 400], duration_s=0.1, concurrency=8, transport=httpx.ASGITransport(app=_app()))
+    assert [p["offered_qps"] for p in result["curve"]] == [200, 400]
+    assert result["steps"][0]["requests"] == 20 and set(result["steps"][0]["by_endpoint"]) <= {"/query", "/chain_query"}
+
+
+def test_cli_rates_sweep(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_SETTINGS", "config/test_settings.yaml")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    queries = tmp_path / "queries.txt"
+    queries.write_text("x\ny\n", encoding="utf-8")
+    out = tmp_path / "report.json"
+    try:
+        result = CliRunner().invoke(cli, ["loadtest", "--url", f"http://127.0.0.1:{port}", "--queries", str(queries), "--rates", "50,100", "--duration", "0.1", "--out", str(out)])
+    finally:
+        server.should_exit = True
+    assert result.exit_code == 0, result.output
+    report = json.loads(out.read_text())
+    assert [p["offered_qps"] for p in report["curve"]] == [50, 100]
+    assert json.loads(result.output)[0]["offered_qps"] == 50
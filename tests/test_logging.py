@@ -0,0 +1,57 @@
+import json
+import logging
+import queue
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_toolkit.logging import JSONFormatter, NonBlockingQueueHandler, RateLimitFilter, RequestContextMiddleware, log_context, stage
+
+
+def _capture(name: str):
+    q = queue.Queue(maxsize=2)
+    handler = NonBlockingQueueHandler(q)
+    logger = logging.getLogger(name)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger, handler, q
+
+
+def test_json_records_carry_context_and_drop_when_full():
+    logger, handler, q = _capture("test.logging.json")
+    with log_context(request_id="abc") as ctx:
+        with stage("embed"):
+            pass
+        logger.info('said "hi"\nthere', extra={"k": 5})
+    assert "embed_ms" in ctx
+    doc = json.loads(JSONFormatter().format(q.get_nowait()))
+    assert doc["message"] == 'said "hi"\nthere' and doc["request_id"] == "abc" and doc["k"] == 5
+    for _ in range(3):
+        logger.info("spam")
+    assert q.qsize() == 2 and handler.dropped == 1
+    logger.removeHandler(handler)
+
+
+def test_rate_limit_filter_suppresses_per_call_site():
+    f = RateLimitFilter(per_s=0.001, burst=2)
+    records = [logging.LogRecord("x", logging.INFO, "a.py", 10, "m", None, None) for _ in range(5)]
+    assert [f.filter(r) for r in records] == [True, True, False, False, False]
+    assert f.filter(logging.LogRecord("x", logging.ERROR, "a.py", 10, "m", None, None))
+    assert f.filter(logging.LogRecord("x", logging.INFO, "b.py", 10, "m", None, None))
+
+
+def test_request_context_middleware_sets_request_id():
+    logger, handler, q = _capture("test.logging.request")
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        logger.info("inside")
+        return {"ok": True}
+
+    app.add_middleware(RequestContextMiddleware)
+    r = TestClient(app).get("/ping", headers={"x-request-id": "req-1"})
+    assert r.headers["x-request-id"] == "req-1"
+    rec = q.get_nowait()
+    assert rec.ctx == {"request_id": "req-1", "path": "/ping"}
+    logger.removeHandler(handler)
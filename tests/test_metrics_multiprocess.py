@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+from rag_toolkit.metrics import latency_histogram, prepare_multiprocess_dir
+
+WORKER = """
+from rag_toolkit.metrics import observe_request, rag_admission_in_flight
+observe_request("/query", "POST", "200", 0.004)
+rag_admission_in_flight.labels(lane="query").set(3)
+"""
+
+
+def test_workers_aggregate_and_clean_up(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", WORKER], env=env, check=True, capture_output=True)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    text = generate_latest(registry).decode()
+    assert 'rag_requests_total{endpoint="/query",method="POST",status="200"} 2.0' in text
+    assert 'rag_request_latency_seconds_bucket{endpoint="/query",le="0.005"} 2.0' in text
+    # Both workers exited, so their live gauges were removed on the way out
+    assert "rag_admission_in_flight{" not in text and "rag_worker_info{" not in text
+
+
+IMPORT_ONLY = """
+import rag_toolkit.config
+
+
+def fail():
+    raise SystemExit(3)
+
+
+rag_toolkit.config.load_settings = fail
+import rag_toolkit.metrics
+"""
+
+
+def test_sub_10ms_latency_buckets():
+    assert 0.001 in latency_histogram("rag_request_latency_seconds")._upper_bounds
+
+
+def test_import_does_not_read_settings():
+    subprocess.run([sys.executable, "-c", IMPORT_ONLY], check=True, capture_output=True)
+
+
+def test_prepare_only_clears_metric_files(tmp_path, monkeypatch):
+    # prepare_multiprocess_dir exports the variable; registering it here restores it afterwards
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    (tmp_path / "counter_123.db").write_bytes(b"x")
+    assert prepare_multiprocess_dir(str(tmp_path)) == str(tmp_path)
+    assert list(tmp_path.iterdir()) == []
+    (tmp_path / "counter_123.db").write_bytes(b"x")
+    (tmp_path / "notes.txt").write_text("keep me")
+    with pytest.raises(ValueError, match="notes.txt"):
+        prepare_multiprocess_dir(str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["counter_123.db", "notes.txt"]
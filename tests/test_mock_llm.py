@@ -0,0 +1,67 @@
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi.testclient import TestClient
+
+from rag_toolkit.config import MockLLMCfg
+from rag_toolkit.llm import OpenAICompatibleLLM
+from rag_toolkit.mock_llm import create_mock_app, resolve_profile
+from rag_toolkit.providers import build_llm, make_messages
+
+MESSAGES = [{"role": "user", "content": "what is faiss?"}]
+
+
+def test_mock_llm_formats_and_determinism():
+    client = TestClient(create_mock_app(MockLLMCfg(profile="instant", completion_tokens=8)))
+    r = client.post("/v1/chat/completions", json={"model": "m", "messages": MESSAGES})
+    body = r.json()
+    assert body["object"] == "chat.completion" and body["choices"][0]["finish_reason"] == "stop"
+    text = body["choices"][0]["message"]["content"]
+    assert len(text.split()) == 8 and body["usage"]["completion_tokens"] == 8
+
+    r = client.post("/chat/completions", json={"model": "m", "messages": MESSAGES, "stream": True})
+    events = [line[len("data: "):] for line in r.text.split("\n\n") if line]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(e) for e in events[:-1]]
+    assert all(c["object"] == "chat.completion.chunk" for c in chunks)
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert "".join(c["choices"][0]["delta"].get("content", "") for c in chunks) == text
+
+
+def test_mock_llm_profiles_and_errors():
+    cfg = resolve_profile(MockLLMCfg(profile="flaky", error_rate=1.0))
+    assert cfg.ttft_ms == 300 and cfg.error_rate == 1.0
+    # Overrides equal to the old dataclass defaults still count as given
+    assert resolve_profile(MockLLMCfg(profile="flaky", error_rate=0.0)).error_rate == 0.0
+    assert resolve_profile(MockLLMCfg(profile="instant", ttft_ms=450)).ttft_ms == 450
+    assert resolve_profile(MockLLMCfg()).jitter == 0.35
+    client = TestClient(create_mock_app(MockLLMCfg(profile="instant", error_rate=1.0, error_status=429)))
+    assert client.post("/v1/chat/completions", json={"messages": MESSAGES}).status_code == 429
+    health = client.get("/health")
+    assert health.status_code == 200
+    body = health.json()
+    assert body["config"]["ttft_ms"] == 0 and body["config"]["error_rate"] == 1.0 and body["errors"] == 1
+
+
+def _serve(app) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def test_clients_talk_to_mock_over_http(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    base = _serve(create_mock_app(MockLLMCfg(profile="fast", ttft_ms=20, tokens_per_s=1000, completion_tokens=6)))
+    llm = build_llm("openai", "mock", 0.0, 64, True, api_base=base)
+    streamed = "".join(llm.stream(make_messages("system", "question")))
+    assert len(streamed.split()) == 6
+    assert llm.invoke(make_messages("system", "question")) == streamed
+    assert len(OpenAICompatibleLLM("mock", base, "mock").answer("q", ["ctx"]).split()) == 6
@@ -0,0 +1,77 @@
+import json
+import sys
+
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from rag_toolkit.onnx_embedder import MANIFEST_NAME, OnnxEmbedder, _pool, export_onnx, parity_report
+
+
+def _export(model_dir, pooling="mean"):
+    """A hand-built export: the "model" returns each token id as its one-dim hidden state."""
+    tok = Tokenizer(WordLevel({"<unk>": 0, "<pad>": 1, "a": 2, "b": 3, "c": 4}, unk_token="<unk>"))
+    tok.pre_tokenizer = Whitespace()
+    tok.save(str(model_dir / "tokenizer.json"))
+    (model_dir / "tokenizer_config.json").write_text(json.dumps({"pad_token": "<pad>"}))
+    graph = helper.make_graph(
+        [
+            helper.make_node("Constant", [], ["axes"], value=helper.make_tensor("axes", TensorProto.INT64, [1], [2])),
+            helper.make_node("Unsqueeze", ["input_ids", "axes"], ["ids3"]),
+            helper.make_node("Cast", ["ids3"], ["last_hidden_state"], to=TensorProto.FLOAT),
+        ],
+        "ids",
+        [helper.make_tensor_value_info(n, TensorProto.INT64, ["batch", "seq"]) for n in ("input_ids", "attention_mask")],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", 1])],
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8), str(model_dir / "model.onnx"))
+    manifest = {"model_name": "tiny", "file": "model.onnx", "quantized_file": None, "pooling": pooling, "max_seq_length": 8, "dim": 1}
+    (model_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+    return manifest
+
+
+def test_pool_modes_respect_the_mask():
+    hidden = np.array([[[1.0], [3.0], [100.0]], [[2.0], [-5.0], [-7.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0], [1, 1, 1]])
+    assert _pool(hidden, mask, "mean").ravel().tolist() == [2.0, pytest.approx(-10 / 3)]
+    assert _pool(hidden, mask, "max").ravel().tolist() == [3.0, 2.0]
+    assert _pool(hidden, mask, "cls").ravel().tolist() == [1.0, 2.0]
+
+
+def test_parity_report():
+    x = np.random.RandomState(0).rand(10, 4).astype(np.float32)
+    same = parity_report(x, x * 3.0)
+    assert same["n"] == 10 and same["cosine_min"] == pytest.approx(1.0) and same["max_drift"] == pytest.approx(0.0, abs=1e-6)
+    flipped = x.copy()
+    flipped[0] = -flipped[0]
+    assert parity_report(x, flipped)["cosine_min"] == pytest.approx(-1.0)
+
+
+def test_export_cache_hit_skips_torch(tmp_path, monkeypatch):
+    manifest = _export(tmp_path)
+    # A None entry makes any `import torch` raise, so only the cached path can succeed
+    monkeypatch.setitem(sys.modules, "torch", None)
+    assert export_onnx("tiny", str(tmp_path)) == manifest
+    with pytest.raises(ImportError):
+        export_onnx("tiny", str(tmp_path), quantize=True)
+
+
+def test_missing_export_raises(tmp_path):
+    with pytest.raises(RuntimeError, match="export-onnx"):
+        OnnxEmbedder(str(tmp_path), "tiny")
+    _export(tmp_path)
+    with pytest.raises(RuntimeError, match="export-onnx"):
+        OnnxEmbedder(str(tmp_path), "other-model")
+    with pytest.raises(RuntimeError, match="--quantize"):
+        OnnxEmbedder(str(tmp_path), "tiny", quantized=True)
+
+
+def test_padding_uses_the_exported_pad_token(tmp_path):
+    _export(tmp_path)
+    emb = OnnxEmbedder(str(tmp_path), "tiny")
+    assert emb.tokenizer.encode_batch(["a b c", "a"])[1].ids == [2, 1, 1]
+    assert emb.encode(["a b c", "a"]).ravel().tolist() == [3.0, 2.0]
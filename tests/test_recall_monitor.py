@@ -0,0 +1,51 @@
+import numpy as np
+
+from rag_toolkit.config import RecallMonitorCfg
+from rag_toolkit.index_store import IndexStore
+from rag_toolkit.recall_monitor import build_recall_monitor
+from rag_toolkit.retrieval import Retriever
+
+
+def test_sampled_queries_track_ann_recall(tmp_path, chunk_table):
+    x = np.random.RandomState(0).rand(2000, 16).astype(np.float32)
+    table = chunk_table(len(x))
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(x, table, index_type="IVF16,Flat")
+    cfg = RecallMonitorCfg(enabled=True, sample_rate=1.0, max_pending=1000)
+
+    assert build_recall_monitor(cfg, store.index, x[:10], "ivf") is None
+    flat = IndexStore(str(tmp_path / "flat.faiss"), str(tmp_path / "flat.jsonl"))
+    flat.build(x, table)
+    assert build_recall_monitor(cfg, flat.index, x, "flat") is None
+
+    recalls = []
+    for nprobe in (1, 16):
+        store.set_search_params({"nprobe": nprobe})
+        monitor = build_recall_monitor(cfg, store.index, x, f"ivf-{nprobe}")
+        retriever = Retriever(store, embedder=None, monitor=monitor)
+        for q in x[:50] + 0.01:
+            retriever.search_vector(q[None, :], 10)
+        monitor.shutdown()
+        stats = monitor.stats()
+        assert stats["samples"] == 50
+        recalls.append(stats["recall"])
+    assert recalls[0] < 1.0 and recalls[1] == 1.0
+
+
+def test_monitor_needs_the_embeddings_the_index_was_built_from(tmp_path, chunk_table):
+    x = np.random.RandomState(1).rand(500, 8).astype(np.float32)
+    table = chunk_table(len(x))
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(x, table, index_type="IVF4,Flat")
+    store.save()
+    loaded = IndexStore(store.index_path, store.meta_path)
+    loaded.load()
+    cfg = RecallMonitorCfg(enabled=True, sample_rate=1.0)
+    # Same row count, different build: shape alone would accept it
+    assert build_recall_monitor(cfg, loaded.index, x[::-1].copy(), "ivf", loaded.embeddings_fingerprint) is None
+    assert build_recall_monitor(cfg, loaded.index, x, "ivf", "") is None
+    monitor = build_recall_monitor(cfg, loaded.index, x, "ivf", loaded.embeddings_fingerprint)
+    assert monitor is not None
+    # Requests still in flight on a dropped version must not fail
+    monitor.shutdown(wait=False)
+    Retriever(loaded, embedder=None, monitor=monitor).search_vector(x[:1], 5)
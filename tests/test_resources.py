@@ -0,0 +1,65 @@
+import tracemalloc
+
+import numpy as np
+
+from rag_toolkit.answer_cache import SemanticAnswerCache
+from rag_toolkit.config import EmbeddingCfg
+from rag_toolkit.embedder import Embedder
+from rag_toolkit.index_store import IndexStore
+from rag_toolkit.resources import answer_cache_stats, index_stats, model_stats, process_stats, top_allocations
+
+
+def test_index_model_and_process_stats(tmp_path, chunk_table):
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    vecs = np.random.RandomState(0).rand(50, 8).astype(np.float32)
+    store.build(vecs, chunk_table(50))
+    store.save()
+    st = index_stats(store)
+    assert st["vectors"] == 50 and st["dim"] == 8 and st["meta_rows"] == 50
+    assert st["index_bytes"] >= 50 * 8 * 4 and st["meta_bytes"] > 0
+
+    assert model_stats(Embedder(EmbeddingCfg(model_name="dummy", use_dummy=True)))["param_bytes"] == 0
+    proc = process_stats()
+    assert proc["threads"] >= 1 and proc["peak_rss_bytes"] > 0
+
+    cache = SemanticAnswerCache(8)
+    cache.put(vecs[:1], "fp", {"answer": "a"})
+    assert answer_cache_stats(cache)["vector_bytes"] == 32
+
+
+def test_top_allocations_opt_in():
+    assert top_allocations() is None
+    tracemalloc.start(1)
+    try:
+        blob = [bytearray(100_000) for _ in range(10)]
+        top = top_allocations(5)
+        assert top and top[0]["size_bytes"] >= 1_000_000 and "test_resources.py" in top[0]["site"]
+        del blob
+    finally:
+        tracemalloc.stop()
+
+
+def test_debug_resources_needs_admin_token(monkeypatch):
+    monkeypatch.setenv("RAG_SETTINGS", "config/test_settings.yaml")
+    from fastapi.testclient import TestClient
+
+    from rag_toolkit import api
+
+    client = TestClient(api.app)
+    monkeypatch.setattr(api._settings.serving, "admin_token", None)
+    assert client.get("/debug/resources").status_code == 403
+    monkeypatch.setattr(api._settings.serving, "admin_token", "s3cret")
+    assert client.get("/debug/resources", headers={"x-admin-token": "wrong"}).status_code == 403
+    r = client.get("/debug/resources", headers={"x-admin-token": "s3cret"})
+    assert r.status_code == 200 and "process" in r.json()
+
+
+def test_metrics_scrape_survives_resource_errors(settings, monkeypatch):
+    from rag_toolkit import api
+
+    def broken():
+        raise OSError("index file vanished")
+
+    monkeypatch.setattr(api, "_resources", broken)
+    r = api.get_metrics()
+    assert r.status_code == 200 and b"rag_requests_total" in r.body
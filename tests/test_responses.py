@@ -0,0 +1,28 @@
+import json
+
+import numpy as np
+import pytest
+
+from rag_toolkit.retrieval import Retriever
+from rag_toolkit.responses import FastJSONResponse, parse_fields, project
+
+
+def test_field_projection_and_snippets(store, embedder):
+    retriever = Retriever(store, embedder)
+
+    full = retriever.search("what is in these docs?", 3)
+    slim = retriever.search("what is in these docs?", 3, ["chunk_id", "score", "text"], 20)
+    assert [r["chunk_id"] for r in slim] == [r["chunk_id"] for r in full]
+    assert all(set(r) == {"chunk_id", "score", "text"} and len(r["text"]) <= 20 for r in slim)
+    batch = retriever.search_batch(["what is in these docs?"], 3, ["doc_id"])
+    assert batch[0] == [{"doc_id": r["doc_id"]} for r in full]
+    assert project([dict(r) for r in full], ["chunk_id"]) == [{"chunk_id": r["chunk_id"]} for r in full]
+
+
+def test_parse_fields_and_render():
+    assert parse_fields(None) is None
+    assert parse_fields("chunk_id, score") == ["chunk_id", "score"]
+    with pytest.raises(ValueError):
+        parse_fields(["chunk_id", "embedding"])
+    body = FastJSONResponse(content={"score": np.float32(0.5), "text": "é"}).body
+    assert json.loads(body) == {"score": 0.5, "text": "é"}
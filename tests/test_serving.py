@@ -0,0 +1,45 @@
+from rag_toolkit.serving import IndexManager, publish_version, read_current_version
+
+
+def test_reload_swaps_and_rolls_back(tmp_path, settings, chunks, build_store):
+    s = settings
+    build_store(s, chunks)
+    publish_version(s, "v1")
+    build_store(s, chunks.slice(0, 3))
+    publish_version(s, "v2", activate=False)
+
+    manager = IndexManager(s)
+    assert manager.load_initial()
+    old = manager.retriever
+    assert manager.status()["index_version"] == "v1"
+
+    assert manager.reload("v2", background=False)["status"] == "ok"
+    assert manager.version == "v2" and read_current_version(s.serving.versions_dir) == "v2"
+    assert len(manager.current.store.meta) == 3
+    # A request that grabbed the old retriever still completes against v1
+    assert len(old.search("what is in these docs?", 5)) == 5
+
+    for bad in ("missing", "../..", "v1/../../v1", ".hidden"):
+        assert manager.reload(bad, background=False)["status"] == "invalid"
+    (tmp_path / "versions" / "empty").mkdir()
+    failed = manager.reload("empty", background=False)
+    assert failed["status"] == "failed" and manager.version == "v2"
+    assert manager.status()["last_error"]
+
+    assert manager.rollback()["version"] == "v1"
+    assert read_current_version(s.serving.versions_dir) == "v1"
+    assert manager.status()["previous_version"] == "v2"
+
+
+def test_rollback_to_unversioned_clears_current(settings, store):
+    s = settings
+
+    manager = IndexManager(s)
+    assert manager.load_initial() and manager.version is None
+    publish_version(s, "v1", activate=False)
+    assert manager.reload("v1", background=False)["status"] == "ok"
+    assert read_current_version(s.serving.versions_dir) == "v1"
+
+    assert manager.rollback()["version"] is None
+    # Otherwise the watcher would see CURRENT=v1 and swap the newer version straight back in
+    assert read_current_version(s.serving.versions_dir) is None
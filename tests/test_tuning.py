@@ -0,0 +1,50 @@
+import faiss
+import numpy as np
+import pyarrow as pa
+
+from rag_toolkit.index_store import IndexStore
+from rag_toolkit.tuning import pareto_front, tune_index
+
+
+def _corpus(n=2000, d=32, seed=0):
+    rng = np.random.RandomState(seed)
+    vecs = rng.randn(n, d).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    table = pa.table({
+        "chunk_id": [str(i) for i in range(n)],
+        "doc_id": ["doc"] * n,
+        "start": list(range(n)),
+        "end": list(range(1, n + 1)),
+        "text": [f"chunk {i}" for i in range(n)],
+    })
+    return vecs, table
+
+
+def test_pareto_front_keeps_non_dominated():
+    rows = [{"p50_ms": 1.0, "recall": 0.5}, {"p50_ms": 2.0, "recall": 0.4}, {"p50_ms": 3.0, "recall": 0.9}]
+    assert [r["recall"] for r in pareto_front(rows)] == [0.5, 0.9]
+
+
+def test_tune_ivf_writes_cheapest_setting_meeting_target(tmp_path):
+    vecs, table = _corpus()
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(vecs, table, index_type="IVF32,Flat", train_size=1000)
+    store.save()
+
+    report = tune_index(store, vecs[:100] + 0.01, k=10, target=0.9, embeddings=vecs)
+    assert report["param"] == "nprobe" and report["status"] == "ok"
+    nprobe = report["params"]["nprobe"]
+    assert report["chosen"]["recall"] >= 0.9
+    assert all(r["recall"] < 0.9 for r in report["sweep"] if r["nprobe"] < nprobe)
+
+    reloaded = IndexStore(store.index_path, store.meta_path)
+    reloaded.load()
+    assert reloaded.search_params == {"nprobe": nprobe}
+    assert faiss.extract_index_ivf(reloaded.index).nprobe == nprobe
+
+
+def test_flat_index_is_skipped(tmp_path):
+    vecs, table = _corpus(n=50)
+    store = IndexStore(str(tmp_path / "index.faiss"), str(tmp_path / "meta.jsonl"))
+    store.build(vecs, table)
+    assert tune_index(store, vecs[:5], k=5, target=0.9, write=False)["status"] == "skipped"